@@ -0,0 +1,109 @@
+"""
+Pipeline de liberação de acesso: confirma o pagamento, ativa/empilha a
+assinatura e manda o link de convite do grupo.
+"""
+import logging
+import time
+
+from app import config
+from app.infra import async_db
+from app.payment_status import get_payment_status
+from app.domain.subscriptions import confirm_and_activate_payment_async
+
+logger = logging.getLogger(__name__)
+
+
+async def send_access_invite(bot, user_id: int, payment_id: int) -> bool:
+    """
+    Cria um link de convite de uso único (1h) e envia para o usuário.
+    """
+    user = await async_db.get_user_by_id(user_id)
+    if not user:
+        logger.warning(
+            "Usuario nao encontrado para pagamento",
+            extra={"user_id": user_id, "payment_id": payment_id},
+        )
+        return False
+
+    telegram_id = user["telegram_id"]
+
+    try:
+        expire_date = int(time.time()) + 3600
+
+        invite_link = await bot.create_chat_invite_link(
+            chat_id=config.GRUPO_ID,
+            member_limit=1,
+            expire_date=expire_date,
+        )
+
+        text = (
+            "✅ Pagamento aprovado!\n\n"
+            "Aqui está seu link EXCLUSIVO de acesso ao grupo:\n"
+            f"{invite_link.invite_link}\n\n"
+            "Este link é válido por 1 hora e pode ser usado apenas uma vez. "
+            "Não compartilhe com outras pessoas."
+        )
+
+        await bot.send_message(
+            chat_id=telegram_id,
+            text=text,
+        )
+
+        logger.info(
+            "Invite enviado com sucesso para usuario",
+            extra={"telegram_id": telegram_id, "payment_id": payment_id},
+        )
+        return True
+
+    except Exception as e:
+        logger.warning(
+            "Erro ao criar/enviar invite para usuario",
+            extra={"telegram_id": telegram_id, "error": str(e)},
+        )
+        return False
+
+
+async def confirm_and_deliver(bot, gateway_payment_id: str) -> dict:
+    """
+    Confirma + ativa (idempotente) e envia o convite só quando esta chamada
+    foi a que ativou a assinatura — reentregas não geram convite duplicado.
+    `invite_sent` no resultado diz se o convite chegou a ser enviado.
+    """
+    result = await confirm_and_activate_payment_async(gateway_payment_id)
+    payment = result["payment"]
+
+    logger.info(
+        "Pagamento confirmado e assinatura ativada",
+        extra={"gateway_payment_id": gateway_payment_id, "activated": result["activated"]},
+    )
+
+    result["invite_sent"] = False
+    if result["activated"]:
+        result["invite_sent"] = await send_access_invite(bot, payment["user_id"], payment["id"])
+
+    return result
+
+
+async def process_mercadopago_event(bot, event: dict):
+    """
+    Handler da inbox para notificações do Mercado Pago. Exceções fazem o
+    evento voltar para a fila com backoff.
+    """
+    gateway_payment_id = event["resource_id"]
+
+    # Confere status direto no MercadoPago (notificação = mudou: ignora cache não terminal)
+    status = await get_payment_status(gateway_payment_id, fresh=True)
+
+    # gateway fora (5xx/429 depois dos retries): não dá o evento como
+    # processado — a reentrega do MP já seria descartada pela deduplicação
+    if status is None:
+        raise RuntimeError(f"Status indisponível para o pagamento {gateway_payment_id}")
+
+    if status != "approved":
+        logger.info(
+            "Pagamento ainda não aprovado",
+            extra={"gateway_payment_id": gateway_payment_id, "status": status},
+        )
+        return
+
+    await confirm_and_deliver(bot, gateway_payment_id)
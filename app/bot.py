@@ -3,58 +3,93 @@ from datetime import datetime, timedelta
 from telegram.ext import ApplicationBuilder
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from app.config import TELEGRAM_TOKEN
+from app import config
+from app.config import TELEGRAM_TOKEN, PAYMENT_SWEEP_INTERVAL_MINUTES
 from app.handlers import payments, start, subscriptions
+from app.infra.rate_limiter import TelegramRateLimiter
 from app.jobs import (
     process_confirmed_payments,
-    revoke_expired_group_access,
     schedule_expiration_reminders_job,
     process_outbox_tasks,
+    purge_webhook_dedup_job,
+    reconcile_pending_payments_job,
 )
 
 
 def build_application():
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    # Todas as chamadas à Bot API passam pelo mesmo rate limiter
+    rate_limiter = TelegramRateLimiter(
+        global_per_second=config.TG_RATE_GLOBAL_PER_SECOND,
+        private_per_second=config.TG_RATE_PRIVATE_PER_SECOND,
+        group_per_minute=config.TG_RATE_GROUP_PER_MINUTE,
+        bulk_reserve=config.TG_RATE_BULK_RESERVE,
+        max_retries=config.TG_RATE_MAX_RETRIES,
+    )
+    application = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .rate_limiter(rate_limiter)
+        .build()
+    )
 
     # Handlers
     start.register_handlers(application)
     payments.register_handlers(application)
     subscriptions.register_handlers(application)
 
-    # Jobs
+    return application
+
+
+def build_scheduler(application):
+    """
+    Jobs periódicos. Só o worker líder cria e inicia o scheduler (ver
+    `app.webhook_server`); os demais só atendem HTTP.
+    """
     scheduler = AsyncIOScheduler(timezone="UTC")
     now = datetime.utcnow()
 
     scheduler.add_job(
         process_confirmed_payments,
         "interval",
-        minutes=30, #era 3
-        start_date=now,
+        minutes=PAYMENT_SWEEP_INTERVAL_MINUTES,  # o listener ativa na hora; isto só varre o que escapou
+        start_date=now + timedelta(minutes=PAYMENT_SWEEP_INTERVAL_MINUTES),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        reconcile_pending_payments_job,
+        "interval",
+        minutes=config.RECONCILE_INTERVAL_MINUTES,
+        args=[application],
+        start_date=now + timedelta(minutes=2),
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        purge_webhook_dedup_job,
+        "interval",
+        minutes=60,
+        start_date=now + timedelta(seconds=40),
     )
     scheduler.add_job(
-        revoke_expired_group_access,
+        schedule_expiration_reminders_job,
         "interval",
-        minutes=360, #era 30
+        minutes=config.EXPIRY_REMINDERS_INTERVAL_MINUTES,
+        start_date=now + timedelta(seconds=20),
+        misfire_grace_time=60,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        process_outbox_tasks,
+        "interval",
+        minutes=config.OUTBOX_INTERVAL_MINUTES,
         args=[application],
-        start_date=now + timedelta(seconds=10),
+        start_date=now + timedelta(seconds=30),
+        max_instances=1,
+        coalesce=True,
     )
-#    scheduler.add_job(
-#        schedule_expiration_reminders_job,
-#        "interval",
-#        minutes=240, #era 30
-#        start_date=now + timedelta(seconds=20),
-#        misfire_grace_time=60,
-#    )
-#    scheduler.add_job(
-#        process_outbox_tasks,
-#        "interval",
-#        minutes=120, #era 15
-#        args=[application],
-#        start_date=now + timedelta(seconds=30),
-#    )
-
-    scheduler.start()
 
-    return application
+    return scheduler
 
 
@@ -26,3 +26,122 @@ MP_ACCESS_TOKEN = os.getenv("MERCADOPAGO_ACCESS_TOKEN")
 if not MP_ACCESS_TOKEN:
     raise RuntimeError("MERCADOPAGO_ACCESS_TOKEN não definido no ambiente")
 
+MP_HTTP_TIMEOUT = float(os.getenv("MP_HTTP_TIMEOUT", "10"))
+MP_HTTP_CONNECT_TIMEOUT = float(os.getenv("MP_HTTP_CONNECT_TIMEOUT", "5"))
+MP_HTTP_MAX_CONNECTIONS = int(os.getenv("MP_HTTP_MAX_CONNECTIONS", "20"))
+MP_HTTP_MAX_KEEPALIVE = int(os.getenv("MP_HTTP_MAX_KEEPALIVE", "10"))
+MP_HTTP_MAX_CONCURRENCY = int(os.getenv("MP_HTTP_MAX_CONCURRENCY", "10"))
+
+# timeout total por operação (o connect continua MP_HTTP_CONNECT_TIMEOUT)
+MP_TIMEOUT_CREATE_PAYMENT = float(os.getenv("MP_TIMEOUT_CREATE_PAYMENT", "15"))
+MP_TIMEOUT_GET_PAYMENT = float(os.getenv("MP_TIMEOUT_GET_PAYMENT", "5"))
+MP_TIMEOUT_SEARCH_PAYMENTS = float(os.getenv("MP_TIMEOUT_SEARCH_PAYMENTS", "10"))
+
+# novas tentativas (só GET), com backoff exponencial e jitter
+MP_RETRY_ATTEMPTS = int(os.getenv("MP_RETRY_ATTEMPTS", "2"))
+MP_RETRY_BASE_DELAY = float(os.getenv("MP_RETRY_BASE_DELAY", "0.2"))
+MP_RETRY_MAX_DELAY = float(os.getenv("MP_RETRY_MAX_DELAY", "2"))
+
+# circuit breaker
+MP_BREAKER_FAILURE_THRESHOLD = int(os.getenv("MP_BREAKER_FAILURE_THRESHOLD", "5"))
+MP_BREAKER_RESET_TIMEOUT = float(os.getenv("MP_BREAKER_RESET_TIMEOUT", "30"))
+
+# placeholder do PIX em criação (um pendente por usuário): vence sozinho se
+# quem o criou morrer. Maior que BACKGROUND_TIMEOUT — até lá a task já
+# terminou ou foi cancelada.
+PIX_CLAIM_LEASE_SECONDS = float(os.getenv("PIX_CLAIM_LEASE_SECONDS", "60"))
+
+
+# =========================
+# WEBHOOK INBOX
+# =========================
+
+INBOX_WORKERS = int(os.getenv("INBOX_WORKERS", "4"))
+INBOX_MAX_ATTEMPTS = int(os.getenv("INBOX_MAX_ATTEMPTS", "8"))
+INBOX_POLL_INTERVAL = float(os.getenv("INBOX_POLL_INTERVAL", "2"))
+INBOX_LEASE_SECONDS = float(os.getenv("INBOX_LEASE_SECONDS", "120"))
+INBOX_DONE_RETENTION_HOURS = float(os.getenv("INBOX_DONE_RETENTION_HOURS", "72"))
+INBOX_DEAD_RETENTION_HOURS = float(os.getenv("INBOX_DEAD_RETENTION_HOURS", "720"))
+INBOX_PURGE_BATCH = int(os.getenv("INBOX_PURGE_BATCH", "5000"))
+
+
+# =========================
+# ATIVAÇÃO DE PAGAMENTOS
+# =========================
+
+PAYMENT_LISTENER_CONCURRENCY = int(os.getenv("PAYMENT_LISTENER_CONCURRENCY", "4"))
+PAYMENT_LISTENER_HEALTH_INTERVAL = float(os.getenv("PAYMENT_LISTENER_HEALTH_INTERVAL", "30"))
+PAYMENT_LISTENER_HEALTH_TIMEOUT = float(os.getenv("PAYMENT_LISTENER_HEALTH_TIMEOUT", "5"))
+PAYMENT_SWEEP_INTERVAL_MINUTES = int(os.getenv("PAYMENT_SWEEP_INTERVAL_MINUTES", "60"))
+PAYMENT_SWEEP_BATCH = int(os.getenv("PAYMENT_SWEEP_BATCH", "100"))
+
+
+# =========================
+# OUTBOX
+# =========================
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_INTERVAL_MINUTES = int(os.getenv("OUTBOX_INTERVAL_MINUTES", "120"))
+# agenda os avisos D-3..D-1 na outbox (idempotente: uma task por aviso)
+EXPIRY_REMINDERS_INTERVAL_MINUTES = int(os.getenv("EXPIRY_REMINDERS_INTERVAL_MINUTES", "240"))
+
+
+# =========================
+# TELEGRAM RATE LIMIT
+# =========================
+
+TG_RATE_GLOBAL_PER_SECOND = float(os.getenv("TG_RATE_GLOBAL_PER_SECOND", "30"))
+TG_RATE_PRIVATE_PER_SECOND = float(os.getenv("TG_RATE_PRIVATE_PER_SECOND", "1"))
+TG_RATE_GROUP_PER_MINUTE = float(os.getenv("TG_RATE_GROUP_PER_MINUTE", "20"))
+TG_RATE_BULK_RESERVE = float(os.getenv("TG_RATE_BULK_RESERVE", "5"))
+TG_RATE_MAX_RETRIES = int(os.getenv("TG_RATE_MAX_RETRIES", "2"))
+
+
+# =========================
+# EXPIRAÇÃO DE ASSINATURAS
+# =========================
+
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "100"))
+EXPIRY_CONCURRENCY = int(os.getenv("EXPIRY_CONCURRENCY", "5"))
+EXPIRY_MAX_SLEEP = float(os.getenv("EXPIRY_MAX_SLEEP", "60"))
+
+
+# =========================
+# LEADER ELECTION
+# =========================
+
+LEADER_RETRY_INTERVAL = float(os.getenv("LEADER_RETRY_INTERVAL", "10"))
+LEADER_CHECK_INTERVAL = float(os.getenv("LEADER_CHECK_INTERVAL", "5"))
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+
+
+# =========================
+# TASKS EM SEGUNDO PLANO (handlers)
+# =========================
+
+BACKGROUND_MAX_CONCURRENCY = int(os.getenv("BACKGROUND_MAX_CONCURRENCY", "20"))
+BACKGROUND_TIMEOUT = float(os.getenv("BACKGROUND_TIMEOUT", "45"))
+
+
+# =========================
+# STATUS DE PAGAMENTO (cache)
+# =========================
+
+PAYMENT_STATUS_PENDING_TTL = float(os.getenv("PAYMENT_STATUS_PENDING_TTL", "5"))
+PAYMENT_STATUS_TERMINAL_TTL = float(os.getenv("PAYMENT_STATUS_TERMINAL_TTL", "604800"))
+PAYMENT_STATUS_CACHE_MAX = int(os.getenv("PAYMENT_STATUS_CACHE_MAX", "50000"))
+
+
+# =========================
+# RECONCILIAÇÃO DE PAGAMENTOS (gateway x banco)
+# =========================
+
+RECONCILE_INTERVAL_MINUTES = int(os.getenv("RECONCILE_INTERVAL_MINUTES", "15"))
+RECONCILE_MIN_AGE_SECONDS = float(os.getenv("RECONCILE_MIN_AGE_SECONDS", "120"))
+RECONCILE_LOOKBACK_HOURS = float(os.getenv("RECONCILE_LOOKBACK_HOURS", "72"))
+RECONCILE_MAX_ROWS = int(os.getenv("RECONCILE_MAX_ROWS", "5000"))
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "4"))
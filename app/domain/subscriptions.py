@@ -1,143 +1,168 @@
 import logging
-from datetime import datetime, timedelta
 
-import psycopg2
-import psycopg2.extras
-
-from app.infra import db
+from app.infra import async_db
 from app.domain.plans import PLANS
 
 logger = logging.getLogger(__name__)
 
 
-def activate_subscription_from_payment(payment_id: int):
+# =========================
+# SQL
+# =========================
+#
+# Confirmar + ativar são no máximo dois statements numa única transação:
+#
+#   1. trava o pagamento (UPDATE ... RETURNING ou SELECT ... FOR UPDATE) e,
+#      no mesmo statement, o usuário dono dele — duas ativações do mesmo
+#      usuário ficam em fila e a segunda empilha sobre a primeira;
+#   2. um INSERT que expira a assinatura vigente e cria a nova já com o
+#      fim somado, protegido por ON CONFLICT (payment_id).
+#
+# Só uma reentrega (nada inserido) faz mais um SELECT, para devolver a
+# assinatura que já existia.
+
+CONFIRM_AND_LOCK_SQL = f"""
+    WITH pay AS (
+        UPDATE payments_v2
+        SET status = 'confirmed',
+            confirmed_at = COALESCE(confirmed_at, NOW())
+        WHERE gateway_payment_id = $1
+        RETURNING {async_db.PAYMENT_COLUMNS}
+    ),
+    usr AS (
+        SELECT id FROM users
+        WHERE id = (SELECT user_id FROM pay)
+        FOR UPDATE
+    )
+    SELECT pay.* FROM pay JOIN usr ON usr.id = pay.user_id
+"""
+
+LOCK_CONFIRMED_SQL = f"""
+    WITH pay AS (
+        SELECT {async_db.PAYMENT_COLUMNS} FROM payments_v2
+        WHERE id = $1
+        FOR UPDATE
+    ),
+    usr AS (
+        SELECT id FROM users
+        WHERE id = (SELECT user_id FROM pay)
+        FOR UPDATE
+    )
+    SELECT pay.* FROM pay JOIN usr ON usr.id = pay.user_id
+"""
+
+ACTIVATE_SQL = """
+    WITH already AS (
+        SELECT id FROM subscriptions WHERE payment_id = $1
+    ),
+    current_sub AS (
+        SELECT id, starts_at, ends_at
+        FROM subscriptions
+        WHERE user_id = $2
+          AND status = 'active'
+          AND ends_at > NOW()
+          AND NOT EXISTS (SELECT 1 FROM already)
+        ORDER BY ends_at DESC
+        LIMIT 1
+        FOR UPDATE
+    ),
+    expired AS (
+        -- substituída pela nova (que herda o acesso): nada a revogar
+        UPDATE subscriptions SET status = 'expired', expiry_processed_at = NOW()
+        WHERE id IN (SELECT id FROM current_sub)
+        RETURNING id
+    )
+    INSERT INTO subscriptions (user_id, payment_id, plan, status, starts_at, ends_at)
+    SELECT
+        $2::int,
+        $1::int,
+        $3::text,
+        'active',
+        COALESCE((SELECT starts_at FROM current_sub), NOW()),
+        COALESCE((SELECT ends_at FROM current_sub), NOW()) + make_interval(days => $4)
+    WHERE NOT EXISTS (SELECT 1 FROM already)
+    ON CONFLICT (payment_id) DO NOTHING
+    RETURNING *
+"""
+
+
+def _activation_params(payment: dict):
     """
-    Processa pagamento confirmado e cria/estende assinatura.
-    Idempotente, seguro contra concorrência e falhas.
+    Valida o pagamento travado. Retorna (user_id, plan, days) ou None.
     """
+    if payment["status"] != "confirmed":
+        logger.info(f"[SKIP] Pagamento não confirmado: {payment['id']}")
+        return None
+
+    plan = payment["plan"]
+    if plan not in PLANS:
+        logger.error(f"[ERRO] Plano desconhecido: {plan}")
+        return None
 
-    with db.get_db() as conn:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    return payment["user_id"], plan, PLANS[plan]["days"]
 
-        # 🔒 1. Lock no pagamento (evita concorrência entre jobs)
-        cur.execute(
-            "SELECT * FROM payments_v2 WHERE id = %s FOR UPDATE",
-            (payment_id,)
-        )
-        payment = cur.fetchone()
 
+async def _activate_locked(conn, payment: dict):
+    """
+    Cria/estende a assinatura do pagamento já travado. Retorna
+    (assinatura, ativou_agora); numa reentrega devolve a assinatura que já
+    existia, com ativou_agora=False.
+    """
+    params = _activation_params(payment)
+    if not params:
+        return None, False
+    user_id, plan, days = params
+
+    sub = await conn.fetchrow(ACTIVATE_SQL, payment["id"], user_id, plan, days)
+    if not sub:
+        logger.info(f"[IDEMPOTENTE] Já processado: payment_id={payment['id']}")
+        existing = await conn.fetchrow("SELECT * FROM subscriptions WHERE payment_id = $1", payment["id"])
+        return (dict(existing) if existing else None), False
+
+    sub = dict(sub)
+    logger.info(
+        "[OK] Assinatura ativada",
+        extra={
+            "user_id": payment["user_id"],
+            "payment_id": payment["id"],
+            "plan": payment["plan"],
+            "ends_at": sub["ends_at"].isoformat(),
+        }
+    )
+    return sub, True
+
+
+async def confirm_and_activate_payment_async(gateway_payment_id: str) -> dict:
+    """
+    Marca o pagamento como confirmado e cria/estende a assinatura, numa
+    única transação curta. Idempotente: reentregas do mesmo pagamento
+    retornam a assinatura existente com `activated=False`.
+
+    Retorna {"payment", "subscription", "activated"}.
+    """
+    async with async_db.get_db() as conn:
+        payment = await conn.fetchrow(CONFIRM_AND_LOCK_SQL, str(gateway_payment_id))
         if not payment:
-            logger.warning(f"[ERRO] Pagamento não encontrado: {payment_id}")
-            return
+            raise ValueError("Pagamento não encontrado")
+        payment = dict(payment)
 
-        if payment["status"] != "confirmed":
-            logger.info(f"[SKIP] Pagamento não confirmado: {payment_id}")
-            return
+        sub, activated = await _activate_locked(conn, payment)
 
-        # 🔁 2. Idempotência (já existe subscription)
-        cur.execute(
-            "SELECT * FROM subscriptions WHERE payment_id = %s",
-            (payment_id,)
-        )
-        existing_sub = cur.fetchone()
+    return {"payment": payment, "subscription": sub, "activated": activated}
 
-        if existing_sub:
-            logger.info(f"[IDEMPOTENTE] Já processado: payment_id={payment_id}")
-            return existing_sub
 
-        user_id = payment["user_id"]
-        plan = payment["plan"]
+async def activate_subscription_from_payment_async(payment_id: int):
+    """
+    Processa pagamento confirmado e cria/estende assinatura.
+    Idempotente (reentrega retorna a assinatura existente), seguro contra
+    concorrência e falhas.
+    """
+    async with async_db.get_db() as conn:
+        payment = await conn.fetchrow(LOCK_CONFIRMED_SQL, payment_id)
 
-        if plan not in PLANS:
-            logger.error(f"[ERRO] Plano desconhecido: {plan}")
+        if not payment:
+            logger.warning(f"[ERRO] Pagamento não encontrado: {payment_id}")
             return
 
-        days = PLANS[plan]["days"]
-        now = datetime.utcnow()
-
-        logger.info(
-            "[DEBUG] Calculando assinatura a partir do plano",
-           extra={
-                "user_id": user_id,
-                "plan": plan,
-                "days_from_plan": days,
-            }
-        )
-
-
-
-        # 🔎 3. Busca assinatura ativa
-        cur.execute(
-            """
-            SELECT * FROM subscriptions
-            WHERE user_id = %s
-              AND status = 'active'
-              AND ends_at > %s
-            LIMIT 1
-            """,
-            (user_id, now)
-        )
-        current_sub = cur.fetchone()
-
-        if current_sub:
-            base_end = current_sub["ends_at"]
-            starts_at = current_sub["starts_at"]
-
-            # Expira antiga
-            cur.execute(
-                "UPDATE subscriptions SET status = 'expired' WHERE id = %s",
-                (current_sub["id"],)
-            )
-        else:
-            base_end = now
-            starts_at = now
-
-        new_ends_at = base_end + timedelta(days=days)
-
-        # 🛡️ 4. Insert protegido contra duplicidade
-        try:
-            cur.execute(
-                """
-                INSERT INTO subscriptions (
-                    user_id,
-                    payment_id,
-                    plan,
-                    status,
-                    starts_at,
-                    ends_at
-                )
-                VALUES (%s, %s, %s, 'active', %s, %s)
-                ON CONFLICT (payment_id) DO NOTHING
-                RETURNING *
-                """,
-                (
-                    user_id,
-                    payment_id,
-                    plan,
-                    starts_at,
-                    new_ends_at,
-                )
-            )
-
-            sub = cur.fetchone()
-
-            if not sub:
-                logger.info(f"[IDEMPOTENTE] Insert ignorado: payment_id={payment_id}")
-                return
-
-            logger.info(
-                "[OK] Assinatura ativada",
-                extra={
-                    "user_id": user_id,
-                    "payment_id": payment_id,
-                    "plan": plan,
-                    "ends_at": new_ends_at.isoformat(),
-                }
-            )
-
-            return sub
-
-        except psycopg2.errors.UniqueViolation:
-            # fallback absoluto (caso constraint ainda não estivesse criada)
-            logger.warning(f"[RACE] UniqueViolation capturada: payment_id={payment_id}")
-            return
+        sub, _activated = await _activate_locked(conn, dict(payment))
+        return sub
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+
+from telegram.error import BadRequest
+
+from app.infra import expiry
+from app.infra.rate_limiter import BULK
+
+logger = logging.getLogger(__name__)
+
+# BadRequest que significa "não há o que revogar". Qualquer outro (sem
+# permissão de banir, chat não encontrado...) é problema de configuração:
+# a revogação é reagendada, não dada como feita.
+_USER_GONE_ERRORS = (
+    "user not found",
+    "user_not_participant",
+    "participant_id_invalid",
+    "member not found",
+    "user_id_invalid",
+)
+
+
+def _user_gone(error: BadRequest) -> bool:
+    message = str(error).lower()
+    return any(fragment in message for fragment in _USER_GONE_ERRORS)
+
+
+class ExpiryEngine:
+    """
+    Revoga o acesso ao grupo no vencimento de cada assinatura.
+
+    Drena a fila de `app.infra.expiry` em lotes, com revogações em paralelo
+    limitado, e dorme até o próximo `ends_at` (no máximo `max_sleep`, para
+    enxergar assinaturas criadas nesse meio tempo). Depois de uma parada,
+    recupera todos os vencimentos perdidos na primeira volta.
+    """
+
+    def __init__(
+        self,
+        bot,
+        group_id,
+        batch_size: int = 100,
+        concurrency: int = 5,
+        lease_seconds: float = 120.0,
+        max_sleep: float = 60.0,
+    ):
+        self.bot = bot
+        self.group_id = group_id
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_sleep = max_sleep
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stopping = False
+        self._task = None
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="expiry-engine")
+        logger.info("[EXPIRY] Motor de expiração iniciado")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("[EXPIRY] Motor de expiração finalizado")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self.drain()
+                delay = await expiry.next_due_in()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[EXPIRY] Falha ao processar vencimentos")
+                delay = self.max_sleep
+
+            delay = self.max_sleep if delay is None else min(delay, self.max_sleep)
+            await asyncio.sleep(max(delay, 0.5))
+
+    async def drain(self) -> int:
+        """
+        Processa todos os vencimentos elegíveis agora. Retorna quantos.
+        """
+        total = 0
+        while True:
+            subs = await expiry.claim_due(limit=self.batch_size, lease_seconds=self.lease_seconds)
+            if not subs:
+                break
+
+            results = await asyncio.gather(*(self._expire(sub) for sub in subs))
+            await expiry.mark_processed([sub["id"] for sub, ok in zip(subs, results) if ok])
+            total += len(subs)
+
+            if len(subs) < self.batch_size:
+                break
+
+        if total:
+            logger.info("[EXPIRY] Vencimentos processados", extra={"count": total})
+        return total
+
+    async def _expire(self, sub: dict) -> bool:
+        if sub["has_active"]:
+            # renovou/empilhou: continua no grupo
+            logger.info(
+                "[EXPIRY] Assinatura vencida, usuário segue com outra ativa",
+                extra={"user_id": sub["user_id"], "sub_id": sub["id"]},
+            )
+            return True
+
+        async with self._semaphore:
+            try:
+                await self._revoke(sub["telegram_id"])
+            except BadRequest as e:
+                if not _user_gone(e):
+                    return await self._retry(sub)
+                # usuário já fora do grupo / inexistente: nada a revogar
+                logger.info(
+                    "[EXPIRY] Revogação ignorada",
+                    extra={"user_id": sub["user_id"], "sub_id": sub["id"], "error": str(e)},
+                )
+                return True
+            except Exception:
+                return await self._retry(sub)
+
+        logger.info(
+            "[EXPIRY] Acesso revogado por expiração",
+            extra={"user_id": sub["user_id"], "sub_id": sub["id"]},
+        )
+        return True
+
+    async def _retry(self, sub: dict) -> bool:
+        logger.exception(
+            "[EXPIRY] Falha ao remover usuário expirado do grupo",
+            extra={"telegram_id": sub["telegram_id"], "attempts": sub["expiry_attempts"]},
+        )
+        try:
+            await expiry.retry_later(sub)
+        except Exception:
+            logger.exception("[EXPIRY] Falha ao reagendar revogação", extra={"sub_id": sub["id"]})
+        return False
+
+    async def _revoke(self, telegram_id: int):
+        # remove o usuário do grupo
+        await self.bot.ban_chat_member(
+            chat_id=self.group_id,
+            user_id=telegram_id,
+            rate_limit_args=BULK,
+        )
+        # unban para permitir voltar no futuro via novo invite
+        await self.bot.unban_chat_member(
+            chat_id=self.group_id,
+            user_id=telegram_id,
+            only_if_banned=True,
+            rate_limit_args=BULK,
+        )
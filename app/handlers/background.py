@@ -0,0 +1,64 @@
+"""
+Execução em segundo plano para handlers.
+
+O handler responde na hora (ex.: "⏳ Gerando seu PIX...") e a parte lenta
+(gateway, banco, upload) roda numa task do PTB, limitada por semáforo e
+com timeout. A latência do handler não depende mais do gateway.
+"""
+import asyncio
+import logging
+import time
+
+from app import config
+from app.infra.metrics import BACKGROUND_QUEUE_WAIT_SECONDS, BACKGROUND_TASK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_semaphore = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # criado sob demanda, já dentro do event loop da aplicação
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(config.BACKGROUND_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def run_in_background(context, update, name: str, work, on_failure, timeout: float | None = None):
+    """
+    Agenda `work()` (coroutine function) via `application.create_task` —
+    o PTB acompanha a task e espera por ela no shutdown.
+
+    Em exceção ou timeout chama `on_failure(exc)`, que deve avisar o
+    usuário. Retorna a task.
+    """
+    timeout = timeout or config.BACKGROUND_TIMEOUT
+    return context.application.create_task(
+        _run(name, work, on_failure, timeout),
+        update=update,
+        name=f"bg:{name}",
+    )
+
+
+async def _run(name: str, work, on_failure, timeout: float):
+    queued = time.perf_counter()
+    async with _get_semaphore():
+        started = time.perf_counter()
+        BACKGROUND_QUEUE_WAIT_SECONDS.labels(name).observe(started - queued)
+        result = "ok"
+        try:
+            await asyncio.wait_for(work(), timeout=timeout)
+        except Exception as e:
+            result = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            logger.warning(
+                "[BG] Falha na task em segundo plano",
+                exc_info=True,
+                extra={"task": name, "result": result},
+            )
+            try:
+                await on_failure(e)
+            except Exception:
+                logger.exception("[BG] Falha ao avisar usuário", extra={"task": name})
+        finally:
+            BACKGROUND_TASK_SECONDS.labels(name, result).observe(time.perf_counter() - started)
@@ -1,18 +1,23 @@
 import logging
 
+import httpx
 from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from app.infra import db
-from app.payments import create_pix_payment, check_payment_status
+from app.activation import confirm_and_deliver
+from app.handlers.background import run_in_background
+from app.handlers.pix import reply_pix
+from app.infra import async_db
+from app.infra.circuit_breaker import CircuitOpenError
+from app.infra.metrics import observe_handler
+from app.payment_status import get_payment_status
+from app.payments import create_pix_payment
 from app.domain.plans import get_plan
 
-import base64
-from io import BytesIO
-
 logger = logging.getLogger(__name__)
 
 
+@observe_handler
 async def handle_buy_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -23,23 +28,31 @@ async def handle_buy_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ Plano inválido.")
         return
 
-    user_id = db.get_or_create_user(
+    user_id = await async_db.get_or_create_user(
         telegram_id=query.from_user.id,
         nome=query.from_user.first_name,
     )
 
     await query.edit_message_text("⏳ Gerando seu PIX...")
 
-    try:
-        payment = create_pix_payment(user_id=user_id, plan=plan_id)
-    except Exception:
-        logger.exception("Erro ao gerar PIX")
-        await query.edit_message_text("❌ Erro ao gerar PIX. Tente novamente com /start")
-        return
+    async def generate():
+        payment = await create_pix_payment(user_id=user_id, plan=plan_id)
+        await send_pix(query, payment, plan_data)
+
+    async def failed(exc):
+        if isinstance(exc, CircuitOpenError):
+            text = "⚠️ O Mercado Pago está instável no momento. Tente novamente em instantes com /start"
+        else:
+            text = "❌ Erro ao gerar PIX. Tente novamente com /start"
+        await query.edit_message_text(text)
+
+    # gateway + banco + upload fora do handler: o callback responde na hora
+    run_in_background(context, update, "create_pix", generate, failed)
 
+
+async def send_pix(query, payment: dict, plan_data: dict):
     transaction_data = payment["point_of_interaction"]["transaction_data"]
     qr_code = transaction_data["qr_code"]
-    qr_base64 = transaction_data.get("qr_code_base64")
 
     caption_text = (
         f"✅ *{plan_data['title']} — R$ {plan_data['price']:.2f}*\n\n"
@@ -49,23 +62,7 @@ async def handle_buy_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Após pagar, clique em Verificar Pagamento."
     )
 
-    if qr_base64:
-        qr_bytes = base64.b64decode(qr_base64)
-        bio = BytesIO(qr_bytes)
-        bio.name = "qrcode.png"
-
-        await query.message.reply_photo(
-            photo=bio,
-            caption=caption_text,
-            parse_mode="Markdown",
-            reply_markup=__check_button(),
-        )
-    else:
-        await query.message.reply_text(
-            caption_text,
-            parse_mode="Markdown",
-            reply_markup=__check_button(),
-        )
+    await reply_pix(query.message, payment, caption_text, __check_button())
 
 def __check_button():
     from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -74,15 +71,16 @@ def __check_button():
     ]])
 
 
+@observe_handler
 async def handle_check_payment_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    user_id = db.get_or_create_user(
+    user_id = await async_db.get_or_create_user(
         telegram_id=query.from_user.id,
         nome=query.from_user.first_name,
     )
-    pending = db.get_pending_payment(user_id)
+    pending = await async_db.get_pending_payment(user_id)
 
     if not pending:
         await query.message.reply_text(
@@ -90,13 +88,49 @@ async def handle_check_payment_status(update: Update, context: ContextTypes.DEFA
         )
         return
 
-    status = check_payment_status(pending["gateway_payment_id"])
+    # coalescing + cache: cliques repetidos não viram uma chamada ao gateway cada
+    try:
+        status = await get_payment_status(pending["gateway_payment_id"])
+    except (CircuitOpenError, httpx.HTTPError) as e:
+        # gateway degradado / timeout: responde em vez de deixar o clique sem resposta
+        logger.warning(
+            "Falha ao consultar status na verificação",
+            extra={"gateway_payment_id": pending["gateway_payment_id"], "error": repr(e)},
+        )
+        status = None
 
-    if status == "approved":
+    if status is None:
+        # circuito aberto, erro de rede ou 5xx/429 depois dos retries
         await query.message.reply_text(
-            "✅ *Pagamento confirmado!*\n\nSeu acesso será liberado.",
+            "⚠️ *Não foi possível consultar o pagamento agora.*\n\nTente novamente em instantes.",
             parse_mode="Markdown",
         )
+        return
+
+    if status == "approved":
+        # mesmo pipeline do webhook: idempotente, convite só para quem ativou
+        try:
+            result = await confirm_and_deliver(context.bot, pending["gateway_payment_id"])
+        except Exception:
+            # webhook / process_confirmed_payments ainda liberam o acesso
+            logger.exception(
+                "Falha ao ativar pagamento aprovado na verificação",
+                extra={"gateway_payment_id": pending["gateway_payment_id"]},
+            )
+            result = None
+
+        if result and result["invite_sent"]:
+            text = "✅ *Pagamento confirmado!*\n\nSeu link de acesso foi enviado acima."
+        elif result and result["activated"]:
+            text = (
+                "✅ *Pagamento confirmado!*\n\n"
+                "Não consegui enviar seu link de acesso agora. Fale com o suporte pelo menu /start."
+            )
+        elif result:
+            text = "✅ *Pagamento confirmado!*\n\nSeu acesso já foi liberado."
+        else:
+            text = "✅ *Pagamento confirmado!*\n\nSeu acesso será liberado em instantes."
+        await query.message.reply_text(text, parse_mode="Markdown")
     elif status in ("pending", "in_process"):
         await query.message.reply_text(
             "⏳ *Pagamento ainda pendente.*\n\nTente novamente em instantes.",
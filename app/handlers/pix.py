@@ -0,0 +1,67 @@
+"""
+Envio da foto do QR PIX.
+
+O primeiro envio faz upload do PNG (o do gateway, quando veio na criação,
+ou renderizado por `app.infra.qr`) e guarda o `file_id` devolvido pelo
+Telegram no pagamento (`payments_v2.pix_qr_file_id`); reenvios do mesmo
+PIX (ex.: "reutilizando PIX pendente") só referenciam o `file_id`.
+"""
+import base64
+import logging
+import time
+from io import BytesIO
+
+from telegram.error import BadRequest
+
+from app.infra import async_db, qr
+from app.infra.metrics import QR_PHOTO_SENDS, QR_UPLOAD_BYTES, QR_UPLOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+async def reply_pix(message, payment: dict, caption: str, reply_markup):
+    """
+    Responde com a foto do QR: pelo file_id, pelo PNG do gateway ou
+    renderizado localmente a partir do copia e cola.
+    """
+    qr_base64 = payment["point_of_interaction"]["transaction_data"].get("qr_code_base64")
+    file_id = payment.get("qr_file_id")
+
+    if file_id:
+        try:
+            await _send_photo(message, "file_id", file_id, caption, reply_markup)
+            return
+        except BadRequest:
+            # file_id inválido (ex.: outro bot/token): refaz o upload
+            logger.warning("file_id do QR rejeitado — reenviando imagem", extra={"payment_id": payment["id"]})
+
+    if qr_base64:
+        qr_bytes = base64.b64decode(qr_base64)
+    else:
+        # PIX reaproveitado: o banco só guarda o copia e cola
+        qr_bytes = await qr.render_png(payment["point_of_interaction"]["transaction_data"]["qr_code"])
+
+    bio = BytesIO(qr_bytes)
+    bio.name = "qrcode.png"
+
+    sent = await _send_photo(message, "upload", bio, caption, reply_markup)
+    QR_UPLOAD_BYTES.inc(len(qr_bytes))
+
+    try:
+        await async_db.set_payment_qr_file_id(payment["id"], sent.photo[-1].file_id)
+    except Exception:
+        # só perde o atalho do próximo envio
+        logger.warning("Falha ao salvar file_id do QR", exc_info=True, extra={"payment_id": payment["id"]})
+
+
+async def _send_photo(message, source: str, photo, caption: str, reply_markup):
+    started = time.perf_counter()
+    sent = await message.reply_photo(
+        photo=photo,
+        caption=caption,
+        parse_mode="Markdown",
+        reply_markup=reply_markup,
+    )
+    QR_UPLOAD_SECONDS.labels(source).observe(time.perf_counter() - started)
+    QR_PHOTO_SENDS.labels(source).inc()
+    return sent
@@ -1,6 +1,7 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CommandHandler, ContextTypes
-from app.infra import db
+from app.infra import async_db
+from app.infra.metrics import observe_handler
 from app.domain.plans import PLANS
 
 
@@ -33,9 +34,10 @@ def main_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(rows)
 
 
+@observe_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
+    await async_db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
 
     text = (
         "👋 *Bem-vindo ao LostCityBot!*\n\n"
@@ -4,30 +4,38 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
-from app.infra import db
+from app.handlers.background import run_in_background
+from app.handlers.pix import reply_pix
+from app.infra import async_db
+from app.infra.circuit_breaker import CircuitOpenError
+from app.infra.metrics import observe_handler
 from app.handlers.start import start  # para usar como "voltar ao menu"
 from app.domain.plans import get_plan
 from app.payments import create_pix_payment
 
-import base64
-from io import BytesIO
-
 SUPORTE_USERNAME = "SuporteVendasLC"
 SUPORTE_LINK = f"https://t.me/SuporteVendasLC"
 
 logger = logging.getLogger(__name__)
 
 
+def format_dt(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%d/%m/%Y %H:%M")
+    return str(value)
+
+
 def back_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("🔙 Voltar ao menu", callback_data="menu:voltar")],
     ])
 
 
+@observe_handler
 async def minha_assinatura(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_id = db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
-    sub = db.get_active_subscription_with_days(user_id)
+    user_id = await async_db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
+    sub = await async_db.get_active_subscription_with_days(user_id)
 
     if not sub:
         text = "Você não tem nenhuma assinatura ativa no momento."
@@ -40,18 +48,10 @@ async def minha_assinatura(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     plan = sub["plan"]
-    starts_at = sub["starts_at"]
-    ends_at = sub["ends_at"]
     dias_restantes = int(sub["dias_restantes"])
 
-    try:
-        starts_dt = datetime.fromisoformat(starts_at)
-        ends_dt = datetime.fromisoformat(ends_at)
-        starts_str = starts_dt.strftime("%d/%m/%Y %H:%M")
-        ends_str = ends_dt.strftime("%d/%m/%Y %H:%M")
-    except Exception:
-        starts_str = starts_at
-        ends_str = ends_at
+    starts_str = format_dt(sub["starts_at"])
+    ends_str = format_dt(sub["ends_at"])
 
     text = (
         "📄 *Sua assinatura*\n\n"
@@ -71,10 +71,11 @@ async def minha_assinatura(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+@observe_handler
 async def historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_id = db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
-    rows = db.get_payments_history_by_user(user_id, limit=10)
+    user_id = await async_db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
+    rows = await async_db.get_payments_history_by_user(user_id, limit=10)
 
     if not rows:
         text = "Você ainda não tem pagamentos registrados."
@@ -88,11 +89,7 @@ async def historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     linhas = []
     for p in rows:
-        try:
-            created_dt = datetime.fromisoformat(p["created_at"])
-            created_str = created_dt.strftime("%d/%m/%Y %H:%M")
-        except Exception:
-            created_str = p["created_at"]
+        created_str = format_dt(p["created_at"])
 
         status = p["status"]
         plan = p["plan"]
@@ -113,6 +110,7 @@ async def historico(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+@observe_handler
 async def menu_minhas_coisas(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -125,9 +123,9 @@ async def menu_minhas_coisas(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await start(update, context)
     elif query.data == "menu:renovar":
         user = update.effective_user
-        user_id = db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
+        user_id = await async_db.get_or_create_user(telegram_id=user.id, nome=user.full_name)
 
-        sub = db.get_active_subscription_with_days(user_id)
+        sub = await async_db.get_active_subscription_with_days(user_id)
         if not sub:
             # Não é membro ativo → manda pro menu normal
             await start(update, context)
@@ -157,63 +155,22 @@ async def menu_minhas_coisas(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         await query.edit_message_text("⏳ Gerando seu PIX para renovação...")
 
-        try:
-            payment = create_pix_payment(
+        async def generate():
+            payment = await create_pix_payment(
                 user_id=user_id,
                 plan=plan_id,
                 override_amount=final_price,
             )
-        except Exception:
-            logger.exception("Erro ao gerar PIX de renovação")
-            await query.edit_message_text(
-                "❌ Erro ao gerar PIX. Tente novamente com /start",
-                reply_markup=back_menu_keyboard(),
-            )
-            return
-
-        transaction_data = payment["point_of_interaction"]["transaction_data"]
-        qr_code = transaction_data["qr_code"]
-        qr_base64 = transaction_data.get("qr_code_base64")
-
-        caption_text = (
-            f"✅ *Renovação — {plan_data['title']}*\n"
-            f"Valor oficial do plano: R$ {base_price:.2f}\n"
-        )
-
-        if discount_percent > 0:
-            caption_text += (
-                f"Desconto de renovação: {discount_percent}%\n"
-                f"Valor promocional: *R$ {final_price:.2f}*\n"
-            )
-
-        caption_text += (
-            "\nPague via PIX copia e cola:\n\n"
-            f"`{qr_code}`\n\n"
-            "⏱ Expira em 30 minutos.\n"
-            "Após pagar, clique em *Verificar Pagamento*."
-        )
+            await send_renewal_pix(query, payment, plan_data, base_price, discount_percent, final_price)
 
-        check_markup = InlineKeyboardMarkup([[
-            InlineKeyboardButton("🔍 Verificar Pagamento", callback_data="check_payment_status")
-        ]])
+        async def failed(exc):
+            if isinstance(exc, CircuitOpenError):
+                text = "⚠️ O Mercado Pago está instável no momento. Tente novamente em instantes com /start"
+            else:
+                text = "❌ Erro ao gerar PIX. Tente novamente com /start"
+            await query.edit_message_text(text, reply_markup=back_menu_keyboard())
 
-        if qr_base64:
-            qr_bytes = base64.b64decode(qr_base64)
-            bio = BytesIO(qr_bytes)
-            bio.name = "qrcode.png"
-
-            await query.message.reply_photo(
-                photo=bio,
-                caption=caption_text,
-                parse_mode="Markdown",
-                reply_markup=check_markup,
-            )
-        else:
-            await query.message.reply_text(
-                caption_text,
-                parse_mode="Markdown",
-                reply_markup=check_markup,
-            )
+        run_in_background(context, update, "renew_pix", generate, failed)
     elif query.data == "menu:suporte":
         text = (
             "🆘 *Suporte LostCityBot*\n\n"
@@ -228,6 +185,36 @@ async def menu_minhas_coisas(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
 
 
+async def send_renewal_pix(query, payment: dict, plan_data: dict, base_price: float,
+                           discount_percent: int, final_price: float):
+    transaction_data = payment["point_of_interaction"]["transaction_data"]
+    qr_code = transaction_data["qr_code"]
+
+    caption_text = (
+        f"✅ *Renovação — {plan_data['title']}*\n"
+        f"Valor oficial do plano: R$ {base_price:.2f}\n"
+    )
+
+    if discount_percent > 0:
+        caption_text += (
+            f"Desconto de renovação: {discount_percent}%\n"
+            f"Valor promocional: *R$ {final_price:.2f}*\n"
+        )
+
+    caption_text += (
+        "\nPague via PIX copia e cola:\n\n"
+        f"`{qr_code}`\n\n"
+        "⏱ Expira em 30 minutos.\n"
+        "Após pagar, clique em *Verificar Pagamento*."
+    )
+
+    check_markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔍 Verificar Pagamento", callback_data="check_payment_status")
+    ]])
+
+    await reply_pix(query.message, payment, caption_text, check_markup)
+
+
 def register_handlers(application):
     application.add_handler(CommandHandler("minha_assinatura", minha_assinatura))
     application.add_handler(CommandHandler("historico", historico))
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from app.infra import inbox
+
+logger = logging.getLogger(__name__)
+
+
+class InboxWorkerPool:
+    """
+    Pool de workers asyncio que drena a `webhook_inbox`.
+
+    `handlers` mapeia source -> coroutine(event). Sucesso marca o evento
+    como 'done'; exceção devolve para a fila com backoff (ou 'dead' depois
+    de `max_attempts`). `notify()` acorda os workers logo após um enqueue,
+    sem esperar o próximo poll.
+    """
+
+    def __init__(
+        self,
+        handlers: dict,
+        concurrency: int = 4,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        lease_seconds: float = 120.0,
+        stats_interval: float = 60.0,
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.stats_interval = stats_interval
+
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def start(self):
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"inbox-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._housekeeping(), name="inbox-housekeeping"))
+        logger.info("[INBOX] %d worker(s) iniciados", self.concurrency)
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("[INBOX] Workers finalizados")
+
+    async def _wait_for_work(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, n: int):
+        while not self._stopping:
+            try:
+                events = await inbox.claim(limit=1, lease_seconds=self.lease_seconds)
+            except Exception:
+                logger.exception("[INBOX] Falha ao buscar eventos")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not events:
+                await self._wait_for_work()
+                continue
+
+            # ainda pode haver mais trabalho: acorda os outros workers
+            self._wakeup.set()
+            await self._process(events[0])
+
+    async def _process(self, event: dict):
+        handler = self.handlers.get(event["source"])
+        started = time.monotonic()
+
+        try:
+            if handler is None:
+                raise RuntimeError(f"Sem handler para source={event['source']}")
+            await handler(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = await inbox.fail(event, repr(e), self.max_attempts)
+            log = logger.error if status == "dead" else logger.warning
+            log(
+                "[INBOX] Falha ao processar evento",
+                exc_info=True,
+                extra={
+                    "event_id": event["id"],
+                    "resource_id": event["resource_id"],
+                    "attempts": event["attempts"],
+                    "status": status,
+                },
+            )
+            return
+
+        await inbox.complete(event["id"])
+        logger.info(
+            "[INBOX] Evento processado",
+            extra={
+                "event_id": event["id"],
+                "resource_id": event["resource_id"],
+                "duration_ms": int((time.monotonic() - started) * 1000),
+                "lag_ms": int(
+                    (datetime.now(timezone.utc) - event["received_at"]).total_seconds() * 1000
+                ),
+            },
+        )
+
+    async def _housekeeping(self):
+        while not self._stopping:
+            await asyncio.sleep(self.stats_interval)
+            try:
+                await inbox.release_expired_leases()
+                stats = await inbox.stats()
+                if stats["pending"] or stats["processing"]:
+                    logger.info("[INBOX] Fila", extra=stats)
+            except Exception:
+                logger.exception("[INBOX] Falha no housekeeping da fila")
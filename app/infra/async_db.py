@@ -0,0 +1,400 @@
+"""
+Camada de banco do app, sobre asyncpg.
+
+Consultas retornam dicts e rodam com `await` — de dentro dos handlers, jobs
+e do webhook sem bloquear o event loop. Tem pool próprio, independente do
+pool psycopg2 de `app.infra.db`, que só fica para migrações e scripts.
+"""
+import os
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import asyncpg
+
+from app.infra.cache import TTLCache
+from app.infra.metrics import observe_db
+from app.infra.query_log import TimedAsyncConnection
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+DB_ASYNC_POOL_MIN = int(os.getenv("DB_ASYNC_POOL_MIN", "2"))
+DB_ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", "10"))
+DB_ASYNC_POOL_MAX_IDLE = float(os.getenv("DB_ASYNC_POOL_MAX_IDLE", "300"))
+DB_ASYNC_COMMAND_TIMEOUT = float(os.getenv("DB_ASYNC_COMMAND_TIMEOUT", "30"))
+
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "50000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+# telegram_id -> users.id (imutável depois de criado)
+user_id_cache = TTLCache(maxsize=USER_CACHE_MAX, ttl=USER_CACHE_TTL)
+
+# Colunas de payments_v2 lidas pelo app. Nada de SELECT *: a linha já
+# carregou blobs de QR em base64 que nenhuma leitura usava.
+PAYMENT_COLUMNS = """
+    id, user_id, gateway, gateway_payment_id, external_reference, idempotency_key,
+    plan, amount, status, expires_at, created_at, confirmed_at, reminders_sent,
+    pix_qr_code, pix_qr_file_id
+"""
+PAYMENT_COLUMNS_P = ", ".join("p." + c.strip() for c in PAYMENT_COLUMNS.split(","))
+
+
+async def _init_connection(conn):
+    for typename in ("json", "jsonb"):
+        await conn.set_type_codec(
+            typename,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema="pg_catalog",
+        )
+
+
+async def init_pool():
+    """
+    Cria o pool asyncpg (idempotente). Chamado no startup do app.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                DATABASE_URL,
+                min_size=DB_ASYNC_POOL_MIN,
+                max_size=DB_ASYNC_POOL_MAX,
+                max_inactive_connection_lifetime=DB_ASYNC_POOL_MAX_IDLE,
+                command_timeout=DB_ASYNC_COMMAND_TIMEOUT,
+                init=_init_connection,
+                connection_class=TimedAsyncConnection,
+            )
+            logger.info(
+                "[DB] Pool asyncpg criado (min=%d, max=%d)",
+                DB_ASYNC_POOL_MIN, DB_ASYNC_POOL_MAX,
+            )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {}
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "min": _pool.get_min_size(),
+        "max": _pool.get_max_size(),
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+    }
+
+
+@asynccontextmanager
+async def get_db():
+    pool = await init_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            yield conn
+
+
+def now_iso():
+    return datetime.utcnow().isoformat()
+
+
+def _row(record):
+    return dict(record) if record is not None else None
+
+
+def _rows(records):
+    return [dict(r) for r in records]
+
+
+@observe_db
+async def get_or_create_user(telegram_id: int, nome: str = None):
+    """
+    Retorna o users.id do telegram_id, criando o usuário se preciso.
+    Usuários recorrentes saem do cache, sem ida ao banco; no miss é um
+    único upsert atômico (sem corrida entre cliques simultâneos).
+    """
+    user_id = user_id_cache.get(telegram_id)
+    if user_id is not None:
+        return user_id
+
+    async with get_db() as conn:
+        user_id = await conn.fetchval(
+            """
+            INSERT INTO users (telegram_id, nome, criado_em) VALUES ($1, $2, $3)
+            ON CONFLICT (telegram_id)
+                DO UPDATE SET nome = COALESCE(users.nome, EXCLUDED.nome)
+            RETURNING id
+            """,
+            telegram_id, nome, now_iso(),
+        )
+
+    user_id_cache.set(telegram_id, user_id)
+    return user_id
+
+
+def user_cache_stats() -> dict:
+    return user_id_cache.stats()
+
+
+@observe_db
+async def get_pending_payment(user_id: int):
+    async with get_db() as conn:
+        return _row(await conn.fetchrow(f"""
+            SELECT {PAYMENT_COLUMNS} FROM payments_v2
+            WHERE user_id = $1 AND status = 'pending' AND expires_at > NOW()
+              AND gateway_payment_id IS NOT NULL  -- placeholder em criação não conta
+            ORDER BY created_at DESC LIMIT 1
+        """, user_id))
+
+
+# Janela D-3..D-1: FLOOR(dias restantes) IN (1, 2, 3) equivale a
+# ends_at em [NOW() + 1 dia, NOW() + 4 dias) — predicado que usa o índice.
+SCHEDULE_EXPIRATION_REMINDERS_SQL = """
+    WITH eligible AS (
+        SELECT
+            s.id      AS subscription_id,
+            s.user_id,
+            s.plan,
+            FLOOR(EXTRACT(EPOCH FROM (s.ends_at - NOW())) / 86400)::int AS days_left
+        FROM subscriptions s
+        JOIN payments_v2 p ON p.id = s.payment_id
+        WHERE
+            s.status = 'active'
+            AND p.status = 'confirmed'
+            AND s.ends_at >= NOW() + INTERVAL '1 day'
+            AND s.ends_at <  NOW() + INTERVAL '4 days'
+            AND s.id > $1
+        ORDER BY s.id
+        LIMIT $2
+    ),
+    inserted AS (
+        INSERT INTO outbox_tasks
+            (user_id, task_type, status, scheduled_for, subscription_id, days_left, metadata)
+        SELECT
+            user_id,
+            'SUBSCRIPTION_EXPIRY_WARNING',
+            'pending',
+            NOW(),
+            subscription_id,
+            days_left,
+            jsonb_build_object(
+                'subscription_id', subscription_id,
+                'plan', plan,
+                'days_left', days_left
+            )
+        FROM eligible
+        ON CONFLICT (subscription_id, days_left)
+            WHERE task_type = 'SUBSCRIPTION_EXPIRY_WARNING'
+            DO NOTHING
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM eligible)::int          AS eligible,
+        (SELECT COUNT(*) FROM inserted)::int          AS created,
+        (SELECT MAX(subscription_id) FROM eligible)   AS last_id
+"""
+
+
+@observe_db
+async def schedule_expiration_reminders(batch_size: int | None = None) -> int:
+    """
+    Cria tasks de aviso de expiração (D-3, D-2, D-1) para assinaturas
+    ativas com pagamento confirmado.
+
+    Garante 1 task por (subscription_id, days_left) via índice único —
+    um único INSERT ... SELECT ... ON CONFLICT por lote. Sem `batch_size`
+    tudo sai em uma ida ao banco; com `batch_size`, em lotes de até esse
+    número de assinaturas, cada um na sua transação.
+
+    Retorna quantas tasks foram criadas.
+    """
+    last_id = 0
+    eligible_total = 0
+    created_total = 0
+
+    while True:
+        async with get_db() as conn:
+            result = await conn.fetchrow(
+                SCHEDULE_EXPIRATION_REMINDERS_SQL, last_id, batch_size
+            )
+
+        eligible_total += result["eligible"]
+        created_total += result["created"]
+
+        if not batch_size or result["eligible"] < batch_size:
+            break
+        last_id = result["last_id"]
+
+    logger.info(
+        "[REMINDERS] assinaturas elegíveis: %d, tasks criadas: %d",
+        eligible_total, created_total,
+    )
+    return created_total
+
+
+@observe_db
+async def get_payments_history_by_user(user_id: int, limit: int = 10):
+    """
+    Retorna os últimos pagamentos de um usuário (mais recentes primeiro).
+    """
+    async with get_db() as conn:
+        return _rows(await conn.fetch(
+            """
+            SELECT
+                id,
+                plan,
+                amount,
+                status,
+                created_at,
+                expires_at,
+                confirmed_at,
+                gateway,
+                gateway_payment_id
+            FROM payments_v2
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+            LIMIT $2
+            """,
+            user_id, limit,
+        ))
+
+
+@observe_db
+async def set_payment_qr_file_id(gateway_payment_id: str, file_id: str):
+    async with get_db() as conn:
+        await conn.execute(
+            "UPDATE payments_v2 SET pix_qr_file_id = $1 WHERE gateway_payment_id = $2",
+            file_id, str(gateway_payment_id),
+        )
+
+
+@observe_db
+async def get_expired_pending_payments():
+    async with get_db() as conn:
+        return _rows(await conn.fetch(f"""
+            SELECT {PAYMENT_COLUMNS} FROM payments_v2 WHERE status = 'pending' AND expires_at <= NOW()
+        """))
+
+
+@observe_db
+async def get_pending_payments_for_reminder(max_reminders: int = 3):
+    async with get_db() as conn:
+        return _rows(await conn.fetch(f"""
+            SELECT {PAYMENT_COLUMNS} FROM payments_v2
+            WHERE status = 'pending' AND expires_at > NOW() AND reminders_sent < $1
+              AND gateway_payment_id IS NOT NULL
+        """, max_reminders))
+
+
+@observe_db
+async def increment_payment_reminder(payment_id: int):
+    async with get_db() as conn:
+        await conn.execute(
+            "UPDATE payments_v2 SET reminders_sent = reminders_sent + 1 WHERE id = $1",
+            payment_id,
+        )
+
+
+@observe_db
+async def get_confirmed_unprocessed_payments(limit: int = 100, after: tuple | None = None):
+    """
+    Pagamentos confirmados ainda sem assinatura, mais antigos primeiro.
+    `after` = (created_at, id) do último item do lote anterior (keyset).
+    """
+    after_created, after_id = after or (None, 0)
+    async with get_db() as conn:
+        return _rows(await conn.fetch(f"""
+            SELECT {PAYMENT_COLUMNS_P}
+            FROM payments_v2 p
+            LEFT JOIN subscriptions s ON s.payment_id = p.id
+            WHERE p.status = 'confirmed' AND s.id IS NULL
+              AND ($1::timestamptz IS NULL OR (p.created_at, p.id) > ($1::timestamptz, $2::int))
+            ORDER BY p.created_at, p.id
+            LIMIT $3
+        """, after_created, after_id, limit))
+
+
+@observe_db
+async def get_pending_payments_for_reconciliation(min_age_seconds: float, max_age_seconds: float,
+                                                  limit: int = 5000):
+    """
+    Pendentes criados entre `max_age_seconds` e `min_age_seconds` atrás,
+    mais antigos primeiro. A idade mínima evita disputar com PIX recém-criado.
+    """
+    async with get_db() as conn:
+        return _rows(await conn.fetch("""
+            SELECT id, user_id, gateway_payment_id, external_reference, created_at, expires_at
+            FROM payments_v2
+            WHERE status = 'pending'
+              AND gateway_payment_id IS NOT NULL
+              AND created_at <= NOW() - make_interval(secs => $1)
+              AND created_at > NOW() - make_interval(secs => $2)
+            ORDER BY created_at, id
+            LIMIT $3
+        """, float(min_age_seconds), float(max_age_seconds), limit))
+
+
+@observe_db
+async def expire_pending_payments(gateway_payment_ids: list) -> int:
+    """
+    Expira, num único UPDATE, os pendentes da lista. Retorna quantos mudaram.
+    """
+    if not gateway_payment_ids:
+        return 0
+    async with get_db() as conn:
+        result = await conn.execute(
+            """
+            UPDATE payments_v2 SET status = 'expired'
+            WHERE gateway_payment_id = ANY($1::text[]) AND status = 'pending'
+            """,
+            [str(gpid) for gpid in gateway_payment_ids],
+        )
+    return int(result.split()[-1])
+
+
+@observe_db
+async def get_user_by_id(user_id: int):
+    async with get_db() as conn:
+        return _row(await conn.fetchrow("SELECT * FROM users WHERE id = $1", user_id))
+
+
+@observe_db
+async def get_active_subscription_with_days(user_id: int):
+    """
+    Retorna assinatura ativa + dias restantes para um user_id.
+    """
+    async with get_db() as conn:
+        return _row(await conn.fetchrow(
+            """
+            SELECT
+                s.*,
+                GREATEST(
+                    0,
+                    FLOOR(EXTRACT(EPOCH FROM (s.ends_at - NOW())) / 86400)
+                ) AS dias_restantes
+            FROM subscriptions s
+            WHERE
+                s.user_id = $1
+                AND s.status = 'active'
+                AND s.ends_at > NOW()
+            ORDER BY s.ends_at DESC
+            LIMIT 1
+            """,
+            user_id,
+        ))
@@ -0,0 +1,160 @@
+"""
+Backfill online das colunas de data TEXT -> TIMESTAMPTZ.
+
+Roda ANTES do deploy da versão que lê as colunas como timestamptz
+(veja o comentário "TEXT -> TIMESTAMPTZ" em `app.infra.migrations`):
+
+    python -m app.infra.backfill_timestamps [--batch-size 1000] [--sleep 0.05] [--swap]
+
+1. aplica as migrações até a 0003 (colunas-sombra + trigger);
+2. preenche as linhas antigas em lotes por faixa de id, cada lote na sua
+   própria transação curta — sem lock de tabela, o app continua escrevendo;
+3. valida os CHECK NOT NULL (não bloqueia escritas);
+4. cria os índices das colunas novas com CREATE INDEX CONCURRENTLY.
+
+Depois disso a 0004 (troca das colunas) é só catálogo. Ela roda no boot da
+versão nova, ou aqui mesmo com --swap. Sem este backfill a 0004 recusa
+rodar e o boot falha com a instrução de rodar esta ferramenta.
+"""
+import argparse
+import logging
+import time
+
+import psycopg2
+
+from app.infra import db, migrations
+
+logger = logging.getLogger(__name__)
+
+SHADOW_MIGRATION = 3
+SWAP_MIGRATION = 4
+
+
+def backfill_table(table: str, batch_size: int = 1000, sleep: float = 0.0) -> int:
+    """
+    Preenche as colunas-sombra de `table` em lotes. Retorna linhas atualizadas.
+    Pode ser interrompido e reexecutado: só toca linhas ainda não preenchidas.
+    """
+    with db.get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM {table}")
+        low, high = cur.fetchone()
+
+    total = 0
+    started = time.monotonic()
+    last_id = low - 1
+
+    while last_id < high:
+        upper = last_id + batch_size
+        with db.get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"""
+                UPDATE {table}
+                SET {migrations.shadow_backfill_sql(table)}
+                WHERE id > %s AND id <= %s
+                  AND ({migrations.shadow_missing_sql(table)})
+                """,
+                (last_id, upper),
+            )
+            total += cur.rowcount
+
+        last_id = upper
+        logger.info(
+            "[BACKFILL] %s: até id=%d de %d (%d linhas atualizadas)",
+            table, min(last_id, high), high, total,
+        )
+        if sleep:
+            time.sleep(sleep)
+
+    logger.info(
+        "[BACKFILL] %s concluída: %d linhas em %.1fs",
+        table, total, time.monotonic() - started,
+    )
+    return total
+
+
+def _autocommit_connection():
+    conn = psycopg2.connect(db.DATABASE_URL)
+    conn.autocommit = True
+    return conn
+
+
+def validate_constraints():
+    conn = _autocommit_connection()
+    try:
+        cur = conn.cursor()
+        for table, cols in migrations.NOT_NULL_TIMESTAMP_COLUMNS.items():
+            for col in cols:
+                name = migrations.not_null_constraint(table, col)
+                logger.info("[BACKFILL] Validando %s", name)
+                cur.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+    finally:
+        conn.close()
+
+
+def build_indexes():
+    conn = _autocommit_connection()
+    try:
+        cur = conn.cursor()
+        for name, definition in migrations.TIMESTAMP_INDEXES:
+            index_name = f"{name}_tz"
+
+            # um CONCURRENTLY interrompido deixa o índice INVALID para trás
+            cur.execute(
+                """
+                SELECT i.indisvalid
+                FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+                WHERE c.relname = %s
+                """,
+                (index_name,),
+            )
+            row = cur.fetchone()
+            if row and row[0]:
+                continue
+            if row:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+            logger.info("[BACKFILL] Criando índice %s", index_name)
+            cur.execute(
+                f"CREATE INDEX CONCURRENTLY {index_name} {definition.format(tz='_tz')}"
+            )
+    finally:
+        conn.close()
+
+
+def run(batch_size: int = 1000, sleep: float = 0.0, swap: bool = False):
+    pending = {m[0] for m in migrations.pending_migrations()}
+    if SWAP_MIGRATION not in pending:
+        logger.info("[BACKFILL] Colunas já convertidas para timestamptz — nada a fazer")
+        return
+
+    migrations.migrate(target=SHADOW_MIGRATION)
+
+    for table in migrations.TIMESTAMP_COLUMNS:
+        backfill_table(table, batch_size=batch_size, sleep=sleep)
+
+    validate_constraints()
+    build_indexes()
+
+    if swap:
+        migrations.migrate(target=SWAP_MIGRATION)
+    else:
+        logger.info("[BACKFILL] Pronto — a 0004 será aplicada no próximo deploy")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--sleep", type=float, default=0.05,
+                        help="pausa entre lotes, em segundos")
+    parser.add_argument("--swap", action="store_true",
+                        help="aplica a 0004 ao final")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    run(batch_size=args.batch_size, sleep=args.sleep, swap=args.swap)
+
+
+if __name__ == "__main__":
+    main()
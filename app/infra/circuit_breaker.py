@@ -0,0 +1,105 @@
+"""
+Circuit breaker para dependências externas (ex.: Mercado Pago).
+
+- closed: chamadas passam; `failure_threshold` falhas seguidas abrem o
+  circuito;
+- open: chamadas falham na hora com `CircuitOpenError` durante
+  `reset_timeout` segundos — ninguém fica pendurado esperando um gateway
+  fora do ar;
+- half_open: passado o `reset_timeout`, uma chamada de teste por vez; sucesso
+  fecha o circuito, falha abre de novo.
+
+Feito para um único event loop: sem locks.
+"""
+import logging
+import time
+
+from app.infra.metrics import CIRCUIT_BREAKER_REJECTED, CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRIPS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Circuito aberto: a chamada nem foi feita. `retry_after` em segundos."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito '{name}' aberto — tente novamente em {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        CIRCUIT_BREAKER_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        """Levanta `CircuitOpenError` se a chamada não deve ser feita."""
+        now = time.monotonic()
+
+        if self._state == OPEN:
+            remaining = self.reset_timeout - (now - self._opened_at)
+            if remaining > 0:
+                CIRCUIT_BREAKER_REJECTED.labels(self.name).inc()
+                raise CircuitOpenError(self.name, remaining)
+            self._set_state(HALF_OPEN)
+
+        if self._state == HALF_OPEN:
+            # uma chamada de teste por vez; teste sem resposta (ex.: task
+            # cancelada) não trava o circuito: expira após reset_timeout
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                CIRCUIT_BREAKER_REJECTED.labels(self.name).inc()
+                raise CircuitOpenError(self.name, self.reset_timeout - (now - self._probe_started))
+            self._probe_started = now
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_started = None
+        if self._state != CLOSED:
+            logger.info("[CIRCUIT] Circuito %s fechado", self.name)
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> bool:
+        """Registra a falha. Retorna True se o circuito ficou aberto."""
+        self._failures += 1
+        self._probe_started = None
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._trip()
+            return True
+        return False
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        if self._state != OPEN:
+            CIRCUIT_BREAKER_TRIPS.labels(self.name).inc()
+            logger.warning(
+                "[CIRCUIT] Circuito %s aberto após %d falha(s) — falhando rápido por %.0fs",
+                self.name, self._failures, self.reset_timeout,
+            )
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self._state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self._failures}
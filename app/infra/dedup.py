@@ -0,0 +1,111 @@
+"""
+Deduplicação de notificações de webhook.
+
+Duas camadas, consultadas antes de qualquer chamada ao gateway:
+
+- memória: TTLCache com as chaves vistas recentemente no processo
+  (pega as rajadas de reentrega sem nem tocar no banco);
+- banco: `webhook_seen_events`, gravada no mesmo statement que enfileira
+  na inbox (`inbox.enqueue(..., dedup_key=...)`) — vale entre réplicas e
+  restarts, dentro da janela de retenção.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from app.infra import async_db, inbox
+from app.infra.cache import TTLCache
+from app.infra.metrics import WEBHOOK_DEDUP_EVENTS
+
+WEBHOOK_DEDUP_MEMORY_TTL = float(os.getenv("WEBHOOK_DEDUP_MEMORY_TTL", "600"))
+WEBHOOK_DEDUP_MEMORY_MAX = int(os.getenv("WEBHOOK_DEDUP_MEMORY_MAX", "50000"))
+WEBHOOK_DEDUP_RETENTION_HOURS = float(os.getenv("WEBHOOK_DEDUP_RETENTION_HOURS", "72"))
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(source: str, payload: dict) -> str:
+    """
+    Chave da notificação. O Mercado Pago reenvia a mesma notificação com o
+    mesmo `id`; sem `id`, usa o hash do corpo (reentregas são idênticas).
+    Não usa só (action, data.id): dois `payment.updated` do mesmo pagamento
+    podem ser transições diferentes (pendente -> aprovado).
+    """
+    notification_id = payload.get("id")
+    if notification_id is not None:
+        return f"{source}:{notification_id}"
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return f"{source}:sha256:{hashlib.sha256(body.encode()).hexdigest()}"
+
+
+class WebhookDeduplicator:
+    def __init__(self, memory_ttl: float = 600.0, memory_max: int = 50_000,
+                 retention_hours: float = 72.0):
+        self.retention_hours = retention_hours
+        self._recent = TTLCache(maxsize=memory_max, ttl=memory_ttl)
+        self._lock = threading.Lock()
+        self.received = 0
+        self.duplicates_memory = 0
+        self.duplicates_db = 0
+
+    async def enqueue_if_new(self, source: str, payload: dict, event_type: str | None,
+                             resource_id: str | None) -> int | None:
+        """
+        Enfileira na inbox se a notificação for inédita. Retorna o id do
+        evento, ou None se for duplicata (descartada).
+        """
+        key = event_key(source, payload)
+
+        WEBHOOK_DEDUP_EVENTS.labels("received").inc()
+        with self._lock:
+            self.received += 1
+            if key in self._recent:
+                self.duplicates_memory += 1
+                WEBHOOK_DEDUP_EVENTS.labels("duplicates_memory").inc()
+                logger.info("[DEDUP] Duplicata descartada (memória)", extra={"event_key": key})
+                return None
+
+        event_id = await inbox.enqueue(source, event_type, resource_id, payload, dedup_key=key)
+        self._recent.set(key, True)
+
+        if event_id is None:
+            with self._lock:
+                self.duplicates_db += 1
+            WEBHOOK_DEDUP_EVENTS.labels("duplicates_db").inc()
+            logger.info("[DEDUP] Duplicata descartada (banco)", extra={"event_key": key})
+
+        return event_id
+
+    async def purge(self) -> int:
+        """Apaga chaves persistidas fora da janela de retenção."""
+        async with async_db.get_db() as conn:
+            result = await conn.execute(
+                """
+                DELETE FROM webhook_seen_events
+                WHERE first_seen_at < NOW() - make_interval(secs => $1)
+                """,
+                self.retention_hours * 3600,
+            )
+        removed = int(result.split()[-1])
+        logger.info("[DEDUP] Chaves antigas removidas: %d", removed)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            duplicates = self.duplicates_memory + self.duplicates_db
+            return {
+                "received": self.received,
+                "duplicates_memory": self.duplicates_memory,
+                "duplicates_db": self.duplicates_db,
+                "duplicate_ratio": (duplicates / self.received) if self.received else 0.0,
+                "memory": self._recent.stats(),
+            }
+
+
+deduplicator = WebhookDeduplicator(
+    memory_ttl=WEBHOOK_DEDUP_MEMORY_TTL,
+    memory_max=WEBHOOK_DEDUP_MEMORY_MAX,
+    retention_hours=WEBHOOK_DEDUP_RETENTION_HOURS,
+)
@@ -0,0 +1,105 @@
+"""
+Fila de expiração de assinaturas (colunas `expiry_*` de `subscriptions`).
+
+Toda assinatura nasce com `expiry_processed_at` NULL e entra na fila pelo
+índice parcial `subscriptions_expiry_due_idx` (ends_at). Quando `ends_at`
+passa, ela é reservada (SKIP LOCKED + lease em `expiry_next_attempt_at`),
+o acesso ao grupo é revogado e a linha é marcada como processada. Sem
+janela de tempo: depois de uma parada, tudo que venceu no meio é tratado.
+"""
+import logging
+
+from app.infra import async_db
+from app.infra.inbox import backoff_seconds
+
+logger = logging.getLogger(__name__)
+
+
+async def claim_due(limit: int = 100, lease_seconds: float = 120.0) -> list:
+    """
+    Reserva até `limit` assinaturas vencidas e ainda não processadas, mais
+    antigas primeiro, marcando-as como 'expired'. `has_active` indica que
+    o usuário tem outra assinatura vigente (não deve perder o acesso).
+    """
+    async with async_db.get_db() as conn:
+        rows = await conn.fetch(
+            """
+            WITH due AS (
+                SELECT s.id
+                FROM subscriptions s
+                WHERE s.expiry_processed_at IS NULL
+                  AND s.ends_at <= NOW()
+                  AND (s.expiry_next_attempt_at IS NULL OR s.expiry_next_attempt_at <= NOW())
+                ORDER BY s.ends_at
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE subscriptions s
+            SET status = CASE WHEN s.status = 'active' THEN 'expired' ELSE s.status END,
+                expiry_attempts = s.expiry_attempts + 1,
+                expiry_next_attempt_at = NOW() + make_interval(secs => $2)
+            FROM due, users u
+            WHERE s.id = due.id
+              AND u.id = s.user_id
+            RETURNING
+                s.id, s.user_id, s.plan, s.ends_at, s.expiry_attempts,
+                u.telegram_id,
+                EXISTS (
+                    SELECT 1 FROM subscriptions o
+                    WHERE o.user_id = s.user_id
+                      AND o.id <> s.id
+                      AND o.status = 'active'
+                      AND o.ends_at > NOW()
+                ) AS has_active
+            """,
+            limit, float(lease_seconds),
+        )
+    return [dict(r) for r in rows]
+
+
+async def mark_processed(subscription_ids: list):
+    if not subscription_ids:
+        return
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE subscriptions
+            SET expiry_processed_at = NOW(), expiry_next_attempt_at = NULL
+            WHERE id = ANY($1::int[])
+            """,
+            subscription_ids,
+        )
+
+
+async def retry_later(sub: dict, cap: float = 3600.0):
+    """
+    Reagenda a revogação com backoff. Não há dead-letter: acesso vencido
+    precisa ser removido, então tenta até conseguir (com teto de 1h).
+    """
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE subscriptions
+            SET expiry_next_attempt_at = NOW() + make_interval(secs => $2)
+            WHERE id = $1
+            """,
+            sub["id"], float(backoff_seconds(sub["expiry_attempts"], cap=cap)),
+        )
+
+
+async def next_due_in() -> float | None:
+    """
+    Segundos até a próxima assinatura da fila ficar elegível (0 se já há
+    alguma), ou None se a fila estiver vazia.
+    """
+    async with async_db.get_db() as conn:
+        seconds = await conn.fetchval(
+            """
+            SELECT EXTRACT(EPOCH FROM
+                MIN(GREATEST(ends_at, COALESCE(expiry_next_attempt_at, ends_at))) - NOW()
+            )::float
+            FROM subscriptions
+            WHERE expiry_processed_at IS NULL
+            """
+        )
+    return None if seconds is None else max(seconds, 0.0)
@@ -0,0 +1,198 @@
+"""
+Inbox durável de webhooks (tabela `webhook_inbox`).
+
+O endpoint só grava a notificação e responde; os workers de
+`app.inbox_worker` consomem daqui com retry/backoff. Eventos do mesmo
+`resource_id` (ex.: mesmo pagamento) são entregues um de cada vez, na
+ordem de chegada.
+"""
+import logging
+import random
+
+from app.infra import async_db
+
+logger = logging.getLogger(__name__)
+
+
+async def enqueue(source: str, event_type: str | None, resource_id: str | None, payload: dict,
+                  dedup_key: str | None = None) -> int | None:
+    """
+    Grava o evento na inbox. Com `dedup_key`, registra a chave em
+    `webhook_seen_events` no mesmo statement e só enfileira se ela for
+    nova — retorna None para duplicatas.
+    """
+    async with async_db.get_db() as conn:
+        if dedup_key is None:
+            return await conn.fetchval(
+                """
+                INSERT INTO webhook_inbox (source, event_type, resource_id, payload)
+                VALUES ($1, $2, $3, $4)
+                RETURNING id
+                """,
+                source, event_type, resource_id, payload,
+            )
+
+        return await conn.fetchval(
+            """
+            WITH seen AS (
+                INSERT INTO webhook_seen_events (event_key)
+                VALUES ($5)
+                ON CONFLICT (event_key) DO NOTHING
+                RETURNING event_key
+            )
+            INSERT INTO webhook_inbox (source, event_type, resource_id, payload)
+            SELECT $1::text, $2::text, $3::text, $4::jsonb FROM seen
+            RETURNING id
+            """,
+            source, event_type, resource_id, payload, dedup_key,
+        )
+
+
+async def claim(limit: int = 1, lease_seconds: float = 60.0) -> list:
+    """
+    Reserva até `limit` eventos prontos (SKIP LOCKED: vários workers e
+    réplicas podem consumir em paralelo). Só o evento mais antigo em aberto
+    de cada resource_id é elegível.
+    """
+    async with async_db.get_db() as conn:
+        rows = await conn.fetch(
+            """
+            WITH candidate AS (
+                SELECT i.id
+                FROM webhook_inbox i
+                WHERE i.status = 'pending'
+                  AND i.next_attempt_at <= NOW()
+                  AND NOT EXISTS (
+                      SELECT 1 FROM webhook_inbox j
+                      WHERE j.resource_id = i.resource_id
+                        AND j.id < i.id
+                        AND j.status IN ('pending', 'processing')
+                  )
+                ORDER BY i.next_attempt_at, i.id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE webhook_inbox w
+            SET status = 'processing',
+                attempts = w.attempts + 1,
+                locked_until = NOW() + make_interval(secs => $2)
+            FROM candidate
+            WHERE w.id = candidate.id
+            RETURNING w.*
+            """,
+            limit, float(lease_seconds),
+        )
+    return [dict(r) for r in rows]
+
+
+async def complete(event_id: int):
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE webhook_inbox
+            SET status = 'done', processed_at = NOW(), locked_until = NULL, last_error = NULL
+            WHERE id = $1
+            """,
+            event_id,
+        )
+
+
+def backoff_seconds(attempts: int, base: float = 5.0, cap: float = 900.0) -> float:
+    """Backoff exponencial com jitter: ~5s, 10s, 20s, ... até `cap`."""
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def fail(event: dict, error: str, max_attempts: int) -> str:
+    """
+    Registra a falha. Volta para a fila com backoff ou, depois de
+    `max_attempts` tentativas, vai para 'dead'. Retorna o novo status.
+    """
+    status = "dead" if event["attempts"] >= max_attempts else "pending"
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE webhook_inbox
+            SET status = $2,
+                last_error = $3,
+                locked_until = NULL,
+                next_attempt_at = NOW() + make_interval(secs => $4)
+            WHERE id = $1
+            """,
+            event["id"], status, error[:2000], backoff_seconds(event["attempts"]),
+        )
+    return status
+
+
+async def release_expired_leases() -> int:
+    """
+    Devolve para a fila eventos de workers que morreram no meio do
+    processamento (lease vencido).
+    """
+    async with async_db.get_db() as conn:
+        result = await conn.execute(
+            """
+            UPDATE webhook_inbox
+            SET status = 'pending', locked_until = NULL
+            WHERE status = 'processing' AND locked_until < NOW()
+            """
+        )
+    released = int(result.split()[-1])
+    if released:
+        logger.warning("[INBOX] %d evento(s) com lease vencido devolvidos à fila", released)
+    return released
+
+
+async def purge(done_retention_hours: float, dead_retention_hours: float,
+                batch_size: int = 5000) -> int:
+    """
+    Apaga eventos 'done' e 'dead' fora da janela de retenção, em lotes
+    (cada um na sua transação, sem segurar lock na tabela inteira).
+    Retorna quantos foram removidos.
+    """
+    removed = 0
+    while True:
+        async with async_db.get_db() as conn:
+            result = await conn.execute(
+                """
+                WITH doomed AS (
+                    SELECT id FROM webhook_inbox
+                    WHERE (status = 'done' AND processed_at < NOW() - make_interval(secs => $1))
+                       OR (status = 'dead' AND received_at < NOW() - make_interval(secs => $2))
+                    LIMIT $3
+                )
+                DELETE FROM webhook_inbox w
+                USING doomed
+                WHERE w.id = doomed.id
+                """,
+                done_retention_hours * 3600, dead_retention_hours * 3600, batch_size,
+            )
+        deleted = int(result.split()[-1])
+        removed += deleted
+        if deleted < batch_size:
+            break
+
+    logger.info("[INBOX] Eventos antigos removidos: %d", removed)
+    return removed
+
+
+async def stats() -> dict:
+    """
+    Profundidade da fila e atraso do evento pendente mais antigo (segundos).
+    """
+    async with async_db.get_db() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'pending')    AS pending,
+                COUNT(*) FILTER (WHERE status = 'processing') AS processing,
+                COUNT(*) FILTER (WHERE status = 'dead')       AS dead,
+                COALESCE(
+                    EXTRACT(EPOCH FROM NOW() - MIN(received_at) FILTER (WHERE status = 'pending')),
+                    0
+                )::float AS oldest_pending_seconds
+            FROM webhook_inbox
+            WHERE status IN ('pending', 'processing', 'dead')
+            """
+        )
+    return dict(row)
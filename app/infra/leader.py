@@ -0,0 +1,132 @@
+"""
+Eleição de líder entre workers/réplicas via advisory lock do Postgres.
+
+Cada processo tenta `pg_try_advisory_lock` numa conexão dedicada; quem
+consegue vira líder enquanto essa sessão viver. Se o processo morrer ou a
+conexão cair, o Postgres solta o lock e outro worker assume na próxima
+tentativa (`retry_interval`).
+
+O líder confere a sessão a cada `check_interval`; se a checagem falhar
+ou demorar mais que `lease_seconds`, ele se rebaixa na hora — melhor
+ficar um instante sem líder do que ter dois. Se `on_elected` falhar, o
+processo chama `on_demoted` para desfazer o que subiu, solta o lock e
+tenta de novo depois de `retry_interval`.
+"""
+import asyncio
+import logging
+import os
+import socket
+
+import asyncpg
+
+from app.infra import async_db
+
+LEADER_LOCK_KEY = 7_310_002
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElector:
+    def __init__(
+        self,
+        on_elected,
+        on_demoted,
+        lock_key: int = LEADER_LOCK_KEY,
+        retry_interval: float = 10.0,
+        check_interval: float = 5.0,
+        lease_seconds: float = 15.0,
+    ):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.lock_key = lock_key
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self.lease_seconds = lease_seconds
+
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self._conn = None
+        self._task = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="leader-election")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._demote("shutdown")
+        await self._close()
+
+    async def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                # fechar a sessão solta o lock
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(async_db.DATABASE_URL)
+
+                if self.is_leader:
+                    await asyncio.wait_for(self._conn.fetchval("SELECT 1"), timeout=self.lease_seconds)
+                    await asyncio.sleep(self.check_interval)
+                    continue
+
+                acquired = await asyncio.wait_for(
+                    self._conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key),
+                    timeout=self.lease_seconds,
+                )
+                if acquired:
+                    self.is_leader = True
+                    logger.info("[LEADER] Eleito líder", extra={"identity": self.identity})
+                    if await self._call(self.on_elected, "on_elected"):
+                        continue
+                    # subiu pela metade: desfaz o que iniciou, solta o lock
+                    # (outro worker pode assumir) e tenta de novo depois
+                    await self._demote("falha ao assumir")
+                    await self._release()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[LEADER] Falha na sessão de eleição")
+                await self._demote("sessão perdida")
+                await self._close()
+
+            await asyncio.sleep(self.retry_interval)
+
+    async def _release(self):
+        try:
+            await asyncio.wait_for(
+                self._conn.fetchval("SELECT pg_advisory_unlock($1)", self.lock_key),
+                timeout=self.lease_seconds,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[LEADER] Falha ao soltar o lock — encerrando a sessão")
+            await self._close()
+
+    async def _demote(self, reason: str):
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        logger.warning("[LEADER] Deixou de ser líder (%s)", reason, extra={"identity": self.identity})
+        await self._call(self.on_demoted, "on_demoted")
+
+    async def _call(self, callback, name: str) -> bool:
+        try:
+            await callback()
+            return True
+        except Exception:
+            logger.exception("[LEADER] Falha em %s", name)
+            return False
@@ -0,0 +1,154 @@
+"""
+Cliente asyncio da API REST do Mercado Pago (httpx).
+
+Substitui o `mercadopago.SDK`, que é síncrono e trava o event loop durante
+toda a ida ao gateway. Mantém um pool de conexões com keep-alive, timeouts
+configuráveis por operação, um limite de chamadas simultâneas e um circuit
+breaker (`app.infra.circuit_breaker`) que falha rápido quando o gateway
+degrada, em vez de empilhar handlers esperando por ele.
+
+As respostas seguem o formato do SDK — {"status": <http>, "response": <json>}
+— para o código que já tratava o retorno do SDK continuar igual.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+import httpx
+
+from app.infra.circuit_breaker import CircuitBreaker
+from app.infra.metrics import MERCADOPAGO_REQUEST_SECONDS, MERCADOPAGO_RETRIES, http_outcome
+
+logger = logging.getLogger(__name__)
+
+MP_API_BASE_URL = "https://api.mercadopago.com"
+
+
+class MercadoPagoClient:
+    def __init__(
+        self,
+        access_token: str,
+        base_url: str = MP_API_BASE_URL,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 60.0,
+        max_concurrency: int = 10,
+        timeouts: dict | None = None,
+        retry_attempts: int = 2,
+        retry_base_delay: float = 0.2,
+        retry_max_delay: float = 2.0,
+        breaker: CircuitBreaker | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self._client = httpx.AsyncClient(
+            transport=transport,
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._timeouts = {
+            operation: httpx.Timeout(seconds, connect=min(connect_timeout, seconds))
+            for operation, seconds in (timeouts or {}).items()
+        }
+        self._retry_attempts = retry_attempts
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self.breaker = breaker or CircuitBreaker("mercadopago")
+
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> dict:
+        """
+        Chamada com timeout da operação, circuit breaker e — só para GET,
+        que é idempotente — novas tentativas com backoff e jitter em erro de
+        rede, timeout, 429 ou 5xx. Com o circuito aberto levanta
+        `CircuitOpenError` sem chamar o gateway; a falha que abre o
+        circuito é devolvida/levantada como veio, sem nova tentativa.
+        """
+        attempts = 1 + (self._retry_attempts if method == "GET" else 0)
+        timeout = self._timeouts.get(operation)
+        if timeout is not None:
+            kwargs.setdefault("timeout", timeout)
+
+        for attempt in range(1, attempts + 1):
+            self.breaker.before_call()
+            try:
+                response = await self._send(operation, method, path, **kwargs)
+            except httpx.TransportError as e:
+                # circuito abriu com esta falha: devolve o erro real em vez
+                # de tentar de novo e levar CircuitOpenError
+                if self.breaker.record_failure() or attempt == attempts:
+                    raise
+                reason = type(e).__name__
+            else:
+                if not _is_failure(response.status_code):
+                    self.breaker.record_success()
+                    return _result(response)
+                if self.breaker.record_failure() or attempt == attempts:
+                    return _result(response)
+                reason = f"HTTP {response.status_code}"
+
+            delay = random.uniform(0, min(self._retry_max_delay, self._retry_base_delay * 2 ** (attempt - 1)))
+            MERCADOPAGO_RETRIES.labels(operation).inc()
+            logger.info(
+                "Mercado Pago %s falhou (%s) — nova tentativa em %.2fs",
+                operation, reason, delay,
+                extra={"operation": operation, "attempt": attempt},
+            )
+            await asyncio.sleep(delay)
+
+    async def _send(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            started = time.perf_counter()
+            status = None
+            try:
+                response = await self._client.request(method, path, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                MERCADOPAGO_REQUEST_SECONDS.labels(operation, http_outcome(status)).observe(
+                    time.perf_counter() - started
+                )
+
+    async def create_payment(self, payment_data: dict, idempotency_key: str | None = None) -> dict:
+        headers = {"X-Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+        return await self._request("create_payment", "POST", "/v1/payments", json=payment_data, headers=headers)
+
+    async def get_payment(self, payment_id) -> dict:
+        return await self._request("get_payment", "GET", f"/v1/payments/{payment_id}")
+
+    async def search_payments(self, **params) -> dict:
+        """
+        `GET /v1/payments/search` — filtros e paginação (`limit`, `offset`,
+        `range`, `begin_date`, `end_date`, `external_reference`...) vão
+        direto como query string.
+        """
+        return await self._request("search_payments", "GET", "/v1/payments/search", params=params)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def _is_failure(status: int) -> bool:
+    # 4xx (exceto 429) é erro do pedido, não do gateway: não conta para o circuito
+    return status == 429 or status >= 500
+
+
+def _result(response: httpx.Response) -> dict:
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"raw": response.text}
+
+    return {"status": response.status_code, "response": body}
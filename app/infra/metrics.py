@@ -0,0 +1,262 @@
+"""
+Métricas Prometheus do processo (expostas em `/metrics`).
+
+Histogramas/contadores são atualizados direto no caminho quente (custo de
+um `time.perf_counter()` e um lock por observação). Os gauges de estado —
+pools, filas, caches — são recalculados só na hora do scrape, por
+`refresh_gauges()`.
+"""
+import asyncio
+import functools
+import logging
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+logger = logging.getLogger(__name__)
+
+# buckets em segundos: de 1ms (cache/banco) a 30s (gateway/timeout)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+
+# =========================
+# HISTOGRAMAS / CONTADORES
+# =========================
+
+TELEGRAM_UPDATE_SECONDS = Histogram(
+    "telegram_update_seconds", "Tempo para processar um update do Telegram, por handler.",
+    ["handler"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_UPDATE_ERRORS = Counter(
+    "telegram_update_errors_total", "Exceções em handlers de update.", ["handler"],
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Duração das funções de acesso ao banco.",
+    ["layer", "function"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total", "Exceções nas funções de acesso ao banco.", ["layer", "function"],
+)
+
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_seconds", "Duração de cada statement SQL, pela função que o disparou.",
+    ["caller"], buckets=LATENCY_BUCKETS,
+)
+DB_REQUEST_ROUND_TRIPS = Histogram(
+    "db_request_round_trips", "Idas ao banco por requisição (ex.: update do Telegram).",
+    ["request"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+
+MERCADOPAGO_REQUEST_SECONDS = Histogram(
+    "mercadopago_request_seconds", "Duração das chamadas à API do Mercado Pago.",
+    ["operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+
+MERCADOPAGO_RETRIES = Counter(
+    "mercadopago_retries_total", "Novas tentativas de chamadas ao Mercado Pago.", ["operation"],
+)
+CIRCUIT_BREAKER_TRIPS = Counter(
+    "circuit_breaker_trips_total", "Vezes que o circuito abriu.", ["breaker"],
+)
+CIRCUIT_BREAKER_REJECTED = Counter(
+    "circuit_breaker_rejected_total", "Chamadas recusadas com o circuito aberto.", ["breaker"],
+)
+
+PAYMENT_STATUS_LOOKUPS = Counter(
+    "payment_status_lookups_total",
+    "Consultas de status de pagamento, por origem da resposta (cache, coalesced, gateway).",
+    ["source"],
+)
+
+WEBHOOK_DEDUP_EVENTS = Counter(
+    "webhook_dedup_events_total",
+    "Notificações de webhook recebidas e duplicadas descartadas (received, duplicates_memory, duplicates_db).",
+    ["kind"],
+)
+
+PAYMENT_RECONCILE_ROWS = Counter(
+    "payment_reconcile_rows_total",
+    "Pagamentos pendentes reconciliados com o gateway, por resultado.",
+    ["result"],
+)
+
+TELEGRAM_API_SECONDS = Histogram(
+    "telegram_api_seconds", "Duração das chamadas à Bot API (sem a espera na fila).",
+    ["endpoint", "outcome"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_API_QUEUE_WAIT_SECONDS = Histogram(
+    "telegram_api_queue_wait_seconds", "Espera no rate limiter antes de chamar a Bot API.",
+    ["priority"], buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_API_RETRY_AFTER = Counter(
+    "telegram_api_retry_after_total", "Respostas 429 (RetryAfter) da Bot API.", ["endpoint"],
+)
+
+BACKGROUND_TASK_SECONDS = Histogram(
+    "background_task_seconds", "Duração das tasks em segundo plano dos handlers.",
+    ["task", "result"], buckets=LATENCY_BUCKETS,
+)
+BACKGROUND_QUEUE_WAIT_SECONDS = Histogram(
+    "background_queue_wait_seconds", "Espera por uma vaga no pool de tasks em segundo plano.",
+    ["task"], buckets=LATENCY_BUCKETS,
+)
+
+QR_PHOTO_SENDS = Counter(
+    "qr_photo_sends_total", "Fotos de QR PIX enviadas, por origem (upload ou file_id).", ["source"],
+)
+QR_UPLOAD_BYTES = Counter(
+    "qr_upload_bytes_total", "Bytes de PNG de QR enviados ao Telegram.",
+)
+QR_UPLOAD_SECONDS = Histogram(
+    "qr_upload_seconds", "Duração do envio da foto do QR, por origem.",
+    ["source"], buckets=LATENCY_BUCKETS,
+)
+
+JOB_SECONDS = Histogram(
+    "job_seconds", "Duração de cada execução de job agendado.",
+    ["job"], buckets=JOB_BUCKETS,
+)
+JOB_RUNS = Counter(
+    "job_runs_total", "Execuções de jobs agendados por resultado.", ["job", "result"],
+)
+
+
+# =========================
+# GAUGES (atualizados no scrape)
+# =========================
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Estado dos pools de conexão.", ["pool", "state"],
+)
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Itens por status nas filas duráveis.", ["queue", "status"],
+)
+QUEUE_OLDEST_SECONDS = Gauge(
+    "queue_oldest_seconds", "Idade do item pronto mais antigo de cada fila.", ["queue"],
+)
+CACHE_ENTRIES = Gauge("cache_entries", "Itens em cache.", ["cache"])
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Taxa de acerto do cache.", ["cache"])
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state", "Estado do circuito (0 fechado, 1 meio aberto, 2 aberto).", ["breaker"],
+)
+
+
+# =========================
+# DECORATORS
+# =========================
+
+def _timed(observe):
+    """
+    Decorator que mede a função (sync ou async) e chama
+    `observe(fn, elapsed, failed)` no fim.
+    """
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = await fn(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    observe(fn, time.perf_counter() - started, failed)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                observe(fn, time.perf_counter() - started, failed)
+        return wrapper
+    return decorator
+
+
+def _observe_db(fn, elapsed, failed):
+    layer = "async" if fn.__module__.endswith("async_db") else "sync"
+    DB_QUERY_SECONDS.labels(layer, fn.__name__).observe(elapsed)
+    if failed:
+        DB_QUERY_ERRORS.labels(layer, fn.__name__).inc()
+
+
+def _observe_handler(fn, elapsed, failed):
+    TELEGRAM_UPDATE_SECONDS.labels(fn.__name__).observe(elapsed)
+    if failed:
+        TELEGRAM_UPDATE_ERRORS.labels(fn.__name__).inc()
+
+
+def _observe_job(fn, elapsed, failed):
+    JOB_SECONDS.labels(fn.__name__).observe(elapsed)
+    JOB_RUNS.labels(fn.__name__, "error" if failed else "ok").inc()
+
+
+observe_db = _timed(_observe_db)
+observe_handler = _timed(_observe_handler)
+observe_job = _timed(_observe_job)
+
+
+def http_outcome(status: int | None) -> str:
+    return "error" if status is None else f"{status // 100}xx"
+
+
+# =========================
+# SCRAPE
+# =========================
+
+def _set_many(gauge, labels: tuple, values: dict, keys: tuple):
+    for key in keys:
+        value = values.get(key)
+        if isinstance(value, (int, float)):
+            gauge.labels(*labels, key).set(value)
+
+
+async def refresh_gauges(timeout: float = 2.0):
+    """
+    Atualiza os gauges de estado. Consultas às filas têm timeout curto
+    para o scrape nunca travar; falhas só deixam o valor anterior.
+    """
+    from app.infra import async_db, db, inbox, outbox, qr
+    from app.infra.dedup import deduplicator
+    from app.payment_status import status_service
+
+    _set_many(DB_POOL_CONNECTIONS, ("sync",), db.pool_stats(), ("size", "idle", "in_use", "waiting", "max"))
+    _set_many(DB_POOL_CONNECTIONS, ("async",), async_db.pool_stats(), ("size", "idle", "in_use", "max"))
+
+    for name, module in (("webhook_inbox", inbox), ("outbox_tasks", outbox)):
+        try:
+            stats = await asyncio.wait_for(module.stats(), timeout=timeout)
+        except Exception:
+            logger.warning("[METRICS] Falha ao ler estado da fila %s", name, exc_info=True)
+            continue
+        _set_many(QUEUE_DEPTH, (name,), stats, ("pending", "processing", "dead"))
+        oldest = stats.get("oldest_pending_seconds", stats.get("oldest_ready_seconds"))
+        if oldest is not None:
+            QUEUE_OLDEST_SECONDS.labels(name).set(oldest)
+
+    dedup = deduplicator.stats()
+    status_stats = status_service.stats()
+
+    caches = {
+        "user_id": async_db.user_cache_stats(),
+        "webhook_dedup": dedup["memory"],
+        "qr_png": qr.cache_stats(),
+        "payment_status_pending": status_stats["pending"],
+        "payment_status_terminal": status_stats["terminal"],
+    }
+    for name, stats in caches.items():
+        CACHE_ENTRIES.labels(name).set(stats["size"])
+        CACHE_HIT_RATIO.labels(name).set(stats["hit_ratio"])
+
+
+async def render() -> tuple:
+    """Retorna (corpo, content-type) do scrape."""
+    await refresh_gauges()
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,576 @@
+"""
+Migrações versionadas do schema.
+
+Cada migração é uma tupla (versão, nome, sql) aplicada uma única vez, dentro
+da sua própria transação, e registrada em `schema_migrations`. No boot só é
+feito um SELECT das versões aplicadas — se não houver nada pendente, nenhum
+DDL é executado.
+
+Uso manual:
+    python -m app.infra.migrations            # aplica pendentes
+    python -m app.infra.migrations status     # lista aplicadas/pendentes
+"""
+import logging
+import sys
+
+from app.infra.db import get_db
+
+logger = logging.getLogger(__name__)
+
+# chave do advisory lock que serializa migrações entre processos
+MIGRATIONS_LOCK_ID = 7_310_001
+
+
+# =========================
+# TEXT -> TIMESTAMPTZ (0003 / 0004)
+# =========================
+#
+# Conversão online em três passos:
+#   0003  cria colunas-sombra `<coluna>_tz` + trigger que as mantém em dia
+#         para toda escrita nova (só catálogo, sem reescrever a tabela);
+#   tool  `python -m app.infra.backfill_timestamps` preenche as linhas antigas
+#         em lotes curtos, valida os NOT NULL e cria os índices CONCURRENTLY;
+#   0004  troca as colunas (DROP + RENAME), só catálogo. Com linhas sem
+#         backfill ou CHECK ainda não validado, recusa rodar (erro apontando
+#         para a ferramenta) em vez de reescrever as tabelas sob lock no boot.
+#         Tabelas vazias (banco novo) passam direto.
+
+TIMESTAMP_COLUMNS = {
+    "payments_v2": ["expires_at", "created_at", "confirmed_at"],
+    "subscriptions": ["starts_at", "ends_at"],
+}
+
+NOT_NULL_TIMESTAMP_COLUMNS = {
+    "payments_v2": ["expires_at", "created_at"],
+    "subscriptions": ["starts_at", "ends_at"],
+}
+
+# índices da 0002 que dependem das colunas de data; {tz} vira "_tz" no
+# backfill (índice sobre a coluna-sombra) e "" na 0004
+TIMESTAMP_INDEXES = [
+    ("payments_v2_user_pending_idx",
+     "ON payments_v2 (user_id, created_at{tz} DESC) WHERE status = 'pending'"),
+    ("payments_v2_user_created_idx",
+     "ON payments_v2 (user_id, created_at{tz} DESC)"),
+    ("payments_v2_pending_expires_idx",
+     "ON payments_v2 (expires_at{tz}) WHERE status = 'pending'"),
+    ("payments_v2_confirmed_created_idx",
+     "ON payments_v2 (created_at{tz}) WHERE status = 'confirmed'"),
+    ("subscriptions_user_active_idx",
+     "ON subscriptions (user_id, ends_at{tz} DESC) WHERE status = 'active'"),
+    ("subscriptions_active_ends_idx",
+     "ON subscriptions (ends_at{tz}) WHERE status = 'active'"),
+]
+
+
+def shadow_backfill_sql(table: str) -> str:
+    """SET das colunas-sombra a partir das colunas TEXT originais."""
+    return ", ".join(
+        f"{col}_tz = legacy_text_to_timestamptz({col}::text)"
+        for col in TIMESTAMP_COLUMNS[table]
+    )
+
+
+def shadow_missing_sql(table: str) -> str:
+    """WHERE das linhas cuja coluna-sombra ainda não foi preenchida."""
+    return " OR ".join(
+        f"({col}_tz IS NULL AND {col} IS NOT NULL)"
+        for col in TIMESTAMP_COLUMNS[table]
+    )
+
+
+def not_null_constraint(table: str, col: str) -> str:
+    return f"{table}_{col}_tz_not_null"
+
+
+def _build_shadow_sql() -> str:
+    parts = [r"""
+        -- Strings antigas: ISO sem fuso (UTC, de now_iso()) ou com 'Z'/offset
+        CREATE OR REPLACE FUNCTION legacy_text_to_timestamptz(value TEXT)
+        RETURNS TIMESTAMPTZ
+        LANGUAGE sql STABLE AS $$
+            SELECT CASE
+                WHEN value IS NULL OR value = '' THEN NULL
+                WHEN value ~ '\d{2}:\d{2}(:\d{2}(\.\d+)?)?\s*(Z|[+-]\d{2}(:?\d{2})?)$'
+                    THEN value::timestamptz
+                ELSE value::timestamp AT TIME ZONE 'UTC'
+            END
+        $$;
+    """]
+
+    for table, cols in TIMESTAMP_COLUMNS.items():
+        adds = ",\n".join(
+            f"            ADD COLUMN IF NOT EXISTS {col}_tz TIMESTAMPTZ" for col in cols
+        )
+        parts.append(f"ALTER TABLE {table}\n{adds};")
+
+        for col in NOT_NULL_TIMESTAMP_COLUMNS[table]:
+            # NOT VALID: vale só para linhas novas; o backfill valida depois
+            parts.append(
+                f"ALTER TABLE {table} ADD CONSTRAINT {not_null_constraint(table, col)} "
+                f"CHECK ({col}_tz IS NOT NULL) NOT VALID;"
+            )
+
+        sets = "\n".join(
+            f"            NEW.{col}_tz := legacy_text_to_timestamptz(NEW.{col}::text);"
+            for col in cols
+        )
+        parts.append(f"""
+        CREATE OR REPLACE FUNCTION {table}_sync_tz() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+{sets}
+            RETURN NEW;
+        END
+        $$;
+
+        DROP TRIGGER IF EXISTS {table}_sync_tz ON {table};
+        CREATE TRIGGER {table}_sync_tz
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_sync_tz();
+        """)
+
+    return "\n".join(parts)
+
+
+def _build_swap_guard_sql() -> str:
+    checks = []
+    for table in TIMESTAMP_COLUMNS:
+        constraints = ", ".join(
+            f"'{not_null_constraint(table, col)}'" for col in NOT_NULL_TIMESTAMP_COLUMNS[table]
+        )
+        checks.append(f"""
+            IF EXISTS (SELECT 1 FROM {table} WHERE {shadow_missing_sql(table)}) THEN
+                RAISE EXCEPTION '0004: % tem linhas sem backfill das colunas-sombra', '{table}'
+                    USING HINT = 'rode python -m app.infra.backfill_timestamps antes do deploy';
+            END IF;
+            IF EXISTS (SELECT 1 FROM {table})
+               AND EXISTS (SELECT 1 FROM pg_constraint
+                           WHERE conname IN ({constraints}) AND NOT convalidated) THEN
+                RAISE EXCEPTION '0004: CHECK NOT NULL de % ainda não validado', '{table}'
+                    USING HINT = 'rode python -m app.infra.backfill_timestamps antes do deploy';
+            END IF;""")
+
+    return "DO $$\nBEGIN" + "".join(checks) + "\nEND\n$$;"
+
+
+def _build_swap_sql() -> str:
+    # sem backfill, a troca reescreveria/varreria as tabelas sob lock
+    parts = [_build_swap_guard_sql()]
+
+    for table, cols in TIMESTAMP_COLUMNS.items():
+        parts.append(f"DROP TRIGGER IF EXISTS {table}_sync_tz ON {table};")
+        parts.append(f"DROP FUNCTION IF EXISTS {table}_sync_tz();")
+
+        drops = ", ".join(f"DROP COLUMN {col}" for col in cols)
+        parts.append(f"ALTER TABLE {table} {drops};")
+        for col in cols:
+            parts.append(f"ALTER TABLE {table} RENAME COLUMN {col}_tz TO {col};")
+
+        for col in NOT_NULL_TIMESTAMP_COLUMNS[table]:
+            # com o CHECK já validado, o SET NOT NULL não varre a tabela
+            parts.append(f"ALTER TABLE {table} ALTER COLUMN {col} SET NOT NULL;")
+            parts.append(
+                f"ALTER TABLE {table} DROP CONSTRAINT {not_null_constraint(table, col)};"
+            )
+
+    parts.append("ALTER TABLE payments_v2 ALTER COLUMN created_at SET DEFAULT NOW();")
+
+    # os índices da 0002 caíram junto com as colunas TEXT
+    for name, definition in TIMESTAMP_INDEXES:
+        parts.append(f"ALTER INDEX IF EXISTS {name}_tz RENAME TO {name};")
+        parts.append(f"CREATE INDEX IF NOT EXISTS {name} {definition.format(tz='')};")
+
+    parts.append("DROP FUNCTION IF EXISTS legacy_text_to_timestamptz(TEXT);")
+
+    return "\n".join(parts)
+
+
+_TIMESTAMPTZ_SHADOW_SQL = _build_shadow_sql()
+_TIMESTAMPTZ_SWAP_SQL = _build_swap_sql()
+
+
+MIGRATIONS = [
+    (1, "baseline", """
+        CREATE TABLE IF NOT EXISTS users (
+            id          SERIAL PRIMARY KEY,
+            telegram_id BIGINT UNIQUE NOT NULL,
+            nome        TEXT,
+            criado_em   TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS payments_v2 (
+            id                  SERIAL PRIMARY KEY,
+            user_id             INTEGER NOT NULL,
+            gateway             TEXT NOT NULL,
+            gateway_payment_id  TEXT,
+            external_reference  TEXT,
+            idempotency_key     TEXT,
+            plan                TEXT NOT NULL,
+            amount              REAL NOT NULL,
+            status              TEXT NOT NULL DEFAULT 'pending',
+            expires_at          TEXT NOT NULL,
+            created_at          TEXT NOT NULL,
+            confirmed_at        TEXT,
+            reminders_sent      INTEGER NOT NULL DEFAULT 0,
+            pix_qr_code         TEXT,
+            pix_qr_code_base64  TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id          SERIAL PRIMARY KEY,
+            user_id     INTEGER NOT NULL,
+            payment_id  INTEGER,
+            plan        TEXT NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'active',
+            starts_at   TEXT NOT NULL,
+            ends_at     TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (payment_id) REFERENCES payments_v2(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS outbox_tasks (
+            id              SERIAL PRIMARY KEY,
+            user_id         INTEGER NOT NULL REFERENCES users(id),
+            task_type       TEXT NOT NULL,
+            status          TEXT NOT NULL DEFAULT 'pending',
+            scheduled_for   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            metadata        JSONB NOT NULL DEFAULT '{}'::jsonb,
+            created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            processed_at    TIMESTAMPTZ
+        );
+    """),
+
+    (2, "hot_query_indexes", """
+        -- ON CONFLICT (payment_id) em activate_subscription_from_payment
+        CREATE UNIQUE INDEX IF NOT EXISTS subscriptions_payment_id_key
+            ON subscriptions (payment_id);
+
+        -- confirm_payment / get_payment_by_gateway_id / webhook
+        CREATE UNIQUE INDEX IF NOT EXISTS payments_v2_gateway_payment_id_key
+            ON payments_v2 (gateway_payment_id);
+
+        -- get_pending_payment
+        CREATE INDEX IF NOT EXISTS payments_v2_user_pending_idx
+            ON payments_v2 (user_id, created_at DESC)
+            WHERE status = 'pending';
+
+        -- get_last_payment_by_user / get_payments_history_by_user
+        CREATE INDEX IF NOT EXISTS payments_v2_user_created_idx
+            ON payments_v2 (user_id, created_at DESC);
+
+        -- get_expired_pending_payments / get_pending_payments_for_reminder
+        CREATE INDEX IF NOT EXISTS payments_v2_pending_expires_idx
+            ON payments_v2 (expires_at)
+            WHERE status = 'pending';
+
+        -- get_confirmed_unprocessed_payments
+        CREATE INDEX IF NOT EXISTS payments_v2_confirmed_created_idx
+            ON payments_v2 (created_at)
+            WHERE status = 'confirmed';
+
+        -- get_active_subscription*
+        CREATE INDEX IF NOT EXISTS subscriptions_user_active_idx
+            ON subscriptions (user_id, ends_at DESC)
+            WHERE status = 'active';
+
+        -- get_recently_expired_subscriptions / lembretes de expiração
+        CREATE INDEX IF NOT EXISTS subscriptions_active_ends_idx
+            ON subscriptions (ends_at)
+            WHERE status = 'active';
+
+        -- process_outbox_tasks
+        CREATE INDEX IF NOT EXISTS outbox_tasks_pending_idx
+            ON outbox_tasks (task_type, created_at)
+            WHERE status = 'pending';
+
+        -- schedule_expiration_reminders (checagem de duplicidade)
+        CREATE INDEX IF NOT EXISTS outbox_tasks_user_type_idx
+            ON outbox_tasks (user_id, task_type);
+    """),
+
+    (3, "timestamptz_shadow_columns", _TIMESTAMPTZ_SHADOW_SQL),
+
+    (4, "timestamptz_swap", _TIMESTAMPTZ_SWAP_SQL),
+
+    (5, "outbox_expiry_warning_key", """
+        -- (subscription_id, days_left) viram colunas de verdade, com índice
+        -- único, em vez de serem procurados dentro do JSON de metadata
+        ALTER TABLE outbox_tasks
+            ADD COLUMN IF NOT EXISTS subscription_id INTEGER,
+            ADD COLUMN IF NOT EXISTS days_left       SMALLINT;
+
+        UPDATE outbox_tasks
+        SET subscription_id = (metadata->>'subscription_id')::int,
+            days_left       = (metadata->>'days_left')::int
+        WHERE task_type = 'SUBSCRIPTION_EXPIRY_WARNING'
+          AND subscription_id IS NULL;
+
+        -- mantém só a task mais antiga de cada par duplicado
+        DELETE FROM outbox_tasks a
+        USING outbox_tasks b
+        WHERE a.task_type = 'SUBSCRIPTION_EXPIRY_WARNING'
+          AND b.task_type = 'SUBSCRIPTION_EXPIRY_WARNING'
+          AND a.subscription_id = b.subscription_id
+          AND a.days_left = b.days_left
+          AND a.id > b.id;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS outbox_tasks_expiry_warning_key
+            ON outbox_tasks (subscription_id, days_left)
+            WHERE task_type = 'SUBSCRIPTION_EXPIRY_WARNING';
+
+        DROP INDEX IF EXISTS outbox_tasks_user_type_idx;
+    """),
+
+    (6, "webhook_inbox", """
+        CREATE TABLE IF NOT EXISTS webhook_inbox (
+            id               BIGSERIAL PRIMARY KEY,
+            source           TEXT NOT NULL,
+            event_type       TEXT,
+            resource_id      TEXT,
+            payload          JSONB NOT NULL,
+            status           TEXT NOT NULL DEFAULT 'pending',
+            attempts         INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            locked_until     TIMESTAMPTZ,
+            last_error       TEXT,
+            received_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            processed_at     TIMESTAMPTZ
+        );
+
+        -- claim: próximos prontos, em ordem de chegada
+        CREATE INDEX IF NOT EXISTS webhook_inbox_ready_idx
+            ON webhook_inbox (next_attempt_at, id)
+            WHERE status = 'pending';
+
+        -- ordem por pagamento: existe evento anterior ainda em aberto?
+        CREATE INDEX IF NOT EXISTS webhook_inbox_resource_open_idx
+            ON webhook_inbox (resource_id, id)
+            WHERE status IN ('pending', 'processing');
+    """),
+
+    (7, "webhook_seen_events", """
+        CREATE TABLE IF NOT EXISTS webhook_seen_events (
+            event_key      TEXT PRIMARY KEY,
+            first_seen_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+
+        -- limpeza por janela de retenção
+        CREATE INDEX IF NOT EXISTS webhook_seen_events_first_seen_idx
+            ON webhook_seen_events (first_seen_at);
+    """),
+
+    (8, "notify_payment_confirmed", """
+        -- avisa o listener de ativação assim que um pagamento vira
+        -- 'confirmed' (entregue no COMMIT da transação que confirmou)
+        CREATE OR REPLACE FUNCTION notify_payment_confirmed() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF NEW.status = 'confirmed'
+               AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM 'confirmed') THEN
+                PERFORM pg_notify('payment_confirmed', NEW.id::text);
+            END IF;
+            RETURN NULL;
+        END
+        $$;
+
+        DROP TRIGGER IF EXISTS payments_v2_notify_confirmed ON payments_v2;
+        CREATE TRIGGER payments_v2_notify_confirmed
+            AFTER INSERT OR UPDATE OF status ON payments_v2
+            FOR EACH ROW EXECUTE FUNCTION notify_payment_confirmed();
+    """),
+
+    (9, "outbox_retry", """
+        -- retry com backoff e dead-letter no lugar do 'error' terminal
+        ALTER TABLE outbox_tasks
+            ADD COLUMN IF NOT EXISTS attempts        INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            ADD COLUMN IF NOT EXISTS locked_until    TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS last_error      TEXT;
+
+        UPDATE outbox_tasks
+        SET next_attempt_at = scheduled_for
+        WHERE status = 'pending';
+
+        -- falhas antigas eram definitivas: ficam registradas como 'dead'
+        UPDATE outbox_tasks
+        SET status = 'dead', attempts = 1, last_error = 'legacy error status'
+        WHERE status = 'error';
+
+        -- claim: pendentes prontos por tipo, na ordem de next_attempt_at
+        CREATE INDEX IF NOT EXISTS outbox_tasks_ready_idx
+            ON outbox_tasks (task_type, next_attempt_at, id)
+            WHERE status = 'pending';
+
+        -- devolução de leases vencidos
+        CREATE INDEX IF NOT EXISTS outbox_tasks_processing_idx
+            ON outbox_tasks (locked_until)
+            WHERE status = 'processing';
+
+        DROP INDEX IF EXISTS outbox_tasks_pending_idx;
+    """),
+
+    (10, "subscription_expiry_queue", """
+        -- fila de expiração: toda assinatura com expiry_processed_at NULL
+        -- é tratada quando ends_at passa, sem janela de tempo
+        ALTER TABLE subscriptions
+            ADD COLUMN IF NOT EXISTS expiry_processed_at    TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS expiry_attempts        INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS expiry_next_attempt_at TIMESTAMPTZ;
+
+        -- já expiradas/substituídas foram tratadas pelo job antigo (ou por
+        -- renovação); ativas vencidas ficam na fila e são revogadas
+        UPDATE subscriptions
+        SET expiry_processed_at = NOW()
+        WHERE status <> 'active'
+          AND expiry_processed_at IS NULL;
+
+        CREATE INDEX IF NOT EXISTS subscriptions_expiry_due_idx
+            ON subscriptions (ends_at)
+            WHERE expiry_processed_at IS NULL;
+    """),
+
+    (11, "payment_qr_file_id", """
+        -- file_id do Telegram da foto do QR: reenvios não refazem o upload
+        ALTER TABLE payments_v2
+            ADD COLUMN IF NOT EXISTS pix_qr_file_id TEXT;
+    """),
+
+    (12, "drop_payment_qr_base64", """
+        -- o PNG passa a ser renderizado do pix_qr_code (app.infra.qr);
+        -- o espaço no TOAST volta no próximo VACUUM
+        ALTER TABLE payments_v2
+            DROP COLUMN IF EXISTS pix_qr_code_base64;
+    """),
+
+    (13, "one_pending_payment_per_user", """
+        -- duplicados de cliques simultâneos: fica só o pendente mais recente
+        UPDATE payments_v2 p
+        SET status = 'expired'
+        WHERE p.status = 'pending'
+          AND EXISTS (
+              SELECT 1 FROM payments_v2 n
+              WHERE n.user_id = p.user_id
+                AND n.status = 'pending'
+                AND (n.created_at, n.id) > (p.created_at, p.id)
+          );
+
+        -- no máximo um PIX pendente por usuário (create_pix_payment
+        -- serializa por usuário; isto garante no banco)
+        CREATE UNIQUE INDEX IF NOT EXISTS payments_v2_one_pending_per_user_idx
+            ON payments_v2 (user_id)
+            WHERE status = 'pending';
+    """),
+
+    (14, "webhook_inbox_retention", """
+        -- inbox.stats() (a cada scrape de /metrics) e purge de 'dead':
+        -- só as linhas em aberto/mortas, nunca o histórico 'done'
+        CREATE INDEX IF NOT EXISTS webhook_inbox_status_idx
+            ON webhook_inbox (status, received_at)
+            WHERE status IN ('pending', 'processing', 'dead');
+
+        -- purge dos processados fora da retenção
+        CREATE INDEX IF NOT EXISTS webhook_inbox_done_idx
+            ON webhook_inbox (processed_at)
+            WHERE status = 'done';
+    """),
+
+    (15, "notify_payment_confirmed_deferred", """
+        -- confirmação e ativação andam na mesma transação: a trigger passa
+        -- a rodar no COMMIT e só notifica pagamento confirmado que saiu
+        -- dela ainda sem assinatura (o resto seria ida ao banco à toa)
+        CREATE OR REPLACE FUNCTION notify_payment_confirmed() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF NEW.status = 'confirmed'
+               AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM 'confirmed')
+               AND NOT EXISTS (SELECT 1 FROM subscriptions WHERE payment_id = NEW.id) THEN
+                PERFORM pg_notify('payment_confirmed', NEW.id::text);
+            END IF;
+            RETURN NULL;
+        END
+        $$;
+
+        DROP TRIGGER IF EXISTS payments_v2_notify_confirmed ON payments_v2;
+        CREATE CONSTRAINT TRIGGER payments_v2_notify_confirmed
+            AFTER INSERT OR UPDATE OF status ON payments_v2
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION notify_payment_confirmed();
+    """),
+]
+
+
+def _applied_versions(cur) -> set:
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return set()
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def pending_migrations() -> list:
+    with get_db() as conn:
+        applied = _applied_versions(conn.cursor())
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def migrate(target: int | None = None) -> int:
+    """
+    Aplica as migrações pendentes, em ordem (até `target`, se informado).
+    Retorna quantas foram aplicadas.
+    Seguro com vários processos subindo ao mesmo tempo (advisory lock).
+    """
+    pending = [
+        m for m in pending_migrations()
+        if target is None or m[0] <= target
+    ]
+    if not pending:
+        logger.info("[MIGRATIONS] Schema atualizado — nada a aplicar")
+        return 0
+
+    applied_now = 0
+    for version, name, sql in pending:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version     INTEGER PRIMARY KEY,
+                    name        TEXT NOT NULL,
+                    applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )
+            """)
+
+            # outro processo pode ter aplicado enquanto esperávamos o lock
+            if version in _applied_versions(cur):
+                continue
+
+            logger.info("[MIGRATIONS] Aplicando %04d_%s", version, name)
+            cur.execute(sql)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name),
+            )
+            applied_now += 1
+
+    logger.info("[MIGRATIONS] %d migração(ões) aplicada(s)", applied_now)
+    return applied_now
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    logging.basicConfig(level=logging.INFO)
+
+    if argv and argv[0] == "status":
+        pending = {m[0] for m in pending_migrations()}
+        for version, name, _ in MIGRATIONS:
+            state = "pendente" if version in pending else "aplicada"
+            print(f"{version:04d}_{name}: {state}")
+        return
+
+    migrate()
+
+
+if __name__ == "__main__":
+    main()
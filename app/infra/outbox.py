@@ -0,0 +1,127 @@
+"""
+Outbox de mensagens (tabela `outbox_tasks`).
+
+Tasks são reservadas em lote com SKIP LOCKED — vários workers e réplicas
+drenam em paralelo sem pegar a mesma task — e cada resultado é gravado na
+sua própria transação curta, sem segurar nada aberto durante o envio.
+Falhas voltam para a fila com backoff; depois de `max_attempts` vão para
+'dead'.
+"""
+import logging
+
+from app.infra import async_db
+from app.infra.inbox import backoff_seconds
+
+logger = logging.getLogger(__name__)
+
+
+async def claim(task_types: list, limit: int = 50, lease_seconds: float = 120.0) -> list:
+    """
+    Reserva até `limit` tasks prontas dos tipos dados, já com o telegram_id
+    do destinatário.
+    """
+    async with async_db.get_db() as conn:
+        rows = await conn.fetch(
+            """
+            WITH candidate AS (
+                SELECT ot.id
+                FROM outbox_tasks ot
+                WHERE ot.status = 'pending'
+                  AND ot.task_type = ANY($1::text[])
+                  AND ot.next_attempt_at <= NOW()
+                ORDER BY ot.next_attempt_at, ot.id
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE outbox_tasks ot
+            SET status = 'processing',
+                attempts = ot.attempts + 1,
+                locked_until = NOW() + make_interval(secs => $3)
+            FROM candidate, users u
+            WHERE ot.id = candidate.id
+              AND u.id = ot.user_id
+            RETURNING ot.*, u.telegram_id
+            """,
+            list(task_types), limit, float(lease_seconds),
+        )
+    return [dict(r) for r in rows]
+
+
+async def complete(task_id: int):
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE outbox_tasks
+            SET status = 'processed', processed_at = NOW(), locked_until = NULL, last_error = NULL
+            WHERE id = $1
+            """,
+            task_id,
+        )
+
+
+async def fail(task: dict, error: str, max_attempts: int, retry_after: float | None = None,
+               permanent: bool = False) -> str:
+    """
+    Registra a falha. Volta para a fila com backoff (ou depois de
+    `retry_after` segundos, quando o Telegram pede) ou vai para 'dead' se
+    `permanent` ou depois de `max_attempts`. Retorna o novo status.
+    """
+    dead = permanent or task["attempts"] >= max_attempts
+    status = "dead" if dead else "pending"
+    delay = retry_after if retry_after is not None else backoff_seconds(task["attempts"])
+
+    async with async_db.get_db() as conn:
+        await conn.execute(
+            """
+            UPDATE outbox_tasks
+            SET status = $2,
+                last_error = $3,
+                locked_until = NULL,
+                next_attempt_at = NOW() + make_interval(secs => $4),
+                processed_at = CASE WHEN $2 = 'dead' THEN NOW() ELSE processed_at END
+            WHERE id = $1
+            """,
+            task["id"], status, error[:2000], float(delay),
+        )
+    return status
+
+
+async def release_expired_leases() -> int:
+    """
+    Devolve para a fila tasks de workers que morreram no meio do envio.
+    """
+    async with async_db.get_db() as conn:
+        result = await conn.execute(
+            """
+            UPDATE outbox_tasks
+            SET status = 'pending', locked_until = NULL
+            WHERE status = 'processing' AND locked_until < NOW()
+            """
+        )
+    released = int(result.split()[-1])
+    if released:
+        logger.warning("[OUTBOX] %d task(s) com lease vencido devolvidas à fila", released)
+    return released
+
+
+async def stats() -> dict:
+    """
+    Profundidade da fila e atraso da task pronta mais antiga (segundos).
+    """
+    async with async_db.get_db() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'pending')    AS pending,
+                COUNT(*) FILTER (WHERE status = 'processing') AS processing,
+                COUNT(*) FILTER (WHERE status = 'dead')       AS dead,
+                COALESCE(
+                    EXTRACT(EPOCH FROM NOW() - MIN(next_attempt_at)
+                        FILTER (WHERE status = 'pending' AND next_attempt_at <= NOW())),
+                    0
+                )::float AS oldest_ready_seconds
+            FROM outbox_tasks
+            WHERE status IN ('pending', 'processing', 'dead')
+            """
+        )
+    return dict(row)
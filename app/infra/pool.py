@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Nenhuma conexão ficou livre dentro do tempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexões psycopg2 limitado e thread-safe.
+
+    - mantém entre `minconn` e `maxconn` conexões abertas;
+    - quem pede conexão com o pool cheio espera até `timeout` segundos;
+    - no checkout, conexões paradas há mais de `check_after` segundos
+      passam por um `SELECT 1` antes de serem entregues;
+    - conexões ociosas há mais de `max_idle` segundos (acima do mínimo)
+      ou mais velhas que `max_lifetime` são recicladas;
+    - conexões quebradas são descartadas e recriadas sob demanda.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = 1,
+        maxconn: int = 10,
+        timeout: float = 30.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        check_after: float = 30.0,
+        connection_factory=None,
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Configuração de pool inválida: min=%s max=%s" % (minconn, maxconn))
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.connection_factory = connection_factory
+
+        self._cond = threading.Condition()
+        # (conn, devolvida_em) — LIFO: a conexão mais "quente" sai primeiro
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "wait_timeouts": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._reserve_and_connect(), time.monotonic()))
+
+    # =========================
+    # CHECKOUT / CHECKIN
+    # =========================
+
+    def getconn(self, timeout: float | None = None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+
+        while True:
+            conn = None
+            must_create = False
+
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Pool de conexões fechado")
+
+                self._reap_idle_locked()
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                elif self._size < self.maxconn:
+                    self._size += 1
+                    must_create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["wait_timeouts"] += 1
+                        raise PoolTimeout(
+                            "Timeout aguardando conexão do pool (max=%d)" % self.maxconn
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                    continue
+
+            if must_create:
+                conn = self._connect_reserved()
+            elif not self._is_healthy(conn, returned_at):
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_seconds_total"] += time.monotonic() - started
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        if not discard:
+            discard = not self._reset(conn)
+
+        if not discard:
+            age = time.monotonic() - self._created_at.get(id(conn), time.monotonic())
+            discard = age > self.max_lifetime
+
+        if discard:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._close_quietly(conn)
+                self._forget_locked(conn)
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close_quietly(conn)
+                self._forget_locked(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
+    # =========================
+    # INTERNOS
+    # =========================
+
+    def _reserve_and_connect(self):
+        with self._cond:
+            self._size += 1
+        return self._connect_reserved()
+
+    def _connect_reserved(self):
+        try:
+            conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        conn.autocommit = False
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _is_healthy(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            logger.warning("[POOL] Conexão falhou no health check — descartando")
+            return False
+
+    def _reset(self, conn) -> bool:
+        """Deixa a conexão pronta para reuso. Retorna False se estiver quebrada."""
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reap_idle_locked(self):
+        # as mais antigas ficam à esquerda da deque
+        now = time.monotonic()
+        while self._idle and self._size > self.minconn:
+            conn, returned_at = self._idle[0]
+            if now - returned_at <= self.max_idle:
+                break
+            self._idle.popleft()
+            self._close_quietly(conn)
+            self._forget_locked(conn)
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._forget_locked(conn)
+            self._cond.notify()
+
+    def _forget_locked(self, conn):
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self._stats["connections_closed"] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,55 @@
+"""
+Renderização local do QR PIX.
+
+O PNG é gerado sob demanda a partir do "copia e cola" (`pix_qr_code`), em
+vez de guardar o base64 do gateway no banco. Imagens recentes ficam num
+LRU limitado em memória — o mesmo PIX costuma ser reenviado em seguida.
+"""
+import asyncio
+import io
+import logging
+import os
+
+import qrcode
+from qrcode.image.pure import PyPNGImage
+
+from app.infra.cache import TTLCache
+
+QR_CACHE_MAX = int(os.getenv("QR_CACHE_MAX", "512"))
+QR_CACHE_TTL = float(os.getenv("QR_CACHE_TTL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+# pix_qr_code -> bytes do PNG (~1-2 KB cada)
+png_cache = TTLCache(maxsize=QR_CACHE_MAX, ttl=QR_CACHE_TTL)
+
+
+def _render(payload: str) -> bytes:
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=8,
+        border=4,
+        image_factory=PyPNGImage,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    buf = io.BytesIO()
+    qr.make_image().save(buf)
+    return buf.getvalue()
+
+
+async def render_png(payload: str) -> bytes:
+    """
+    PNG do QR para o payload PIX. A renderização (CPU) roda fora do event
+    loop; o resultado fica no cache.
+    """
+    png = png_cache.get(payload)
+    if png is None:
+        png = await asyncio.to_thread(_render, payload)
+        png_cache.set(payload, png)
+    return png
+
+
+def cache_stats() -> dict:
+    return png_cache.stats()
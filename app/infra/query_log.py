@@ -0,0 +1,227 @@
+"""
+Instrumentação de statements SQL (psycopg2 e asyncpg).
+
+Toda query que passa pelos pools é medida: duração, linhas e a função que
+a disparou. Statements acima de `DB_SLOW_QUERY_MS` vão para o log com o
+formato dos parâmetros (tipos, nunca os valores) e, com
+`DB_SLOW_QUERY_EXPLAIN=1`, o plano do `EXPLAIN` (sem ANALYZE: não executa
+o statement de novo).
+
+`track_request()` abre um resumo por requisição (ex.: um update do
+Telegram) com o número de idas ao banco e o tempo gasto nelas.
+"""
+import contextvars
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import asyncpg
+import psycopg2.extensions
+
+from app.infra.metrics import DB_REQUEST_ROUND_TRIPS, DB_STATEMENT_SECONDS
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+# resumo da requisição corrente: {"queries", "seconds", "rows", "callers"}
+_request_summary = contextvars.ContextVar("db_request_summary", default=None)
+
+_SKIP_MODULES = ("app.infra.query_log", "app.infra.metrics", "asyncpg", "psycopg2", "contextlib")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def _caller() -> str:
+    """Primeira função fora das camadas de driver/instrumentação."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_SKIP_MODULES):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def params_shape(params) -> str:
+    """Tipos dos parâmetros, para o log não carregar dados de usuário."""
+    if params is None:
+        return "-"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in params.items()) + "}"
+    return "(" + ", ".join(_type_name(v) for v in params) + ")"
+
+
+def _type_name(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _one_line(query: str, limit: int = 500) -> str:
+    text = " ".join(str(query).split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _is_slow(elapsed: float) -> bool:
+    return elapsed * 1000 >= DB_SLOW_QUERY_MS
+
+
+def record(query: str, params, elapsed: float, rows: int | None, caller: str, plan: str | None = None):
+    DB_STATEMENT_SECONDS.labels(caller).observe(elapsed)
+
+    summary = _request_summary.get()
+    if summary is not None:
+        summary["queries"] += 1
+        summary["seconds"] += elapsed
+        summary["rows"] += max(rows or 0, 0)
+        summary["callers"][caller] = summary["callers"].get(caller, 0) + 1
+
+    if _is_slow(elapsed):
+        logger.warning(
+            "[DB] Query lenta (%.1f ms) em %s: %s",
+            elapsed * 1000, caller, _one_line(query),
+            extra={
+                "duration_ms": round(elapsed * 1000, 1),
+                "rows": rows,
+                "caller": caller,
+                "params": params_shape(params),
+                "plan": plan,
+            },
+        )
+
+
+@contextmanager
+def track_request(label: str):
+    """
+    Conta as idas ao banco feitas dentro do bloco (mesmo contexto asyncio)
+    e loga o resumo no fim.
+    """
+    summary = {"queries": 0, "seconds": 0.0, "rows": 0, "callers": {}}
+    token = _request_summary.set(summary)
+    try:
+        yield summary
+    finally:
+        _request_summary.reset(token)
+        DB_REQUEST_ROUND_TRIPS.labels(label).observe(summary["queries"])
+        if summary["queries"]:
+            logger.info(
+                "[DB] %s: %d ida(s) ao banco, %.1f ms",
+                label, summary["queries"], summary["seconds"] * 1000,
+                extra={
+                    "request": label,
+                    "round_trips": summary["queries"],
+                    "db_ms": round(summary["seconds"] * 1000, 1),
+                    "rows": summary["rows"],
+                    "callers": summary["callers"],
+                },
+            )
+
+
+# =========================
+# PSYCOPG2
+# =========================
+
+class TimedCursorMixin:
+    def execute(self, query, vars=None):
+        caller = _caller()
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            plan = self._explain(query, vars) if _is_slow(elapsed) else None
+            record(query, vars, elapsed, self.rowcount, caller, plan)
+
+    def _explain(self, query, vars):
+        if not DB_SLOW_QUERY_EXPLAIN or not _one_line(query, 20).upper().startswith(_EXPLAINABLE):
+            return None
+        if self.connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            return None
+        # savepoint: um EXPLAIN com erro não pode abortar a transação do chamador
+        cur = psycopg2.extensions.cursor(self.connection)
+        savepoint = not self.connection.autocommit
+        try:
+            if savepoint:
+                cur.execute("SAVEPOINT query_log_explain")
+            cur.execute("EXPLAIN " + query, vars)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+            if savepoint:
+                cur.execute("RELEASE SAVEPOINT query_log_explain")
+            return plan
+        except Exception:
+            logger.debug("[DB] EXPLAIN falhou", exc_info=True)
+            if savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT query_log_explain")
+            return None
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """
+    `connection_factory` do psycopg2: todo cursor (qualquer
+    `cursor_factory`, ex. RealDictCursor) ganha a medição.
+    """
+    _timed_classes = {}
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.pop("cursor_factory", None) or self.cursor_factory or psycopg2.extensions.cursor
+        timed = self._timed_classes.get(factory)
+        if timed is None:
+            timed = type(f"Timed{factory.__name__}", (TimedCursorMixin, factory), {})
+            self._timed_classes[factory] = timed
+        return super().cursor(*args, cursor_factory=timed, **kwargs)
+
+
+# =========================
+# ASYNCPG
+# =========================
+
+def _status_rows(status: str) -> int | None:
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (AttributeError, ValueError):
+        return None
+
+
+class TimedAsyncConnection(asyncpg.Connection):
+    """`connection_class` do pool asyncpg."""
+
+    async def _timed(self, method, rows_of, query, args, kwargs):
+        caller = _caller()
+        started = time.perf_counter()
+        result = None
+        ok = False
+        try:
+            result = await method(query, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            plan = await self._explain(query, args) if ok and _is_slow(elapsed) else None
+            record(query, args, elapsed, rows_of(result) if ok else None, caller, plan)
+
+    async def _explain(self, query, args):
+        if not DB_SLOW_QUERY_EXPLAIN or not _one_line(query, 20).upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            # dentro de uma transação vira savepoint: erro aqui não afeta o chamador
+            async with self.transaction():
+                rows = await super().fetch("EXPLAIN " + query, *args)
+            return "\n".join(row[0] for row in rows)
+        except Exception:
+            logger.debug("[DB] EXPLAIN falhou", exc_info=True)
+            return None
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._timed(super().execute, _status_rows, query, args, kwargs)
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._timed(super().fetch, lambda r: len(r) if r is not None else None, query, args, kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._timed(super().fetchrow, lambda r: int(r is not None), query, args, kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._timed(super().fetchval, lambda r: int(r is not None), query, args, kwargs)
@@ -0,0 +1,208 @@
+"""
+Rate limiter global das chamadas à Bot API (python-telegram-bot).
+
+Plugado via `ApplicationBuilder().rate_limiter(...)`, então vale para
+tudo que passa por `application.bot`: respostas dos handlers, convites,
+jobs e outbox. Aplica:
+
+- limite global do bot (token bucket, ~30 req/s);
+- limite por chat para envio de mensagens: ~1 msg/s em chat privado,
+  ~20 msg/min em grupo;
+- pausa global quando o Telegram responde 429 (`RetryAfter`), com
+  reenvio automático até `max_retries`.
+
+Prioridade: chamadas com `rate_limit_args={"priority": "bulk"}` (jobs,
+envios em massa) só pegam tokens quando não há chamada interativa
+esperando e deixam uma reserva do bucket global para as interativas.
+"""
+import asyncio
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from app.infra.metrics import (
+    TELEGRAM_API_QUEUE_WAIT_SECONDS,
+    TELEGRAM_API_RETRY_AFTER,
+    TELEGRAM_API_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+
+BULK = {"priority": PRIORITY_BULK}
+
+_MESSAGE_ENDPOINTS = ("send", "copyMessage", "forwardMessage")
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, reserve: float = 0.0) -> float:
+        """Segundos até haver 1 token acima de `reserve` (0 = já dá)."""
+        self._refill(now)
+        missing = 1.0 + reserve - self.tokens
+        return max(missing / self.rate, 0.0)
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class TelegramRateLimiter(BaseRateLimiter[dict]):
+    def __init__(
+        self,
+        global_per_second: float = 30.0,
+        private_per_second: float = 1.0,
+        group_per_minute: float = 20.0,
+        bulk_reserve: float = 5.0,
+        max_retries: int = 2,
+        max_chat_buckets: int = 10_000,
+    ):
+        self.global_per_second = global_per_second
+        self.private_per_second = private_per_second
+        self.group_per_minute = group_per_minute
+        self.bulk_reserve = min(bulk_reserve, global_per_second - 1)
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+
+        self._global = _TokenBucket(global_per_second, global_per_second)
+        self._chats = {}
+        self._blocked_until = 0.0
+        self._interactive_waiting = 0
+        self._lock = asyncio.Lock()
+
+        self._stats = {
+            priority: {"requests": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+        }
+        self.retry_after_hits = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    # ---------- buckets ----------
+
+    def _chat_bucket(self, chat_id, now: float) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chat_buckets:
+                # bucket cheio = chat ocioso: pode ser recriado sem perder nada
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_full(now)}
+            if _is_group(chat_id):
+                bucket = _TokenBucket(self.group_per_minute / 60.0, self.group_per_minute)
+            else:
+                bucket = _TokenBucket(self.private_per_second, 1.0)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, bulk: bool):
+        if not bulk:
+            self._interactive_waiting += 1
+        try:
+            while True:
+                async with self._lock:
+                    now = time.monotonic()
+                    wait = self._blocked_until - now
+
+                    if bulk and self._interactive_waiting:
+                        wait = max(wait, 0.05)
+
+                    chat = self._chat_bucket(chat_id, now) if chat_id is not None else None
+                    if chat is not None:
+                        wait = max(wait, chat.wait_time(now))
+                    wait = max(wait, self._global.wait_time(now, self.bulk_reserve if bulk else 0.0))
+
+                    if wait <= 0:
+                        self._global.take()
+                        if chat is not None:
+                            chat.take()
+                        return
+                await asyncio.sleep(wait)
+        finally:
+            if not bulk:
+                self._interactive_waiting -= 1
+
+    # ---------- BaseRateLimiter ----------
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        bulk = (rate_limit_args or {}).get("priority") == PRIORITY_BULK
+        priority = PRIORITY_BULK if bulk else PRIORITY_INTERACTIVE
+        # limite por chat vale para mensagens; ban/unban, edits etc. só contam no global
+        chat_id = data.get("chat_id") if endpoint.startswith(_MESSAGE_ENDPOINTS) else None
+
+        retries = 0
+        while True:
+            started = time.monotonic()
+            await self._acquire(chat_id, bulk)
+            self._record_wait(priority, time.monotonic() - started)
+
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await callback(*args, **kwargs)
+                outcome = "ok"
+                return result
+            except RetryAfter as e:
+                outcome = "retry_after"
+                TELEGRAM_API_RETRY_AFTER.labels(endpoint).inc()
+                self.retry_after_hits += 1
+                retry_after = float(e.retry_after)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                logger.warning(
+                    "[RATE] RetryAfter do Telegram, reenviando",
+                    extra={"endpoint": endpoint, "chat_id": chat_id,
+                           "retry_after": retry_after, "attempt": retries},
+                )
+            finally:
+                TELEGRAM_API_SECONDS.labels(endpoint, outcome).observe(time.perf_counter() - started)
+
+    def _record_wait(self, priority: str, waited: float):
+        TELEGRAM_API_QUEUE_WAIT_SECONDS.labels(priority).observe(waited)
+        stats = self._stats[priority]
+        stats["requests"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+
+    def stats(self) -> dict:
+        result = {
+            "retry_after_hits": self.retry_after_hits,
+            "interactive_waiting": self._interactive_waiting,
+            "chat_buckets": len(self._chats),
+        }
+        for priority, stats in self._stats.items():
+            requests = stats["requests"]
+            result[priority] = {
+                "requests": requests,
+                "wait_avg": (stats["wait_total"] / requests) if requests else 0.0,
+                "wait_max": stats["wait_max"],
+            }
+        return result
+
+
+def _is_group(chat_id) -> bool:
+    # grupos/canais têm id negativo; @username de canal também é grupo
+    if isinstance(chat_id, str):
+        return not chat_id.lstrip("-").isdigit() or chat_id.startswith("-")
+    return chat_id < 0
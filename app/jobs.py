@@ -1,21 +1,26 @@
 import logging
 import json
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import TelegramError
 
-from app.infra import db
-from app.domain.subscriptions import activate_subscription_from_payment
+from app.infra import async_db, inbox
+from app.infra.dedup import deduplicator
+from app.infra.metrics import observe_job
+from app.infra.rate_limiter import BULK
+from app.outbox_worker import OutboxDispatcher
+from app.reconciliation import reconcile_pending_payments
+from app.domain.subscriptions import activate_subscription_from_payment_async
 from app import config
 
 logger = logging.getLogger(__name__)
 
 
-def process_expired_payments():
+@observe_job
+async def process_expired_payments():
     """
     Marca pagamentos expirados (lógica futura).
     Por enquanto, apenas loga.
     """
-    expired = db.get_expired_pending_payments()
+    expired = await async_db.get_expired_pending_payments()
 
     for payment in expired:
         logger.info(
@@ -28,12 +33,13 @@ def process_expired_payments():
         )
 
 
-def process_pending_payment_reminders():
+@observe_job
+async def process_pending_payment_reminders():
     """
     Processa lembretes de pagamentos pendentes.
     Ainda NÃO envia mensagem.
     """
-    pendings = db.get_pending_payments_for_reminder()
+    pendings = await async_db.get_pending_payments_for_reminder()
 
     for payment in pendings:
         logger.info(
@@ -47,183 +53,185 @@ def process_pending_payment_reminders():
         )
 
         # Marca que "enviaria" lembrete
-        db.increment_payment_reminder(payment["id"])
+        await async_db.increment_payment_reminder(payment["id"])
 
 
-def process_confirmed_payments():
-    payments = db.get_confirmed_unprocessed_payments()
+@observe_job
+async def process_confirmed_payments(batch_size: int = None):
+    """
+    Varredura de segurança do listener de pagamentos: ativa todo pagamento
+    confirmado ainda sem assinatura, mais antigos primeiro, em lotes.
+    Retorna quantos pagamentos foram processados.
+    """
+    batch_size = batch_size or config.PAYMENT_SWEEP_BATCH
+    processed = 0
+    after = None
 
-    logger.info(f"[DEBUG] Pagamentos encontrados: {len(payments)}")
+    while True:
+        payments = await async_db.get_confirmed_unprocessed_payments(limit=batch_size, after=after)
+        if not payments:
+            break
 
-    for payment in payments:
-        logger.info(f"[DEBUG] Payment raw: {payment}")
+        for payment in payments:
+            try:
+                logger.info(
+                    "[JOB] Processando pagamento confirmado",
+                    extra={
+                        "payment_id": payment["id"],
+                        "user_id": payment["user_id"],
+                        "plan": payment["plan"],
+                    }
+                )
 
-        try:
-            logger.info(
-                "[JOB] Processando pagamento confirmado",
-                extra={
-                    "payment_id": payment["id"],
-                    "user_id": payment["user_id"],
-                    "plan": payment["plan"],
-                }
-            )
+                await activate_subscription_from_payment_async(payment["id"])
 
-            activate_subscription_from_payment(payment["id"])
+            except Exception:
+                logger.exception(
+                    "[JOB] Falha ao processar pagamento confirmado",
+                    extra={"payment_id": payment["id"]},
+                )
+
+        processed += len(payments)
+        last = payments[-1]
+        after = (last["created_at"], last["id"])
+
+        if len(payments) < batch_size:
+            break
+
+    if processed:
+        logger.info("[JOB] Pagamentos confirmados processados", extra={"processed": processed})
+    return processed
 
-        except Exception:
-            logger.exception(
-                "[JOB] Falha ao processar pagamento confirmado",
-                extra={"payment_id": payment["id"]},
-            )
 
-async def revoke_expired_group_access(application):
+@observe_job
+async def reconcile_pending_payments_job(application):
     """
-    Remove do grupo quem acabou de expirar a assinatura.
+    Confere em lote os pagamentos pendentes com o gateway (webhooks perdidos).
     """
-    expired = db.get_recently_expired_subscriptions(window_minutes=10)
-
-    for sub in expired:
-        telegram_id = sub["telegram_id"]
-        try:
-            # remove o usuário do grupo
-            await application.bot.ban_chat_member(
-                chat_id=config.GRUPO_ID,
-                user_id=telegram_id,
-            )
-            # unban para permitir voltar no futuro via novo invite
-            await application.bot.unban_chat_member(
-                chat_id=config.GRUPO_ID,
-                user_id=telegram_id,
-                only_if_banned=True,
-            )
-            logger.info(
-                "[JOB] Acesso revogado por expiração",
-                extra={"user_id": sub["user_id"], "sub_id": sub["id"]},
-            )
-        except Exception:
-            logger.exception(
-                "[JOB] Falha ao remover usuário expirado do grupo",
-                extra={"telegram_id": telegram_id},
-            )
+    return await reconcile_pending_payments(
+        application.bot,
+        min_age_seconds=config.RECONCILE_MIN_AGE_SECONDS,
+        lookback_hours=config.RECONCILE_LOOKBACK_HOURS,
+        max_rows=config.RECONCILE_MAX_ROWS,
+        page_size=config.RECONCILE_PAGE_SIZE,
+        concurrency=config.RECONCILE_CONCURRENCY,
+    )
+
+
+@observe_job
+async def purge_webhook_dedup_job():
+    """
+    Remove chaves de deduplicação e eventos processados/mortos da inbox
+    fora da janela de retenção.
+    """
+    await deduplicator.purge()
+    await inbox.purge(
+        config.INBOX_DONE_RETENTION_HOURS,
+        config.INBOX_DEAD_RETENTION_HOURS,
+        batch_size=config.INBOX_PURGE_BATCH,
+    )
 
-from app.infra import db
 
+@observe_job
 async def schedule_expiration_reminders_job():
     """
     Job que roda periodicamente e popula a outbox com avisos D-3, D-2 e D-1.
     """
-    db.schedule_expiration_reminders()
+    created = await async_db.schedule_expiration_reminders()
+    logger.info("[JOB] Avisos de expiração agendados", extra={"created": created})
 
-async def process_outbox_tasks(application):
-    """
-    Consome tasks da outbox de aviso de expiração (D-3, D-2, D-1)
-    e envia mensagem no Telegram com botão de renovação.
-    """
-    with db.get_db() as conn:
-        cur = conn.cursor()
-
-        # 1) Buscar tasks pendentes
-        cur.execute(
-            """
-            SELECT
-                ot.id,
-                ot.user_id,
-                ot.metadata,
-                u.telegram_id
-            FROM outbox_tasks ot
-            JOIN users u ON u.id = ot.user_id
-            WHERE
-                ot.status = 'pending'
-                AND ot.task_type = 'SUBSCRIPTION_EXPIRY_WARNING'
-            ORDER BY ot.created_at
-            LIMIT 50
-            """
+
+def _expiry_warning_text(plan: str, days_left: int) -> str:
+    if days_left == 3:
+        return (
+            "⚠️ Sua assinatura está entrando na reta final.\n\n"
+            f"Plano: {plan}\n"
+            "Vence em 3 dias.\n\n"
+            "Renove agora e garanta um desconto especial."
+        )
+    if days_left == 2:
+        return (
+            "⚠️ Sua assinatura vence em 2 dias.\n\n"
+            f"Plano: {plan}\n\n"
+            "Ainda dá tempo de renovar com desconto."
         )
-        rows = cur.fetchall()
-
-        if not rows:
-            return
-
-        for task_id, user_id, metadata, telegram_id in rows:
-            # metadata pode vir como dict ou string json
-            if isinstance(metadata, str):
-                metadata = json.loads(metadata)
-
-            subscription_id = metadata.get("subscription_id")
-            plan = metadata.get("plan")
-            days_left = int(metadata.get("days_left", 0))
-
-            logger.info(
-                "[OUTBOX] Processando aviso de expiração",
-                extra={
-                    "task_id": task_id,
-                    "user_id": user_id,
-                    "telegram_id": telegram_id,
-                    "subscription_id": subscription_id,
-                    "plan": plan,
-                    "days_left": days_left,
-                },
+    if days_left == 1:
+        return (
+            "⏰ Sua assinatura vence amanhã.\n\n"
+            f"Plano: {plan}\n\n"
+            "Renove agora com desconto para não perder o acesso."
+        )
+    return (
+        f"Aviso de expiração de assinatura.\n\n"
+        f"Plano: {plan}\n"
+        f"Dias restantes: {days_left}"
+    )
+
+
+async def send_expiry_warning(bot, task: dict):
+    """
+    Envia um aviso de expiração (D-3, D-2, D-1) com botão de renovação.
+    Exceções são tratadas pelo OutboxDispatcher (retry/backoff/dead).
+    """
+    metadata = task["metadata"]
+    # metadata pode vir como dict ou string json
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+
+    subscription_id = task["subscription_id"] or metadata.get("subscription_id")
+    plan = metadata.get("plan")
+    days_left = int(task["days_left"] if task["days_left"] is not None else metadata.get("days_left", 0))
+
+    logger.info(
+        "[OUTBOX] Processando aviso de expiração",
+        extra={
+            "task_id": task["id"],
+            "user_id": task["user_id"],
+            "telegram_id": task["telegram_id"],
+            "subscription_id": subscription_id,
+            "plan": plan,
+            "days_left": days_left,
+            "attempts": task["attempts"],
+        },
+    )
+
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(
+                "🔁 Renovar com desconto",
+                callback_data="menu:renovar",  # renovação com desconto de até 3 dias
             )
+        ]
+    ])
 
-            if days_left == 3:
-                text = (
-                    "⚠️ Sua assinatura está entrando na reta final.\n\n"
-                    f"Plano: {plan}\n"
-                    "Vence em 3 dias.\n\n"
-                    "Renove agora e garanta um desconto especial."
-                )
-            elif days_left == 2:
-                text = (
-                    "⚠️ Sua assinatura vence em 2 dias.\n\n"
-                    f"Plano: {plan}\n\n"
-                    "Ainda dá tempo de renovar com desconto."
-                )
-            elif days_left == 1:
-                text = (
-                    "⏰ Sua assinatura vence amanhã.\n\n"
-                    f"Plano: {plan}\n\n"
-                    "Renove agora com desconto para não perder o acesso."
-                )
-            else:
-                text = (
-                    f"Aviso de expiração de assinatura.\n\n"
-                    f"Plano: {plan}\n"
-                    f"Dias restantes: {days_left}"
-                )
+    await bot.send_message(
+        chat_id=task["telegram_id"],
+        text=_expiry_warning_text(plan, days_left),
+        reply_markup=keyboard,
+        rate_limit_args=BULK,
+    )
 
-            keyboard = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton(
-                        "🔁 Renovar com desconto",
-                        callback_data=f"renew_sub:{subscription_id}:{days_left}",
-                    )
-                ]
-            ])
 
-            try:
-                await application.bot.send_message(
-                    chat_id=telegram_id,
-                    text=text,
-                    reply_markup=keyboard,
-                )
-            except TelegramError:
-                logger.exception(
-                    "[OUTBOX] Falha ao enviar aviso de expiração",
-                    extra={"task_id": task_id, "telegram_id": telegram_id},
-                )
-                cur.execute(
-                    "UPDATE outbox_tasks SET status = 'error', processed_at = NOW() WHERE id = %s",
-                    (task_id,),
-                )
-                continue
-
-            cur.execute(
-                """
-                UPDATE outbox_tasks
-                SET status = 'processed',
-                    processed_at = NOW()
-                WHERE id = %s
-                """,
-                (task_id,),
-            )
+_outbox_dispatcher = None
+
+
+@observe_job
+async def process_outbox_tasks(application):
+    """
+    Consome a outbox (avisos de expiração): reserva lotes com SKIP LOCKED,
+    envia em paralelo limitado e grava cada resultado na hora.
+    """
+    global _outbox_dispatcher
+    if _outbox_dispatcher is None:
+        async def handle_expiry_warning(task):
+            await send_expiry_warning(application.bot, task)
+
+        _outbox_dispatcher = OutboxDispatcher(
+            {"SUBSCRIPTION_EXPIRY_WARNING": handle_expiry_warning},
+            batch_size=config.OUTBOX_BATCH_SIZE,
+            concurrency=config.OUTBOX_CONCURRENCY,
+            max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+            lease_seconds=config.OUTBOX_LEASE_SECONDS,
+        )
 
+    return await _outbox_dispatcher.drain()
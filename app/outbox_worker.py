@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from app.infra import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Drena a `outbox_tasks` em lotes, com envios concorrentes limitados.
+
+    `handlers` mapeia task_type -> coroutine(task). Sucesso marca a task
+    como 'processed'; exceção devolve para a fila com backoff. Usuário que
+    bloqueou o bot (Forbidden) ou chat inexistente vão direto para 'dead';
+    RetryAfter reagenda para quando o Telegram mandar.
+    """
+
+    def __init__(
+        self,
+        handlers: dict,
+        batch_size: int = 50,
+        concurrency: int = 5,
+        max_attempts: int = 5,
+        lease_seconds: float = 120.0,
+    ):
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def drain(self, max_batches: int | None = None) -> dict:
+        """
+        Processa lotes até a fila de tasks prontas esvaziar (ou até
+        `max_batches`). Retorna contagem por resultado.
+        """
+        await outbox.release_expired_leases()
+
+        counts = {"processed": 0, "retry": 0, "dead": 0}
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            tasks = await outbox.claim(
+                list(self.handlers), limit=self.batch_size, lease_seconds=self.lease_seconds
+            )
+            if not tasks:
+                break
+            batches += 1
+
+            results = await asyncio.gather(*(self._dispatch(task) for task in tasks))
+            for result in results:
+                counts[result] += 1
+
+            if len(tasks) < self.batch_size:
+                break
+
+        if any(counts.values()):
+            logger.info("[OUTBOX] Lote(s) processado(s)", extra=counts)
+        return counts
+
+    async def _dispatch(self, task: dict) -> str:
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                await self.handlers[task["task_type"]](task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return await self._fail(task, e)
+
+        try:
+            await outbox.complete(task["id"])
+        except Exception:
+            # enviada mas não marcada: o lease vence e ela pode ser reenviada
+            logger.exception("[OUTBOX] Falha ao marcar task como enviada", extra={"task_id": task["id"]})
+            return "retry"
+
+        logger.info(
+            "[OUTBOX] Task enviada",
+            extra={
+                "task_id": task["id"],
+                "task_type": task["task_type"],
+                "duration_ms": int((time.monotonic() - started) * 1000),
+            },
+        )
+        return "processed"
+
+    async def _fail(self, task: dict, error: Exception) -> str:
+        retry_after = None
+        permanent = isinstance(error, (Forbidden, BadRequest))
+        if isinstance(error, RetryAfter):
+            retry_after = float(error.retry_after)
+
+        try:
+            status = await outbox.fail(
+                task, repr(error), self.max_attempts, retry_after=retry_after, permanent=permanent
+            )
+        except Exception:
+            # o lease vence e a task volta para a fila sozinha
+            logger.exception("[OUTBOX] Falha ao registrar erro da task", extra={"task_id": task["id"]})
+            return "retry"
+
+        log = logger.error if status == "dead" else logger.warning
+        log(
+            "[OUTBOX] Falha ao enviar task",
+            exc_info=error,
+            extra={
+                "task_id": task["id"],
+                "user_id": task["user_id"],
+                "telegram_id": task["telegram_id"],
+                "attempts": task["attempts"],
+                "status": status,
+            },
+        )
+        return "dead" if status == "dead" else "retry"
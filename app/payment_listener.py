@@ -0,0 +1,147 @@
+import asyncio
+import logging
+
+import asyncpg
+
+from app.infra import async_db
+from app.domain.subscriptions import activate_subscription_from_payment_async
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_CONFIRMED_CHANNEL = "payment_confirmed"
+
+
+class PaymentActivationListener:
+    """
+    Ativa assinaturas de pagamentos confirmados fora do pipeline normal.
+
+    Webhook, "Verificar Pagamento" e reconciliação confirmam e ativam na
+    mesma transação (`confirm_and_activate_payment_async`); para esses a
+    trigger (migração 15, deferida para o COMMIT) nem notifica. Sobram as
+    confirmações sem ativação junto — UPDATE manual, script, ativação que
+    falhou — e é isso que chega aqui.
+
+    Escuta o canal `payment_confirmed` numa conexão asyncpg dedicada, fora
+    do pool. Cada notificação traz o payments_v2.id; a ativação é
+    idempotente. NOTIFY não é durável: a cada (re)conexão roda `sweep`
+    para pegar o que foi confirmado enquanto ninguém escutava. A conexão
+    é testada (`SELECT 1`) a cada `health_interval`: uma conexão TCP
+    meio aberta não avisa que caiu e deixaria o listener surdo até a
+    próxima varredura.
+    """
+
+    def __init__(
+        self,
+        sweep,
+        concurrency: int = 4,
+        reconnect_min: float = 1.0,
+        reconnect_max: float = 60.0,
+        health_interval: float = 30.0,
+        health_timeout: float = 5.0,
+    ):
+        self.sweep = sweep
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending = set()
+        self._stopping = False
+        self._task = None
+        self._conn = None
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="payment-listener")
+        logger.info("[LISTEN] Listener de pagamentos confirmados iniciado")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await self._close()
+        logger.info("[LISTEN] Listener finalizado")
+
+    async def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    async def _run(self):
+        delay = self.reconnect_min
+        while not self._stopping:
+            lost = asyncio.Event()
+            try:
+                self._conn = await asyncpg.connect(async_db.DATABASE_URL)
+                self._conn.add_termination_listener(lambda _conn: lost.set())
+                await self._conn.add_listener(PAYMENT_CONFIRMED_CHANNEL, self._on_notify)
+                logger.info("[LISTEN] Escutando canal %s", PAYMENT_CONFIRMED_CHANNEL)
+                delay = self.reconnect_min
+
+                # só depois do LISTEN: nada confirmado a partir daqui se perde
+                await self._sweep()
+                await self._watch(lost)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[LISTEN] Falha na conexão do listener")
+
+            await self._close()
+            if self._stopping:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _watch(self, lost: asyncio.Event):
+        """Retorna quando a conexão cai ou para de responder."""
+        while True:
+            try:
+                await asyncio.wait_for(lost.wait(), timeout=self.health_interval)
+                logger.warning("[LISTEN] Conexão do listener perdida")
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await asyncio.wait_for(self._conn.fetchval("SELECT 1"), timeout=self.health_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("[LISTEN] Conexão do listener não responde — reconectando", exc_info=True)
+                return
+
+    async def _sweep(self):
+        try:
+            await self.sweep()
+        except Exception:
+            logger.exception("[LISTEN] Falha na varredura de pagamentos confirmados")
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str):
+        try:
+            payment_id = int(payload)
+        except ValueError:
+            logger.warning("[LISTEN] Payload inválido: %r", payload)
+            return
+
+        task = asyncio.create_task(self._activate(payment_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _activate(self, payment_id: int):
+        async with self._semaphore:
+            try:
+                await activate_subscription_from_payment_async(payment_id)
+            except Exception:
+                # fica para a varredura periódica
+                logger.exception(
+                    "[LISTEN] Falha ao ativar pagamento notificado",
+                    extra={"payment_id": payment_id},
+                )
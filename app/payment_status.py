@@ -0,0 +1,103 @@
+"""
+Consulta de status de pagamento no Mercado Pago, com coalescing e cache.
+
+- single-flight: consultas simultâneas do mesmo pagamento esperam a mesma
+  chamada ao gateway;
+- status não terminais (pending, in_process...) ficam em cache por poucos
+  segundos — o usuário martelando "Verificar Pagamento" não vira uma
+  chamada por clique;
+- status terminais (approved, rejected, cancelled...) não mudam mais:
+  ficam em cache até sair do LRU.
+
+Falhas (status None) não entram no cache.
+"""
+import asyncio
+import logging
+
+from app import config
+from app.infra.cache import TTLCache
+from app.infra.metrics import PAYMENT_STATUS_LOOKUPS
+from app.payments import check_payment_status
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = frozenset({"approved", "rejected", "cancelled", "refunded", "charged_back", "expired"})
+
+
+class PaymentStatusService:
+    def __init__(self, pending_ttl: float = 5.0, terminal_ttl: float = 7 * 86400.0,
+                 maxsize: int = 50_000):
+        self._pending = TTLCache(maxsize=maxsize, ttl=pending_ttl)
+        self._terminal = TTLCache(maxsize=maxsize, ttl=terminal_ttl)
+        self._inflight = {}
+
+    async def get(self, gateway_payment_id: str, fresh: bool = False) -> str | None:
+        """
+        Status atual do pagamento. `fresh=True` ignora o cache de status
+        não terminais (ex.: chegou notificação de mudança), mas ainda
+        aproveita uma consulta em andamento.
+        """
+        key = str(gateway_payment_id)
+
+        status = self._terminal.get(key)
+        if status is None and not fresh:
+            status = self._pending.get(key)
+        if status is not None:
+            PAYMENT_STATUS_LOOKUPS.labels("cache").inc()
+            return status
+
+        future = self._inflight.get(key)
+        if future is not None:
+            PAYMENT_STATUS_LOOKUPS.labels("coalesced").inc()
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        PAYMENT_STATUS_LOOKUPS.labels("gateway").inc()
+        try:
+            status = await check_payment_status(key)
+            self._store(key, status)
+            future.set_result(status)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # marca como lida: sem "exception was never retrieved" se ninguém esperava
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        return status
+
+    def remember(self, gateway_payment_id: str, status: str | None):
+        """Alimenta o cache com um status obtido por outro caminho (ex.: busca em lote)."""
+        self._store(str(gateway_payment_id), status)
+
+    def _store(self, key: str, status: str | None):
+        if status is None:
+            return
+        if status in TERMINAL_STATUSES:
+            self._terminal.set(key, status)
+            self._pending.pop(key)
+        else:
+            self._pending.set(key, status)
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "pending": self._pending.stats(),
+            "terminal": self._terminal.stats(),
+        }
+
+
+status_service = PaymentStatusService(
+    pending_ttl=config.PAYMENT_STATUS_PENDING_TTL,
+    terminal_ttl=config.PAYMENT_STATUS_TERMINAL_TTL,
+    maxsize=config.PAYMENT_STATUS_CACHE_MAX,
+)
+
+
+async def get_payment_status(gateway_payment_id: str, fresh: bool = False) -> str | None:
+    return await status_service.get(gateway_payment_id, fresh=fresh)
@@ -1,20 +1,170 @@
+import asyncio
 import logging
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 
-import psycopg2
-import mercadopago
+import asyncpg
 
 from app import config
-from app.infra.db import get_db, get_pending_payment
+from app.infra import async_db
+from app.infra.circuit_breaker import CircuitBreaker
+from app.infra.mercadopago_client import MercadoPagoClient
 from app.domain.plans import get_plan
 
 logger = logging.getLogger(__name__)
 
-sdk = mercadopago.SDK(config.MP_ACCESS_TOKEN)
+# espera entre consultas quando outra réplica está gerando o PIX do usuário
+PIX_CLAIM_POLL_INTERVAL = 0.25
 
+_client = None
 
-def create_pix_payment(user_id: int, plan: str, override_amount: float | None = None):
+# user_id -> [asyncio.Lock, quantos usam/esperam]; some quando ninguém usa
+_user_locks = {}
+
+
+def get_gateway_client() -> MercadoPagoClient:
+    """
+    Cliente HTTP do Mercado Pago compartilhado pelo processo (keep-alive).
+    """
+    global _client
+    if _client is None:
+        _client = MercadoPagoClient(
+            config.MP_ACCESS_TOKEN,
+            timeout=config.MP_HTTP_TIMEOUT,
+            connect_timeout=config.MP_HTTP_CONNECT_TIMEOUT,
+            max_connections=config.MP_HTTP_MAX_CONNECTIONS,
+            max_keepalive=config.MP_HTTP_MAX_KEEPALIVE,
+            max_concurrency=config.MP_HTTP_MAX_CONCURRENCY,
+            timeouts={
+                "create_payment": config.MP_TIMEOUT_CREATE_PAYMENT,
+                "get_payment": config.MP_TIMEOUT_GET_PAYMENT,
+                "search_payments": config.MP_TIMEOUT_SEARCH_PAYMENTS,
+            },
+            retry_attempts=config.MP_RETRY_ATTEMPTS,
+            retry_base_delay=config.MP_RETRY_BASE_DELAY,
+            retry_max_delay=config.MP_RETRY_MAX_DELAY,
+            breaker=CircuitBreaker(
+                "mercadopago",
+                failure_threshold=config.MP_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=config.MP_BREAKER_RESET_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+async def close_gateway_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@asynccontextmanager
+async def _user_pix_lock(user_id: int):
+    """
+    asyncio.Lock por usuário: cliques repetidos no mesmo processo esperam
+    aqui, sem ida ao banco, e depois reaproveitam o PIX do primeiro.
+    """
+    entry = _user_locks.get(user_id)
+    if entry is None:
+        entry = _user_locks[user_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _user_locks.pop(user_id, None)
+
+
+def _pending_result(pending: dict) -> dict:
+    return {
+        "id": pending["gateway_payment_id"],
+        "external_reference": pending["external_reference"],
+        "point_of_interaction": {
+            "transaction_data": {
+                "qr_code": pending["pix_qr_code"],
+            }
+        },
+        # foto do QR já enviada ao Telegram (reenvio sem upload)
+        "qr_file_id": pending.get("pix_qr_file_id"),
+    }
+
+
+async def _claim_pix(user_id: int, plan: str, amount: float, external_reference: str):
+    """
+    Transação curta que decide o que fazer com o PIX do usuário:
+
+    - ("reuse", pagamento): já existe pendente do mesmo plano e valor;
+    - ("wait", None): outra réplica está criando (placeholder sem
+      gateway_payment_id) — tentar de novo em instantes;
+    - ("create", id): placeholder gravado; o chamador fala com o gateway.
+
+    O placeholder ocupa o índice único de pendente por usuário (migração
+    13) e vence em PIX_CLAIM_LEASE_SECONDS se quem o criou morrer.
+    """
+    async with async_db.get_db() as conn:
+        # vencido mas ainda 'pending' não serve para reuso e travaria o índice único
+        await conn.execute(
+            "UPDATE payments_v2 SET status = 'expired' "
+            "WHERE user_id = $1 AND status = 'pending' AND expires_at <= NOW()",
+            user_id,
+        )
+        pending = await conn.fetchrow(
+            f"SELECT {async_db.PAYMENT_COLUMNS} FROM payments_v2 WHERE user_id = $1 AND status = 'pending'",
+            user_id,
+        )
+
+        if pending:
+            if pending["gateway_payment_id"] is None:
+                return "wait", None
+            if pending["plan"] == plan and float(pending["amount"]) == float(amount):
+                return "reuse", dict(pending)
+
+            logger.info("Plano ou valor diferente — expirando PIX antigo")
+            await conn.execute("UPDATE payments_v2 SET status = 'expired' WHERE id = $1", pending["id"])
+
+        try:
+            # savepoint: a violação não aborta a transação
+            async with conn.transaction():
+                claim_id = await conn.fetchval(
+                    """
+                    INSERT INTO payments_v2 (
+                        user_id, gateway, external_reference, plan, amount,
+                        status, expires_at, created_at
+                    ) VALUES ($1, 'mercadopago', $2, $3, $4, 'pending',
+                              NOW() + make_interval(secs => $5), NOW())
+                    RETURNING id
+                    """,
+                    user_id, external_reference, plan, float(amount), config.PIX_CLAIM_LEASE_SECONDS,
+                )
+        except asyncpg.UniqueViolationError:
+            # outra réplica gravou o placeholder entre o SELECT e o INSERT
+            return "wait", None
+
+    return "create", claim_id
+
+
+async def _release_claim(claim_id: int):
+    try:
+        async with async_db.get_db() as conn:
+            await conn.execute(
+                "DELETE FROM payments_v2 WHERE id = $1 AND gateway_payment_id IS NULL", claim_id
+            )
+    except Exception:
+        # o placeholder vence sozinho em PIX_CLAIM_LEASE_SECONDS
+        logger.warning("Falha ao liberar placeholder de PIX", exc_info=True, extra={"payment_id": claim_id})
+
+
+async def create_pix_payment(user_id: int, plan: str, override_amount: float | None = None):
+    """
+    Gera (ou reaproveita) o PIX pendente do usuário. No máximo uma chamada
+    ao gateway por usuário de cada vez — no processo (asyncio.Lock) e entre
+    réplicas (placeholder sob o índice único) — e nenhuma transação aberta
+    durante a chamada.
+    """
     plan_data = get_plan(plan)
     if not plan_data:
         raise ValueError(f"Plano inválido: {plan}")
@@ -22,33 +172,40 @@ def create_pix_payment(user_id: int, plan: str, override_amount: float | None =
     base_amount = plan_data["price"]
     amount = override_amount if override_amount is not None else base_amount
 
-    pending = get_pending_payment(user_id)
-    if pending:
-        pending = dict(pending)
-
-    if pending:
-        if pending["plan"] == plan and float(pending["amount"]) == float(amount):
-            logger.info("PIX pendente existente (mesmo plano e mesmo valor) — reutilizando")
-            return {
-                "id": pending["gateway_payment_id"],
-                "external_reference": pending["external_reference"],
-                "point_of_interaction": {
-                    "transaction_data": {
-                        "qr_code": pending["pix_qr_code"],
-                        "qr_code_base64": pending.get("pix_qr_code_base64"),
-                    }
-                },
-            }
+    async with _user_pix_lock(user_id):
+        while True:
+            external_reference = str(uuid.uuid4())
+            action, value = await _claim_pix(user_id, plan, amount, external_reference)
+            if action == "reuse":
+                logger.info("PIX pendente existente (mesmo plano e mesmo valor) — reutilizando")
+                return _pending_result(value)
+            if action == "create":
+                break
+            # outra réplica está gerando o PIX deste usuário: espera ela gravar
+            await asyncio.sleep(PIX_CLAIM_POLL_INTERVAL)
+
+        claim_id = value
+        try:
+            payment, expires_at = await _create_gateway_pix(user_id, plan_data, amount, external_reference)
+        except BaseException:
+            await _release_claim(claim_id)
+            raise
 
-        logger.info("Plano ou valor diferente — expirando PIX antigo")
-        with get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "UPDATE payments_v2 SET status = 'expired' WHERE user_id = %s AND status = 'pending'",
-                (user_id,),
+        try:
+            return await _fill_claim(claim_id, payment, external_reference, expires_at)
+        except Exception:
+            # PIX existe no gateway sem o id no banco: precisa de conciliação manual
+            logger.error(
+                "Falha ao gravar PIX criado no gateway",
+                exc_info=True,
+                extra={"payment_id": claim_id, "gateway_payment_id": payment["id"],
+                       "external_reference": external_reference},
             )
+            raise
+
 
-    external_reference = str(uuid.uuid4())
+async def _create_gateway_pix(user_id: int, plan_data: dict, amount: float, external_reference: str):
+    """Cria o PIX no Mercado Pago. Retorna (pagamento, expires_at)."""
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=30)
     date_of_expiration = expires_at.strftime("%Y-%m-%dT%H:%M:%S.000Z")
 
@@ -62,7 +219,9 @@ def create_pix_payment(user_id: int, plan: str, override_amount: float | None =
     }
 
     logger.info("Gerando novo PIX")
-    result = sdk.payment().create(payment_data)
+    result = await get_gateway_client().create_payment(
+        payment_data, idempotency_key=external_reference
+    )
 
     if result["status"] not in (200, 201):
         logger.error(
@@ -72,43 +231,30 @@ def create_pix_payment(user_id: int, plan: str, override_amount: float | None =
         )
         raise RuntimeError("Erro ao gerar Pix no Mercado Pago")
 
-    payment = result["response"]
+    return result["response"], expires_at
+
+
+async def _fill_claim(claim_id: int, payment: dict, external_reference: str, expires_at: datetime) -> dict:
     tx = payment["point_of_interaction"]["transaction_data"]
     qr_code = tx["qr_code"]
-    qr_code_base64 = tx.get("qr_code_base64")
 
-    try:
-        with get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO payments_v2 (
-                    user_id, gateway, gateway_payment_id, external_reference,
-                    plan, amount, status, expires_at, created_at,
-                    pix_qr_code, pix_qr_code_base64
-                ) VALUES (%s, 'mercadopago', %s, %s, %s, %s, 'pending', %s, %s, %s, %s)
-                """,
-                (
-                    user_id, payment["id"], external_reference, plan, amount,
-                    date_of_expiration, datetime.utcnow().isoformat(),
-                    qr_code, qr_code_base64,
-                ),
-            )
-    except psycopg2.IntegrityError:
-        logger.warning("Idempotência acionada — PIX pendente já existe")
-        pending = get_pending_payment(user_id)
-        if not pending:
-            raise RuntimeError("Violação de idempotência sem pagamento pendente encontrado")
-        return {
-            "id": pending["gateway_payment_id"],
-            "external_reference": pending["external_reference"],
-            "point_of_interaction": {
-                "transaction_data": {
-                    "qr_code": pending["pix_qr_code"],
-                    "qr_code_base64": pending.get("pix_qr_code_base64"),
-                }
-            },
-        }
+    # grava o id do gateway mesmo que o placeholder não esteja mais
+    # pendente: a confirmação procura por gateway_payment_id
+    async with async_db.get_db() as conn:
+        status = await conn.fetchval(
+            """
+            UPDATE payments_v2
+            SET gateway_payment_id = $2, pix_qr_code = $3, expires_at = $4
+            WHERE id = $1
+            RETURNING status
+            """,
+            claim_id, str(payment["id"]), qr_code, expires_at,
+        )
+    if status != "pending":
+        logger.warning(
+            "PIX criado, mas o placeholder não está mais pendente",
+            extra={"payment_id": claim_id, "gateway_payment_id": payment["id"], "status": status},
+        )
 
     logger.info("PIX criado com sucesso — payment_id=%s", payment["id"])
     return {
@@ -117,14 +263,15 @@ def create_pix_payment(user_id: int, plan: str, override_amount: float | None =
         "point_of_interaction": {
             "transaction_data": {
                 "qr_code": qr_code,
-                "qr_code_base64": qr_code_base64,
+                "qr_code_base64": tx.get("qr_code_base64"),
             }
         },
+        "qr_file_id": None,
     }
 
 
-def check_payment_status(gateway_payment_id: str) -> str | None:
-    result = sdk.payment().get(gateway_payment_id)
+async def check_payment_status(gateway_payment_id: str) -> str | None:
+    result = await get_gateway_client().get_payment(gateway_payment_id)
 
     if result["status"] != 200:
         logger.warning("Falha ao consultar status do pagamento: %s", gateway_payment_id)
@@ -0,0 +1,173 @@
+"""
+Reconciliação em lote dos pagamentos pendentes com o Mercado Pago.
+
+Quando um webhook se perde, o `payments_v2` fica em 'pending' até alguém
+clicar em "Verificar Pagamento". Este job pega os pendentes locais, busca
+o status deles no gateway via `/v1/payments/search` (janela de datas,
+paginada — uma chamada traz até `page_size` pagamentos) e aplica a
+diferença:
+
+- approved  → mesmo pipeline do webhook (`confirm_and_deliver`): ativa e
+  manda o convite, idempotente;
+- cancelled / rejected / expired / ... → expirados num único UPDATE;
+- demais (pending, in_process) ou não encontrados → ficam como estão.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.activation import confirm_and_deliver
+from app.infra import async_db
+from app.infra.metrics import PAYMENT_RECONCILE_ROWS
+from app.payment_status import TERMINAL_STATUSES, status_service
+from app.payments import get_gateway_client
+
+logger = logging.getLogger(__name__)
+
+EXPIRE_STATUSES = TERMINAL_STATUSES - {"approved"}
+
+# o search do MP não pagina além disso por offset: a janela avança pela data
+SEARCH_MAX_OFFSET = 10_000
+
+# folga entre o created_at local e o date_created do gateway
+WINDOW_MARGIN = timedelta(minutes=10)
+
+EXPIRE_CHUNK = 500
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _mp_date(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+async def fetch_gateway_statuses(wanted: set, begin: datetime, end: datetime,
+                                 page_size: int = 100) -> tuple[dict, int]:
+    """
+    Status no gateway dos `wanted` (gateway_payment_id), varrendo os
+    pagamentos criados em [begin, end] em ordem de criação. Para assim que
+    todos foram vistos. Retorna ({gateway_payment_id: status}, páginas).
+    """
+    client = get_gateway_client()
+    found = {}
+    pages = 0
+    begin_date = _mp_date(begin)
+    end_date = _mp_date(end)
+    offset = 0
+
+    while len(found) < len(wanted):
+        result = await client.search_payments(
+            sort="date_created",
+            criteria="asc",
+            range="date_created",
+            begin_date=begin_date,
+            end_date=end_date,
+            limit=page_size,
+            offset=offset,
+        )
+        pages += 1
+
+        if result["status"] != 200:
+            raise RuntimeError(f"Busca de pagamentos falhou: HTTP {result['status']}")
+
+        results = result["response"].get("results") or []
+        for payment in results:
+            gpid = str(payment.get("id"))
+            if gpid in wanted:
+                found[gpid] = payment.get("status")
+
+        total = (result["response"].get("paging") or {}).get("total", 0)
+        if not results or offset + len(results) >= total:
+            break
+
+        offset += len(results)
+        if offset + page_size > SEARCH_MAX_OFFSET:
+            # recomeça a janela a partir do último visto (repetidos são inofensivos)
+            last_date = results[-1].get("date_created")
+            if not last_date or last_date == begin_date:
+                logger.warning("[RECONCILE] Janela de busca não avança — parando", extra={"begin": begin_date})
+                break
+            begin_date = last_date
+            offset = 0
+
+    return found, pages
+
+
+async def reconcile_pending_payments(
+    bot,
+    min_age_seconds: float = 120,
+    lookback_hours: float = 72,
+    max_rows: int = 5000,
+    page_size: int = 100,
+    concurrency: int = 4,
+) -> dict:
+    """
+    Uma rodada de reconciliação. Retorna o relatório (também logado).
+    """
+    started = time.perf_counter()
+    report = {
+        "pending": 0, "found": 0, "pages": 0,
+        "confirmed": 0, "activated": 0, "expired": 0,
+        "unchanged": 0, "missing": 0, "errors": 0,
+        "drifted": 0, "duration_ms": 0.0,
+    }
+
+    pending = await async_db.get_pending_payments_for_reconciliation(
+        min_age_seconds, lookback_hours * 3600, limit=max_rows,
+    )
+    report["pending"] = len(pending)
+    if not pending:
+        report["duration_ms"] = _elapsed_ms(started)
+        return report
+
+    wanted = {str(p["gateway_payment_id"]) for p in pending}
+    begin = min(p["created_at"] for p in pending) - WINDOW_MARGIN
+    end = datetime.now(timezone.utc) + WINDOW_MARGIN
+
+    remote, report["pages"] = await fetch_gateway_statuses(wanted, begin, end, page_size=page_size)
+    report["found"] = len(remote)
+    report["missing"] = len(wanted) - len(remote)
+
+    for gpid, status in remote.items():
+        status_service.remember(gpid, status)
+
+    to_confirm = [gpid for gpid, status in remote.items() if status == "approved"]
+    to_expire = [gpid for gpid, status in remote.items() if status in EXPIRE_STATUSES]
+    report["unchanged"] = len(remote) - len(to_confirm) - len(to_expire)
+
+    for i in range(0, len(to_expire), EXPIRE_CHUNK):
+        report["expired"] += await async_db.expire_pending_payments(to_expire[i:i + EXPIRE_CHUNK])
+
+    # confirmação passa pelo pipeline do webhook: é ele que manda o convite
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def confirm(gpid):
+        async with semaphore:
+            try:
+                result = await confirm_and_deliver(bot, gpid)
+            except Exception:
+                logger.exception("[RECONCILE] Falha ao confirmar pagamento", extra={"gateway_payment_id": gpid})
+                report["errors"] += 1
+                return
+            report["confirmed"] += 1
+            report["activated"] += int(result["activated"])
+
+    await asyncio.gather(*(confirm(gpid) for gpid in to_confirm))
+
+    for key in ("confirmed", "expired", "unchanged", "missing", "errors"):
+        if report[key]:
+            PAYMENT_RECONCILE_ROWS.labels(key).inc(report[key])
+
+    report["drifted"] = report["confirmed"] + report["expired"]
+    report["duration_ms"] = _elapsed_ms(started)
+
+    log = logger.warning if report["drifted"] else logger.info
+    log(
+        "[RECONCILE] %d pendente(s), %d divergente(s) (%d confirmado(s), %d expirado(s)) em %.0f ms",
+        report["pending"], report["drifted"], report["confirmed"], report["expired"], report["duration_ms"],
+        extra=report,
+    )
+    return report
@@ -1,15 +1,20 @@
+import asyncio
 import logging
-import time
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Response
 from telegram import Update
 
-from app.bot import build_application
-from app.infra import db
+from app.bot import build_application, build_scheduler
+from app.infra import db, async_db, metrics, migrations, query_log
+from app.infra.leader import LeaderElector
+from app.infra.dedup import deduplicator
 from app import config
-from app.payments import check_payment_status
-from app.infra.db import confirm_payment, get_user_by_id
-from app.domain.subscriptions import activate_subscription_from_payment
+from app.activation import process_mercadopago_event
+from app.inbox_worker import InboxWorkerPool
+from app.expiry_engine import ExpiryEngine
+from app.jobs import process_confirmed_payments
+from app.payment_listener import PaymentActivationListener
+from app.payments import close_gateway_client
 
 
 logging.basicConfig(level=logging.INFO)
@@ -18,20 +23,94 @@ logger = logging.getLogger("webhook")
 app = FastAPI()
 
 application = None  # Telegram Application (webhook mode)
+inbox_workers = None  # workers da webhook_inbox
+payment_listener = None  # LISTEN payment_confirmed -> ativação
+expiry_engine = None  # revogação de acesso no vencimento
+scheduler = None  # jobs periódicos (só no líder)
+leader = None  # eleição de líder entre workers
 
 
 # =========================
 # STARTUP / SHUTDOWN
 # =========================
 
+async def start_leader_services():
+    """
+    Tudo que deve rodar em um único processo: registro do webhook,
+    scheduler, listener de pagamentos e motor de expiração.
+    """
+    global scheduler, payment_listener, expiry_engine
+
+    await register_telegram_webhook()
+
+    scheduler = build_scheduler(application)
+    scheduler.start()
+
+    # Ativação imediata de pagamentos confirmados (varre o atraso ao conectar)
+    payment_listener = PaymentActivationListener(
+        process_confirmed_payments,
+        concurrency=config.PAYMENT_LISTENER_CONCURRENCY,
+        health_interval=config.PAYMENT_LISTENER_HEALTH_INTERVAL,
+        health_timeout=config.PAYMENT_LISTENER_HEALTH_TIMEOUT,
+    )
+    await payment_listener.start()
+
+    # Revogação de acesso no vencimento (recupera o que venceu na parada)
+    expiry_engine = ExpiryEngine(
+        application.bot,
+        config.GRUPO_ID,
+        batch_size=config.EXPIRY_BATCH_SIZE,
+        concurrency=config.EXPIRY_CONCURRENCY,
+        max_sleep=config.EXPIRY_MAX_SLEEP,
+    )
+    await expiry_engine.start()
+
+
+async def stop_leader_services():
+    global scheduler, payment_listener, expiry_engine
+
+    if expiry_engine:
+        await expiry_engine.stop()
+        expiry_engine = None
+
+    if payment_listener:
+        await payment_listener.stop()
+        payment_listener = None
+
+    if scheduler:
+        scheduler.shutdown(wait=False)
+        scheduler = None
+
+
+async def register_telegram_webhook():
+    """
+    Registra o webhook só se ele mudou — numa troca de líder o webhook
+    já está certo e os updates pendentes não são descartados.
+    """
+    info = await application.bot.get_webhook_info()
+    if info.url == config.WEBHOOK_URL:
+        logger.info(f"Webhook Telegram já configurado para {config.WEBHOOK_URL}")
+        return
+
+    await application.bot.set_webhook(
+        url=config.WEBHOOK_URL,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+    )
+    logger.info(f"Webhook Telegram configurado para {config.WEBHOOK_URL}")
+
+
 @app.on_event("startup")
 async def startup():
-    global application
+    global application, inbox_workers, leader
 
     logger.info("Inicializando aplicação...")
 
-    # Inicializa banco (cria tabelas se não existirem)
-    db.init_db()
+    # Aplica migrações pendentes (no-op se o schema já estiver em dia).
+    # psycopg2 é bloqueante: roda numa thread, fora do event loop
+    await asyncio.to_thread(migrations.migrate)
+
+    await async_db.init_pool()
 
     if not config.WEBHOOK_URL:
         raise RuntimeError("WEBHOOK_URL não definida no ambiente")
@@ -42,26 +121,49 @@ async def startup():
     await application.initialize()
     await application.start()
 
-    # Remove webhook anterior
-    await application.bot.delete_webhook(drop_pending_updates=True)
+    logger.info("Telegram application inicializada (modo webhook)")
 
-    # Define novo webhook
-    await application.bot.set_webhook(
-        url=config.WEBHOOK_URL,
-        allowed_updates=Update.ALL_TYPES,
-    )
+    async def handle_mercadopago(event):
+        await process_mercadopago_event(application.bot, event)
 
-    logger.info(f"Webhook Telegram configurado para {config.WEBHOOK_URL}")
-    logger.info("Telegram application inicializada (modo webhook)")
+    # Inbox roda em todos os workers (claim com SKIP LOCKED)
+    inbox_workers = InboxWorkerPool(
+        {"mercadopago": handle_mercadopago},
+        concurrency=config.INBOX_WORKERS,
+        poll_interval=config.INBOX_POLL_INTERVAL,
+        max_attempts=config.INBOX_MAX_ATTEMPTS,
+        lease_seconds=config.INBOX_LEASE_SECONDS,
+    )
+    await inbox_workers.start()
+
+    # Webhook, jobs, listener e expiração só no líder
+    leader = LeaderElector(
+        start_leader_services,
+        stop_leader_services,
+        retry_interval=config.LEADER_RETRY_INTERVAL,
+        check_interval=config.LEADER_CHECK_INTERVAL,
+        lease_seconds=config.LEADER_LEASE_SECONDS,
+    )
+    await leader.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    if leader:
+        await leader.stop()
+
+    if inbox_workers:
+        await inbox_workers.stop()
+
     if application:
         await application.stop()
         await application.shutdown()
         logger.info("Telegram application finalizada")
 
+    await close_gateway_client()
+    await async_db.close_pool()
+    db.close_pool()
+
 
 # =========================
 # HEALTHCHECK
@@ -69,7 +171,17 @@ async def shutdown():
 
 @app.api_route("/health", methods=["GET", "HEAD"])
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "leader": bool(leader and leader.is_leader)}
+
+
+# =========================
+# METRICS
+# =========================
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = await metrics.render()
+    return Response(content=body, media_type=content_type)
 
 
 # =========================
@@ -84,7 +196,8 @@ async def telegram_webhook(request: Request):
 
     try:
         update = Update.de_json(payload, application.bot)
-        await application.process_update(update)
+        with query_log.track_request("telegram_update"):
+            await application.process_update(update)
     except Exception:
         logger.exception("Erro ao processar update do Telegram")
         raise HTTPException(status_code=500, detail="Erro Telegram")
@@ -98,90 +211,38 @@ async def telegram_webhook(request: Request):
 
 @app.post("/webhook/mercadopago")
 async def mercadopago_webhook(request: Request):
+    """
+    Só registra a notificação na inbox durável e responde na hora; o
+    processamento (gateway, banco, convite) fica com os workers.
+    """
     payload = await request.json()
 
     logger.info("Webhook MercadoPago recebido", extra={"payload": payload})
 
-    try:
-        # Apenas eventos de pagamento
-        if payload.get("type") != "payment":
-            return {"ok": True}
-
-        data = payload.get("data", {})
-        gateway_payment_id = data.get("id")
-
-        if not gateway_payment_id:
-            logger.warning("Webhook MP sem payment id")
-            return {"ok": True}
-
-        # 1️⃣ Confere status direto no MercadoPago
-        status = check_payment_status(gateway_payment_id)
+    # Apenas eventos de pagamento
+    if payload.get("type") != "payment":
+        return {"ok": True}
 
-        if status != "approved":
-            logger.info(
-                "Pagamento ainda não aprovado",
-                extra={"gateway_payment_id": gateway_payment_id, "status": status},
-            )
-            return {"ok": True}
+    data = payload.get("data", {})
+    gateway_payment_id = data.get("id")
 
-        # 2️⃣ Marca pagamento como confirmado no banco
-        payment = confirm_payment(gateway_payment_id)
+    if not gateway_payment_id:
+        logger.warning("Webhook MP sem payment id")
+        return {"ok": True}
 
-        # 3️⃣ Ativa / empilha assinatura (idempotente)
-        activate_subscription_from_payment(payment["id"])
-
-        logger.info(
-            "Pagamento confirmado e assinatura ativada",
-            extra={"gateway_payment_id": gateway_payment_id},
+    try:
+        # duplicatas param aqui: nem gateway, nem ativação
+        event_id = await deduplicator.enqueue_if_new(
+            "mercadopago",
+            payload,
+            event_type=payload.get("action") or payload.get("type"),
+            resource_id=str(gateway_payment_id),
         )
-
-        # 4️⃣ Envia link de convite para o usuário
-        user = get_user_by_id(payment["user_id"])
-        if not user:
-            logger.warning(
-                "Usuario nao encontrado para pagamento",
-                extra={"user_id": payment["user_id"], "payment_id": payment["id"]},
-            )
-            return {"ok": True}
-
-        telegram_id = user["telegram_id"]
-
-        try:
-            expire_date = int(time.time()) + 3600
-
-            invite_link = await application.bot.create_chat_invite_link(
-                chat_id=config.GRUPO_ID,
-                member_limit=1,
-                expire_date=expire_date,
-            )
-
-            text = (
-                "✅ Pagamento aprovado!\n\n"
-                "Aqui está seu link EXCLUSIVO de acesso ao grupo:\n"
-                f"{invite_link.invite_link}\n\n"
-                "Este link é válido por 1 hora e pode ser usado apenas uma vez. "
-                "Não compartilhe com outras pessoas."
-            )
-
-            await application.bot.send_message(
-                chat_id=telegram_id,
-                text=text,
-            )
-
-            logger.info(
-                "Invite enviado com sucesso para usuario",
-                extra={"telegram_id": telegram_id, "payment_id": payment["id"]},
-            )
-
-        except Exception as e:
-            logger.warning(
-                "Erro ao criar/enviar invite para usuario",
-                extra={"telegram_id": telegram_id, "error": str(e)},
-            )
-
     except Exception:
-        logger.exception("Erro no webhook MercadoPago")
+        logger.exception("Erro ao registrar webhook MercadoPago na inbox")
         raise HTTPException(status_code=500, detail="Erro MP")
 
-    return {"ok": True}
+    if event_id and inbox_workers:
+        inbox_workers.notify()
 
+    return {"ok": True}
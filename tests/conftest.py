@@ -0,0 +1,4 @@
+import os
+
+# app.config exige o token na importação; os testes nunca chamam o gateway real
+os.environ.setdefault("MERCADOPAGO_ACCESS_TOKEN", "TEST-TOKEN")
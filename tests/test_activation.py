@@ -0,0 +1,115 @@
+"""
+process_mercadopago_event na inbox: gateway indisponível não dá o evento
+como processado.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app import activation, payments
+from app.activation import process_mercadopago_event
+from app.inbox_worker import InboxWorkerPool
+from app.infra import inbox
+from app.infra.mercadopago_client import MercadoPagoClient
+from app.payment_status import status_service
+
+
+class FakeInboxConn:
+    """`webhook_inbox` com uma linha: entende o claim e os UPDATEs de fail/complete."""
+
+    def __init__(self, row):
+        self.row = row
+
+    async def fetch(self, query, *args):
+        assert "SET status = 'processing'" in query
+        if self.row["status"] != "pending":
+            return []
+        self.row.update(status="processing", attempts=self.row["attempts"] + 1)
+        return [dict(self.row)]
+
+    async def execute(self, query, *args):
+        if "SET status = 'done'" in query:
+            self.row["status"] = "done"
+        else:
+            event_id, status, error, _delay = args
+            self.row.update(status=status, last_error=error)
+        return "UPDATE 1"
+
+
+@pytest.fixture
+def inbox_row(monkeypatch):
+    row = {
+        "id": 1, "source": "mercadopago", "resource_id": "555", "status": "pending",
+        "attempts": 0, "received_at": datetime.now(timezone.utc), "last_error": None,
+    }
+    conn = FakeInboxConn(row)
+
+    @asynccontextmanager
+    async def get_db():
+        yield conn
+
+    monkeypatch.setattr(inbox.async_db, "get_db", get_db)
+    return row
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    state = {"status": 503, "calls": 0}
+
+    def handler(request):
+        state["calls"] += 1
+        if state["status"] != 200:
+            return httpx.Response(state["status"], json={})
+        return httpx.Response(200, json={"id": 555, "status": "pending"})
+
+    client = MercadoPagoClient(
+        "TEST-TOKEN", transport=httpx.MockTransport(handler),
+        retry_attempts=1, retry_base_delay=0, retry_max_delay=0,
+    )
+    monkeypatch.setattr(payments, "_client", client)
+    status_service._pending.clear()
+    status_service._terminal.clear()
+    return state
+
+
+async def drain_once():
+    workers = InboxWorkerPool({"mercadopago": lambda event: process_mercadopago_event(None, event)})
+    events = await inbox.claim()
+    if events:
+        await workers._process(events[0])
+
+
+def test_gateway_failure_sends_event_back_to_the_queue(inbox_row, gateway):
+    asyncio.run(drain_once())
+
+    assert gateway["calls"] == 2  # tentativa + 1 retry
+    assert inbox_row["status"] == "pending"
+    assert inbox_row["attempts"] == 1
+    assert "indisponível" in inbox_row["last_error"]
+
+
+def test_redelivery_after_recovery_completes_the_event(inbox_row, gateway):
+    asyncio.run(drain_once())
+
+    gateway["status"] = 200
+    asyncio.run(drain_once())
+
+    assert inbox_row["status"] == "done"
+    assert inbox_row["attempts"] == 2
+
+
+def test_not_yet_approved_is_done(inbox_row, gateway, monkeypatch):
+    delivered = []
+
+    async def confirm_and_deliver(bot, gateway_payment_id):
+        delivered.append(gateway_payment_id)
+
+    monkeypatch.setattr(activation, "confirm_and_deliver", confirm_and_deliver)
+    gateway["status"] = 200
+    asyncio.run(drain_once())
+
+    assert inbox_row["status"] == "done"
+    assert delivered == []
@@ -0,0 +1,52 @@
+"""
+WebhookDeduplicator: descarte de reentregas e contadores exportados.
+"""
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.infra import dedup
+from app.infra.dedup import WebhookDeduplicator, event_key
+
+
+def events(kind):
+    return REGISTRY.get_sample_value("webhook_dedup_events_total", {"kind": kind}) or 0
+
+
+@pytest.fixture
+def seen_in_db(monkeypatch):
+    seen = set()
+
+    async def enqueue(source, event_type, resource_id, payload, dedup_key=None):
+        if dedup_key in seen:
+            return None
+        seen.add(dedup_key)
+        return len(seen)
+
+    monkeypatch.setattr(dedup.inbox, "enqueue", enqueue)
+    return seen
+
+
+def test_duplicates_are_dropped_and_counted(seen_in_db):
+    before = {kind: events(kind) for kind in ("received", "duplicates_memory", "duplicates_db")}
+    payload = {"id": 42, "type": "payment", "data": {"id": "555"}}
+    other_replica = WebhookDeduplicator()
+
+    async def scenario():
+        deduplicator = WebhookDeduplicator()
+        first = await deduplicator.enqueue_if_new("mercadopago", payload, "payment", "555")
+        again = await deduplicator.enqueue_if_new("mercadopago", payload, "payment", "555")
+        elsewhere = await other_replica.enqueue_if_new("mercadopago", payload, "payment", "555")
+        return first, again, elsewhere
+
+    assert asyncio.run(scenario()) == (1, None, None)
+    assert events("received") == before["received"] + 3
+    assert events("duplicates_memory") == before["duplicates_memory"] + 1
+    assert events("duplicates_db") == before["duplicates_db"] + 1
+
+
+def test_event_key_without_id_hashes_the_body():
+    a = event_key("mercadopago", {"data": {"id": "1"}, "action": "payment.updated"})
+    b = event_key("mercadopago", {"action": "payment.updated", "data": {"id": "1"}})
+    assert a == b and a.startswith("mercadopago:sha256:")
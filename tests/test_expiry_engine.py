@@ -0,0 +1,72 @@
+"""
+ExpiryEngine._expire: quais erros do Telegram dão a revogação como feita.
+"""
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError
+
+from app import expiry_engine
+from app.expiry_engine import ExpiryEngine
+
+
+class FakeBot:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    async def ban_chat_member(self, **kwargs):
+        self.calls.append(("ban", kwargs["user_id"]))
+        if self.error is not None:
+            raise self.error
+
+    async def unban_chat_member(self, **kwargs):
+        self.calls.append(("unban", kwargs["user_id"]))
+
+
+SUB = {"id": 1, "user_id": 10, "telegram_id": 100, "has_active": False, "expiry_attempts": 0}
+
+
+@pytest.fixture
+def retried(monkeypatch):
+    calls = []
+
+    async def retry_later(sub):
+        calls.append(sub["id"])
+
+    monkeypatch.setattr(expiry_engine.expiry, "retry_later", retry_later)
+    return calls
+
+
+def expire(bot, sub=SUB):
+    return asyncio.run(ExpiryEngine(bot, group_id=-100)._expire(sub))
+
+
+def test_revoked_member_is_processed(retried):
+    bot = FakeBot()
+    assert expire(bot) is True
+    assert bot.calls == [("ban", 100), ("unban", 100)]
+    assert retried == []
+
+
+@pytest.mark.parametrize("message", ["User not found", "USER_NOT_PARTICIPANT", "Participant_id_invalid"])
+def test_member_already_gone_is_processed(retried, message):
+    assert expire(FakeBot(BadRequest(message))) is True
+    assert retried == []
+
+
+@pytest.mark.parametrize("message", ["Not enough rights to restrict/ban chat member", "Chat not found"])
+def test_misconfiguration_is_retried(retried, message):
+    assert expire(FakeBot(BadRequest(message))) is False
+    assert retried == [1]
+
+
+def test_network_error_is_retried(retried):
+    assert expire(FakeBot(NetworkError("boom"))) is False
+    assert retried == [1]
+
+
+def test_user_with_other_active_subscription_is_kept(retried):
+    bot = FakeBot()
+    assert expire(bot, {**SUB, "has_active": True}) is True
+    assert bot.calls == []
@@ -0,0 +1,65 @@
+"""
+LeaderElector: falha em `on_elected` não deixa um líder pela metade.
+"""
+import asyncio
+
+from app.infra import leader as leader_module
+from app.infra.leader import LeaderElector
+
+
+class FakeConn:
+    def __init__(self, lock):
+        self.lock = lock
+        self.closed = False
+
+    async def fetchval(self, query, *args):
+        if "pg_try_advisory_lock" in query:
+            if self.lock["held"]:
+                return False
+            self.lock["held"] = True
+            return True
+        if "pg_advisory_unlock" in query:
+            self.lock["held"] = False
+            self.lock["unlocks"] += 1
+            return True
+        return 1
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self, timeout=None):
+        self.closed = True
+        self.lock["held"] = False
+
+
+def test_failed_on_elected_demotes_releases_lock_and_retries(monkeypatch):
+    lock = {"held": False, "unlocks": 0}
+    events = []
+
+    async def connect(_dsn):
+        return FakeConn(lock)
+
+    monkeypatch.setattr(leader_module.asyncpg, "connect", connect)
+
+    async def on_elected():
+        events.append("elected")
+        if events.count("elected") == 1:
+            raise ConnectionError("get_webhook_info falhou")
+
+    async def on_demoted():
+        events.append("demoted")
+
+    async def scenario():
+        elector = LeaderElector(on_elected, on_demoted, retry_interval=0.01, check_interval=0.01)
+        await elector.start()
+        for _ in range(100):
+            if events.count("elected") == 2:
+                break
+            await asyncio.sleep(0.01)
+        is_leader = elector.is_leader
+        await elector.stop()
+        return is_leader
+
+    assert asyncio.run(scenario()) is True
+    assert events[:3] == ["elected", "demoted", "elected"]
+    assert lock["unlocks"] == 1
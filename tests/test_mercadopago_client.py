@@ -0,0 +1,332 @@
+"""
+MercadoPagoClient contra um gateway falso (httpx.MockTransport): formato
+das respostas, timeouts por operação, limite de chamadas simultâneas,
+novas tentativas e circuit breaker.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.infra.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.infra.mercadopago_client import MercadoPagoClient
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0)
+    kwargs.setdefault("retry_max_delay", 0)
+    return MercadoPagoClient("TEST-TOKEN", transport=httpx.MockTransport(handler), **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_create_payment_posts_payload_with_auth_and_idempotency_key():
+    seen = {}
+
+    def handler(request):
+        seen["method"] = request.method
+        seen["path"] = request.url.path
+        seen["headers"] = request.headers
+        seen["body"] = json.loads(request.content)
+        return httpx.Response(201, json={"id": 123, "status": "pending"})
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            return await client.create_payment({"transaction_amount": 10.0}, idempotency_key="ref-1")
+        finally:
+            await client.aclose()
+
+    result = run(scenario())
+
+    assert result == {"status": 201, "response": {"id": 123, "status": "pending"}}
+    assert seen["method"] == "POST"
+    assert seen["path"] == "/v1/payments"
+    assert seen["headers"]["Authorization"] == "Bearer TEST-TOKEN"
+    assert seen["headers"]["X-Idempotency-Key"] == "ref-1"
+    assert seen["body"] == {"transaction_amount": 10.0}
+
+
+def test_create_payment_generates_idempotency_key_when_missing():
+    keys = []
+
+    def handler(request):
+        keys.append(request.headers.get("X-Idempotency-Key"))
+        return httpx.Response(201, json={"id": 1})
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            await client.create_payment({})
+            await client.create_payment({})
+        finally:
+            await client.aclose()
+
+    run(scenario())
+
+    assert all(keys) and keys[0] != keys[1]
+
+
+def test_get_payment_returns_sdk_shaped_response():
+    def handler(request):
+        assert request.method == "GET"
+        assert request.url.path == "/v1/payments/987"
+        return httpx.Response(200, json={"id": 987, "status": "approved"})
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            return await client.get_payment(987)
+        finally:
+            await client.aclose()
+
+    assert run(scenario()) == {"status": 200, "response": {"id": 987, "status": "approved"}}
+
+
+def test_non_json_body_is_returned_raw():
+    def handler(request):
+        return httpx.Response(404, text="not found")
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            return await client.get_payment(1)
+        finally:
+            await client.aclose()
+
+    assert run(scenario()) == {"status": 404, "response": {"raw": "not found"}}
+
+
+def test_search_payments_sends_filters_as_query_string():
+    def handler(request):
+        assert request.url.path == "/v1/payments/search"
+        assert request.url.params["external_reference"] == "ref-1"
+        assert request.url.params["limit"] == "50"
+        return httpx.Response(200, json={"results": [], "paging": {"total": 0}})
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            return await client.search_payments(external_reference="ref-1", limit=50)
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == 200
+
+
+def test_per_operation_timeouts_are_applied():
+    timeouts = {}
+
+    def handler(request):
+        timeouts[request.url.path] = request.extensions["timeout"]["read"]
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        client = make_client(handler, timeout=10.0, timeouts={"get_payment": 2.5})
+        try:
+            await client.get_payment(1)
+            await client.create_payment({})
+        finally:
+            await client.aclose()
+
+    run(scenario())
+
+    assert timeouts["/v1/payments/1"] == 2.5
+    assert timeouts["/v1/payments"] == 10.0
+
+
+def test_timeout_on_create_is_raised_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def scenario():
+        client = make_client(handler, retry_attempts=3)
+        try:
+            await client.create_payment({})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.ReadTimeout):
+        run(scenario())
+    assert len(calls) == 1
+
+
+def test_concurrency_is_capped():
+    state = {"in_flight": 0, "peak": 0}
+
+    async def handler(request):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return httpx.Response(200, json={"status": "pending"})
+
+    async def scenario():
+        client = make_client(handler, max_concurrency=2)
+        try:
+            return await asyncio.gather(*(client.get_payment(i) for i in range(8)))
+        finally:
+            await client.aclose()
+
+    results = run(scenario())
+
+    assert len(results) == 8
+    assert state["peak"] == 2
+
+
+# =========================
+# RETRY / CIRCUIT BREAKER
+# =========================
+
+def sequence_handler(*responses):
+    """Devolve as respostas em ordem; exceções são levantadas."""
+    calls = []
+
+    def handler(request):
+        item = responses[min(len(calls), len(responses) - 1)]
+        calls.append(request)
+        if isinstance(item, Exception):
+            raise item
+        return httpx.Response(item, json={"status": "approved"} if item == 200 else {})
+
+    return handler, calls
+
+
+def test_get_is_retried_on_5xx_and_transport_errors():
+    handler, calls = sequence_handler(503, httpx.ConnectError("refused"), 200)
+
+    async def scenario():
+        client = make_client(handler, retry_attempts=2)
+        try:
+            return await client.get_payment(1)
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == 200
+    assert len(calls) == 3
+
+
+def test_get_gives_up_after_retry_attempts():
+    handler, calls = sequence_handler(502)
+
+    async def scenario():
+        client = make_client(handler, retry_attempts=2)
+        try:
+            return await client.get_payment(1)
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == 502
+    assert len(calls) == 3
+
+
+def test_post_is_not_retried():
+    handler, calls = sequence_handler(503, 201)
+
+    async def scenario():
+        client = make_client(handler, retry_attempts=2)
+        try:
+            return await client.create_payment({})
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == 503
+    assert len(calls) == 1
+
+
+def test_client_errors_do_not_count_for_the_breaker():
+    handler, calls = sequence_handler(400)
+
+    async def scenario():
+        client = make_client(handler, breaker=CircuitBreaker("test-4xx", failure_threshold=1))
+        try:
+            for _ in range(3):
+                await client.create_payment({})
+            return client.breaker.state
+        finally:
+            await client.aclose()
+
+    assert run(scenario()) == "closed"
+    assert len(calls) == 3
+
+
+def test_open_breaker_fails_fast_without_calling_gateway():
+    handler, calls = sequence_handler(500)
+
+    async def scenario():
+        client = make_client(handler, breaker=CircuitBreaker("test-open", failure_threshold=2, reset_timeout=60))
+        try:
+            await client.create_payment({})
+            await client.create_payment({})
+            with pytest.raises(CircuitOpenError) as exc:
+                await client.get_payment(1)
+            return exc.value
+        finally:
+            await client.aclose()
+
+    error = run(scenario())
+    assert len(calls) == 2
+    assert 0 < error.retry_after <= 60
+
+
+def test_failure_that_opens_the_breaker_is_returned_not_retried():
+    handler, calls = sequence_handler(503)
+
+    async def scenario():
+        client = make_client(handler, retry_attempts=2,
+                             breaker=CircuitBreaker("test-trip", failure_threshold=1, reset_timeout=60))
+        try:
+            return await client.get_payment(1)
+        finally:
+            await client.aclose()
+
+    assert run(scenario())["status"] == 503
+    assert len(calls) == 1
+
+
+def test_failed_half_open_probe_surfaces_the_real_error():
+    handler, calls = sequence_handler(503, 503, httpx.ConnectError("refused"))
+
+    async def scenario():
+        breaker = CircuitBreaker("test-probe", failure_threshold=1, reset_timeout=0.01)
+        client = make_client(handler, retry_attempts=2, breaker=breaker)
+        try:
+            await client.get_payment(1)  # abre o circuito
+            await asyncio.sleep(0.02)
+            probe = await client.get_payment(1)  # meio aberto: sonda falha com 503
+            await asyncio.sleep(0.02)
+            with pytest.raises(httpx.ConnectError):
+                await client.get_payment(1)  # sonda falha com erro de rede
+            return probe, breaker.state
+        finally:
+            await client.aclose()
+
+    probe, state = run(scenario())
+    assert probe["status"] == 503
+    assert state == "open"
+    assert len(calls) == 3
+
+
+def test_successful_half_open_probe_closes_the_breaker():
+    handler, calls = sequence_handler(503, 200)
+
+    async def scenario():
+        breaker = CircuitBreaker("test-close", failure_threshold=1, reset_timeout=0.01)
+        client = make_client(handler, breaker=breaker)
+        try:
+            await client.get_payment(1)
+            await asyncio.sleep(0.02)
+            result = await client.get_payment(1)
+            return result, breaker.state
+        finally:
+            await client.aclose()
+
+    result, state = run(scenario())
+    assert result["status"] == 200
+    assert state == "closed"
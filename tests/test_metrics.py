@@ -0,0 +1,53 @@
+"""
+Decorators de métricas: latência e erros de handlers, jobs e funções de banco.
+"""
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.infra.metrics import http_outcome, observe_handler, observe_job
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_async_handler_latency_and_errors():
+    @observe_handler
+    async def metrics_test_handler(fail=False):
+        if fail:
+            raise ValueError("boom")
+        return "ok"
+
+    labels = {"handler": "metrics_test_handler"}
+    count = sample("telegram_update_seconds_count", labels)
+    errors = sample("telegram_update_errors_total", labels)
+
+    assert asyncio.run(metrics_test_handler()) == "ok"
+    with pytest.raises(ValueError):
+        asyncio.run(metrics_test_handler(fail=True))
+
+    assert sample("telegram_update_seconds_count", labels) == count + 2
+    assert sample("telegram_update_errors_total", labels) == errors + 1
+
+
+def test_sync_job_runs_by_result():
+    @observe_job
+    def metrics_test_job(fail=False):
+        if fail:
+            raise RuntimeError("boom")
+
+    metrics_test_job()
+    with pytest.raises(RuntimeError):
+        metrics_test_job(fail=True)
+
+    assert sample("job_runs_total", {"job": "metrics_test_job", "result": "ok"}) == 1
+    assert sample("job_runs_total", {"job": "metrics_test_job", "result": "error"}) == 1
+    assert sample("job_seconds_count", {"job": "metrics_test_job"}) == 2
+
+
+def test_http_outcome():
+    assert http_outcome(None) == "error"
+    assert http_outcome(201) == "2xx"
+    assert http_outcome(503) == "5xx"
@@ -0,0 +1,30 @@
+"""
+0004 (troca TEXT -> TIMESTAMPTZ): nunca reescreve as tabelas no boot.
+"""
+from app.infra import migrations
+
+
+def swap_sql():
+    return dict((v, sql) for v, _name, sql in migrations.MIGRATIONS)[4]
+
+
+def test_swap_starts_with_the_backfill_guard():
+    sql = swap_sql()
+    guard = sql[:sql.index("$$;")]
+
+    assert sql.startswith("DO $$")
+    assert "backfill_timestamps" in guard
+    for table in migrations.TIMESTAMP_COLUMNS:
+        assert migrations.shadow_missing_sql(table) in guard
+
+
+def test_swap_does_no_inline_backfill():
+    assert "UPDATE " not in swap_sql()
+    assert "legacy_text_to_timestamptz(" not in swap_sql().replace(
+        "DROP FUNCTION IF EXISTS legacy_text_to_timestamptz(TEXT)", ""
+    )
+
+
+def test_versions_are_unique_and_ordered():
+    versions = [v for v, _name, _sql in migrations.MIGRATIONS]
+    assert versions == sorted(set(versions))
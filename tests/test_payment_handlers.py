@@ -0,0 +1,87 @@
+"""
+"Verificar Pagamento": toda consulta recebe resposta, mesmo com o gateway fora.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.handlers import payments as handlers
+from app.infra.circuit_breaker import CircuitOpenError
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeQuery:
+    def __init__(self):
+        self.from_user = SimpleNamespace(id=100, first_name="Ana")
+        self.message = FakeMessage()
+
+    async def answer(self):
+        pass
+
+
+@pytest.fixture
+def check(monkeypatch):
+    async def get_or_create_user(telegram_id, nome=None):
+        return 1
+
+    async def get_pending_payment(user_id):
+        return {"id": 7, "gateway_payment_id": "mp-7"}
+
+    monkeypatch.setattr(handlers.async_db, "get_or_create_user", get_or_create_user)
+    monkeypatch.setattr(handlers.async_db, "get_pending_payment", get_pending_payment)
+
+    def run(status=None, error=None, result=None):
+        async def get_payment_status(gateway_payment_id):
+            if error is not None:
+                raise error
+            return status
+
+        async def confirm_and_deliver(bot, gateway_payment_id):
+            return result
+
+        monkeypatch.setattr(handlers, "get_payment_status", get_payment_status)
+        monkeypatch.setattr(handlers, "confirm_and_deliver", confirm_and_deliver)
+
+        query = FakeQuery()
+        update = SimpleNamespace(callback_query=query)
+        context = SimpleNamespace(bot=None)
+        asyncio.run(handlers.handle_check_payment_status(update, context))
+        assert len(query.message.replies) == 1
+        return query.message.replies[0]
+
+    return run
+
+
+@pytest.mark.parametrize("error", [
+    CircuitOpenError("mercadopago", 30),
+    httpx.ReadTimeout("timed out"),
+    httpx.ConnectError("refused"),
+    None,  # 5xx/429 depois dos retries: status None
+])
+def test_gateway_unavailable_gets_a_retry_reply(check, error):
+    assert "Tente novamente em instantes" in check(status=None, error=error)
+
+
+def test_invite_sent(check):
+    reply = check(status="approved", result={"activated": True, "invite_sent": True})
+    assert "enviado acima" in reply
+
+
+def test_invite_failed_does_not_claim_it_was_sent(check):
+    reply = check(status="approved", result={"activated": True, "invite_sent": False})
+    assert "enviado acima" not in reply
+    assert "suporte" in reply
+
+
+def test_already_activated(check):
+    reply = check(status="approved", result={"activated": False, "invite_sent": False})
+    assert "já foi liberado" in reply
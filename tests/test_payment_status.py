@@ -0,0 +1,99 @@
+"""
+PaymentStatusService: single-flight e cache de status do gateway.
+"""
+import asyncio
+
+import pytest
+
+from app import payment_status
+from app.payment_status import PaymentStatusService
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    state = {"calls": 0, "statuses": ["pending"], "delay": 0.01}
+
+    async def check_payment_status(gateway_payment_id):
+        state["calls"] += 1
+        await asyncio.sleep(state["delay"])
+        item = state["statuses"][min(state["calls"], len(state["statuses"])) - 1]
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    monkeypatch.setattr(payment_status, "check_payment_status", check_payment_status)
+    return state
+
+
+def test_concurrent_checks_share_one_gateway_call(gateway):
+    service = PaymentStatusService()
+
+    async def scenario():
+        return await asyncio.gather(*(service.get("mp-1") for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ["pending"] * 10
+    assert gateway["calls"] == 1
+    assert service.stats()["inflight"] == 0
+
+
+def test_pending_status_is_cached_until_ttl(gateway):
+    service = PaymentStatusService(pending_ttl=0.05)
+
+    async def scenario():
+        first = await service.get("mp-1")
+        second = await service.get("mp-1")
+        await asyncio.sleep(0.06)
+        third = await service.get("mp-1")
+        return first, second, third
+
+    assert asyncio.run(scenario()) == ("pending", "pending", "pending")
+    assert gateway["calls"] == 2
+
+
+def test_fresh_skips_pending_cache_but_not_terminal(gateway):
+    gateway["statuses"] = ["pending", "approved", "rejected"]
+    service = PaymentStatusService()
+
+    async def scenario():
+        await service.get("mp-1")
+        approved = await service.get("mp-1", fresh=True)
+        again = await service.get("mp-1", fresh=True)
+        return approved, again
+
+    assert asyncio.run(scenario()) == ("approved", "approved")
+    assert gateway["calls"] == 2
+
+
+def test_failed_lookup_is_not_cached(gateway):
+    gateway["statuses"] = [None, "approved"]
+    service = PaymentStatusService()
+
+    async def scenario():
+        return await service.get("mp-1"), await service.get("mp-1")
+
+    assert asyncio.run(scenario()) == (None, "approved")
+    assert gateway["calls"] == 2
+
+
+def test_gateway_error_reaches_every_waiter_and_is_not_cached(gateway):
+    gateway["statuses"] = [ConnectionError("boom"), "pending"]
+    service = PaymentStatusService()
+
+    async def scenario():
+        results = await asyncio.gather(*(service.get("mp-1") for _ in range(3)), return_exceptions=True)
+        return results, await service.get("mp-1")
+
+    results, after = asyncio.run(scenario())
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert after == "pending"
+    assert gateway["calls"] == 2
+
+
+def test_remember_feeds_the_cache(gateway):
+    service = PaymentStatusService()
+    service.remember("mp-1", "approved")
+    service.remember("mp-2", None)
+
+    assert asyncio.run(service.get("mp-1")) == "approved"
+    assert gateway["calls"] == 0
+    assert service.stats()["pending"]["size"] == 0
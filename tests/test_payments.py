@@ -0,0 +1,104 @@
+"""
+create_pix_payment: uma chamada ao gateway por usuário de cada vez.
+
+O banco é simulado no nível de `_claim_pix` / `_fill_claim` / `_release_claim`
+(um pendente por usuário, como o índice único da migração 13).
+"""
+import asyncio
+
+import pytest
+
+from app import payments
+
+
+class FakeStore:
+    def __init__(self):
+        self.pending = None
+        self.next_id = 1
+        self.gateway_calls = 0
+        self.released = []
+
+    async def claim(self, user_id, plan, amount, external_reference):
+        await asyncio.sleep(0)
+        if self.pending is not None:
+            if self.pending["gateway_payment_id"] is None:
+                return "wait", None
+            if self.pending["plan"] == plan and self.pending["amount"] == amount:
+                return "reuse", dict(self.pending)
+        self.pending = {
+            "id": self.next_id, "gateway_payment_id": None, "external_reference": external_reference,
+            "plan": plan, "amount": amount, "pix_qr_code": None, "pix_qr_file_id": None,
+        }
+        self.next_id += 1
+        return "create", self.pending["id"]
+
+    async def create_gateway(self, user_id, plan_data, amount, external_reference):
+        self.gateway_calls += 1
+        await asyncio.sleep(0.01)
+        gateway_id = f"mp-{self.gateway_calls}"
+        return {"id": gateway_id, "point_of_interaction": {"transaction_data": {"qr_code": f"pix-{gateway_id}"}}}, None
+
+    async def fill(self, claim_id, payment, external_reference, expires_at):
+        self.pending["gateway_payment_id"] = payment["id"]
+        self.pending["pix_qr_code"] = payment["point_of_interaction"]["transaction_data"]["qr_code"]
+        return payments._pending_result(self.pending)
+
+    async def release(self, claim_id):
+        self.released.append(claim_id)
+        self.pending = None
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(payments, "_claim_pix", store.claim)
+    monkeypatch.setattr(payments, "_create_gateway_pix", store.create_gateway)
+    monkeypatch.setattr(payments, "_fill_claim", store.fill)
+    monkeypatch.setattr(payments, "_release_claim", store.release)
+    monkeypatch.setattr(payments, "PIX_CLAIM_POLL_INTERVAL", 0.005)
+    monkeypatch.setattr(payments, "get_plan", lambda plan: {"price": 10.0, "title": "Plano"})
+    return store
+
+
+def test_concurrent_taps_share_one_gateway_call(store):
+    async def scenario():
+        return await asyncio.gather(*(payments.create_pix_payment(1, "mensal") for _ in range(5)))
+
+    results = asyncio.run(scenario())
+
+    assert store.gateway_calls == 1
+    assert {r["id"] for r in results} == {"mp-1"}
+    assert payments._user_locks == {}
+
+
+def test_waits_for_placeholder_from_another_replica(store):
+    store.pending = {
+        "id": 99, "gateway_payment_id": None, "external_reference": "other",
+        "plan": "mensal", "amount": 10.0, "pix_qr_code": None, "pix_qr_file_id": None,
+    }
+
+    async def other_replica_finishes():
+        await asyncio.sleep(0.03)
+        store.pending.update(gateway_payment_id="mp-other", pix_qr_code="pix-other")
+
+    async def scenario():
+        result, _ = await asyncio.gather(payments.create_pix_payment(1, "mensal"), other_replica_finishes())
+        return result
+
+    result = asyncio.run(scenario())
+
+    assert result["id"] == "mp-other"
+    assert store.gateway_calls == 0
+
+
+def test_gateway_failure_releases_placeholder(store, monkeypatch):
+    async def failing_gateway(*args):
+        raise RuntimeError("Erro ao gerar Pix no Mercado Pago")
+
+    monkeypatch.setattr(payments, "_create_gateway_pix", failing_gateway)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(payments.create_pix_payment(1, "mensal"))
+
+    assert store.released == [1]
+    assert store.pending is None
@@ -0,0 +1,47 @@
+"""
+Renderização local do QR PIX (`app.infra.qr`).
+"""
+import asyncio
+
+import png
+import qrcode
+
+from app.infra import qr
+
+PIX_PAYLOAD = (
+    "00020126580014br.gov.bcb.pix0136123e4567-e12b-12d1-a456-426655440000"
+    "5204000053039865406100.005802BR5913LOSTCITY BOT6009SAO PAULO62070503***6304ABCD"
+)
+
+
+def test_render_png_draws_the_payload_matrix():
+    qr.png_cache.clear()
+    data = asyncio.run(qr.render_png(PIX_PAYLOAD))
+
+    assert data.startswith(b"\x89PNG\r\n\x1a\n")
+
+    width, height, rows, _info = png.Reader(bytes=data).read()
+    pixels = [list(row) for row in rows]
+
+    expected = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=4)
+    expected.add_data(PIX_PAYLOAD)
+    expected.make(fit=True)
+    matrix = expected.get_matrix()  # com a borda; True = módulo escuro
+
+    box = width // len(matrix)
+    assert width == height == box * len(matrix)
+
+    # centro de cada módulo: escuro (0) onde a matriz é True
+    for y, line in enumerate(matrix):
+        for x, dark in enumerate(line):
+            pixel = pixels[y * box + box // 2][x * box + box // 2]
+            assert (pixel == 0) == dark
+
+
+def test_render_png_is_cached():
+    qr.png_cache.clear()
+    first = asyncio.run(qr.render_png(PIX_PAYLOAD))
+    second = asyncio.run(qr.render_png(PIX_PAYLOAD))
+
+    assert first is second
+    assert qr.cache_stats()["size"] == 1
@@ -0,0 +1,46 @@
+"""
+Instrumentação de statements: resumo por requisição e log de query lenta.
+"""
+import logging
+
+from prometheus_client import REGISTRY
+
+from app.infra import query_log
+
+
+def test_track_request_counts_round_trips():
+    before = REGISTRY.get_sample_value("db_request_round_trips_count", {"request": "test_handler"}) or 0
+
+    with query_log.track_request("test_handler") as summary:
+        query_log.record("SELECT 1", (), 0.001, 1, "app.handlers.x.a")
+        query_log.record("SELECT 2", (), 0.002, 3, "app.handlers.x.a")
+        query_log.record("UPDATE t", (), 0.001, None, "app.handlers.x.b")
+
+    assert summary["queries"] == 3
+    assert summary["rows"] == 4
+    assert summary["callers"] == {"app.handlers.x.a": 2, "app.handlers.x.b": 1}
+    after = REGISTRY.get_sample_value("db_request_round_trips_count", {"request": "test_handler"})
+    assert after == before + 1
+
+
+def test_record_outside_a_request_is_not_summarised():
+    query_log.record("SELECT 1", (), 0.001, 1, "app.jobs.x")
+    assert query_log._request_summary.get() is None
+
+
+def test_slow_query_logs_parameter_types_not_values(caplog, monkeypatch):
+    monkeypatch.setattr(query_log, "DB_SLOW_QUERY_MS", 10)
+
+    with caplog.at_level(logging.WARNING, logger="app.infra.query_log"):
+        query_log.record("SELECT * FROM users WHERE telegram_id = $1", (123456789, "Ana"), 0.05, 1, "app.x.y")
+        query_log.record("SELECT 1", (), 0.001, 1, "app.x.y")
+
+    assert len(caplog.records) == 1
+    record = caplog.records[0]
+    assert record.params == "(int, str)"
+    assert "123456789" not in record.getMessage()
+
+
+def test_params_shape():
+    assert query_log.params_shape(None) == "-"
+    assert query_log.params_shape({"id": 1, "ids": [1, 2, 3]}) == "{id: int, ids: list[3]}"
@@ -0,0 +1,113 @@
+"""
+Reconciliação em lote: divergências entre os pendentes locais e o gateway.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from app import payments, reconciliation
+from app.infra.mercadopago_client import MercadoPagoClient
+from app.payment_status import status_service
+
+NOW = datetime.now(timezone.utc)
+
+
+def gateway_payments(statuses: dict) -> list:
+    return [
+        {"id": int(gpid), "status": status, "date_created": (NOW - timedelta(minutes=n)).isoformat()}
+        for n, (gpid, status) in enumerate(statuses.items())
+    ]
+
+
+@pytest.fixture
+def world(monkeypatch):
+    state = {"local": [], "remote": [], "searches": [], "expired": [], "confirmed": []}
+
+    def handler(request):
+        params = request.url.params
+        state["searches"].append(dict(params))
+        offset, limit = int(params["offset"]), int(params["limit"])
+        page = state["remote"][offset:offset + limit]
+        return httpx.Response(200, json={"results": page, "paging": {"total": len(state["remote"])}})
+
+    client = MercadoPagoClient("TEST-TOKEN", transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(payments, "_client", client)
+
+    async def get_pending_payments_for_reconciliation(min_age_seconds, max_age_seconds, limit=5000):
+        return state["local"]
+
+    async def expire_pending_payments(gateway_payment_ids):
+        state["expired"].extend(gateway_payment_ids)
+        return len(gateway_payment_ids)
+
+    async def confirm_and_deliver(bot, gateway_payment_id):
+        state["confirmed"].append(gateway_payment_id)
+        return {"activated": gateway_payment_id != "3", "invite_sent": True}
+
+    monkeypatch.setattr(reconciliation.async_db, "get_pending_payments_for_reconciliation",
+                        get_pending_payments_for_reconciliation)
+    monkeypatch.setattr(reconciliation.async_db, "expire_pending_payments", expire_pending_payments)
+    monkeypatch.setattr(reconciliation, "confirm_and_deliver", confirm_and_deliver)
+    yield state
+    status_service._pending.clear()
+    status_service._terminal.clear()
+
+
+def local(*gpids):
+    return [{"id": int(g), "gateway_payment_id": g, "created_at": NOW - timedelta(hours=1)} for g in gpids]
+
+
+def test_drift_is_applied_and_reported(world):
+    world["local"] = local("1", "2", "3", "4", "5")
+    world["remote"] = gateway_payments({
+        "1": "approved", "2": "cancelled", "3": "approved", "4": "pending", "99": "approved",
+    })
+
+    report = asyncio.run(reconciliation.reconcile_pending_payments(None, page_size=2))
+
+    assert sorted(world["confirmed"]) == ["1", "3"]
+    assert world["expired"] == ["2"]
+    assert report["pending"] == 5
+    assert report["found"] == 4
+    assert report["missing"] == 1
+    assert report["confirmed"] == 2
+    assert report["activated"] == 1
+    assert report["expired"] == 1
+    assert report["unchanged"] == 1
+    assert report["drifted"] == 3
+    assert report["pages"] == 3
+    assert status_service._terminal.get("2") == "cancelled"
+
+
+def test_search_stops_once_every_pending_was_seen(world):
+    world["local"] = local("1")
+    world["remote"] = gateway_payments({str(n): "pending" for n in range(1, 11)})
+
+    report = asyncio.run(reconciliation.reconcile_pending_payments(None, page_size=2))
+
+    assert report["pages"] == 1
+    assert report["drifted"] == 0
+
+
+def test_nothing_pending_returns_the_full_report(world):
+    report = asyncio.run(reconciliation.reconcile_pending_payments(None))
+
+    assert world["searches"] == []
+    assert report["pending"] == 0
+    assert report["drifted"] == 0
+    assert "duration_ms" in report
+
+
+def test_search_failure_raises(world, monkeypatch):
+    world["local"] = local("1")
+    client = MercadoPagoClient(
+        "TEST-TOKEN", transport=httpx.MockTransport(lambda request: httpx.Response(500, json={})),
+        retry_attempts=0,
+    )
+    monkeypatch.setattr(payments, "_client", client)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(reconciliation.reconcile_pending_payments(None))
+    assert world["confirmed"] == [] and world["expired"] == []
@@ -0,0 +1,66 @@
+"""
+Ativação de assinatura: reentrega devolve a assinatura existente.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.domain import subscriptions
+
+ENDS_AT = datetime.now(timezone.utc) + timedelta(days=30)
+PAYMENT = {"id": 7, "user_id": 3, "plan": "mensal", "status": "confirmed"}
+SUB = {"id": 11, "user_id": 3, "payment_id": 7, "plan": "mensal", "status": "active", "ends_at": ENDS_AT}
+
+
+class FakeConn:
+    def __init__(self, inserted):
+        self.inserted = inserted
+        self.queries = []
+
+    async def fetchrow(self, query, *args):
+        self.queries.append(query)
+        if query is subscriptions.CONFIRM_AND_LOCK_SQL or query is subscriptions.LOCK_CONFIRMED_SQL:
+            return dict(PAYMENT)
+        if query is subscriptions.ACTIVATE_SQL:
+            return dict(SUB) if self.inserted else None
+        assert "FROM subscriptions WHERE payment_id" in query
+        return dict(SUB)
+
+
+@pytest.fixture
+def conn_factory(monkeypatch):
+    def make(inserted):
+        conn = FakeConn(inserted)
+
+        @asynccontextmanager
+        async def get_db():
+            yield conn
+
+        monkeypatch.setattr(subscriptions.async_db, "get_db", get_db)
+        return conn
+
+    return make
+
+
+def test_first_delivery_activates_in_two_statements(conn_factory):
+    conn = conn_factory(inserted=True)
+    result = asyncio.run(subscriptions.confirm_and_activate_payment_async("mp-1"))
+
+    assert result["activated"] is True
+    assert result["subscription"]["id"] == 11
+    assert len(conn.queries) == 2
+
+
+def test_redelivery_returns_existing_subscription(conn_factory):
+    conn_factory(inserted=False)
+    result = asyncio.run(subscriptions.confirm_and_activate_payment_async("mp-1"))
+
+    assert result["activated"] is False
+    assert result["subscription"]["id"] == 11
+
+
+def test_activate_from_payment_returns_existing_subscription(conn_factory):
+    conn_factory(inserted=False)
+    assert asyncio.run(subscriptions.activate_subscription_from_payment_async(7))["id"] == 11